@@ -0,0 +1,115 @@
+"""
+AutoRescue Accounts
+
+Password hashing policy and a cache of user credentials for the login path.
+
+Hashes are made with one configured method and cost (``PASSWORD_HASH_METHOD``,
+any Werkzeug method such as ``pbkdf2:sha256:600000`` or ``scrypt``). A stored
+hash made with another method or cost still verifies, and the caller is
+handed a replacement made with the policy to store, so changing the policy
+migrates users as they log in.
+
+Password checks run on a small thread pool: hashlib releases the GIL while
+hashing, so the pool bounds how many cores a login storm can occupy while
+request threads wait on a future (or, under the ASGI server, are not held at
+all).
+"""
+
+import collections
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# What the login path needs about a user, cached per username
+CachedUser = collections.namedtuple('CachedUser', 'id username password_hash is_admin is_ambulance_driver')
+
+
+class PasswordHasher:
+    """Creates and checks password hashes with the configured method"""
+
+    def __init__(self, method, workers=0):
+        self.method = method
+        self.workers = workers or os.cpu_count() or 1
+        self._prefix = None
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def hash(self, password):
+        return generate_password_hash(password, method=self.method)
+
+    def outdated(self, stored):
+        """Whether ``stored`` was made with another method or cost than the policy"""
+        if self._prefix is None:
+            # Werkzeug fills in defaults (e.g. "pbkdf2" -> "pbkdf2:sha256:600000"),
+            # so learn the full method string from one hash
+            self._prefix = self.hash('').split('$', 1)[0]
+        return stored.split('$', 1)[0] != self._prefix
+
+    def check(self, stored, password):
+        """(valid, rehashed): ``rehashed`` is a policy hash to store instead, or None"""
+        if not check_password_hash(stored, password):
+            return False, None
+        return True, self.hash(password) if self.outdated(stored) else None
+
+    def verify(self, stored, password):
+        """``check`` on the hashing pool; returns a Future of (valid, rehashed)"""
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix='autorescue-hash')
+        return self._pool.submit(self.check, stored, password)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+
+class UserCache:
+    """Short-lived, LRU-bounded copies of user records keyed by username.
+
+    Writes invalidate the affected entries in this process; the TTL bounds
+    how long other processes can serve a changed password or role.
+    """
+
+    def __init__(self, max_entries=4096, ttl=30):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, username):
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is None:
+                return None
+            expires, user = entry
+            if expires < time.monotonic():
+                del self._entries[username]
+                return None
+            self._entries.move_to_end(username)
+            return user
+
+    def put(self, username, user):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[username] = (time.monotonic() + self.ttl, user)
+            self._entries.move_to_end(username)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, usernames=None):
+        """Drop ``usernames`` (every entry when None)"""
+        with self._lock:
+            if usernames is None:
+                self._entries.clear()
+                return
+            for username in usernames:
+                self._entries.pop(username, None)
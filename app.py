@@ -1,10 +1,37 @@
-from flask import Flask, request, jsonify, render_template, session, redirect, url_for
+from flask import Flask, Response, g, has_request_context, request, jsonify, render_template, session, redirect, url_for
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import and_, bindparam, case, event, false, func, insert, inspect, or_, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
 from flask_cors import CORS
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+import atexit
+import hmac
+import json
 import os
-from werkzeug.security import generate_password_hash, check_password_hash
+import time
+import zlib
+from accounts import CachedUser, PasswordHasher, UserCache
+from cache import ResponseCache, SharedVersion, TemplateCache
 from config import config
+from clustering import IncidentClusterer
+from dispatch import METERS_PER_DEGREE, SpatialIndex
+from events import EventHub, format_sse
+from locations import LocationBuffer, PeriodicFlusher
+from triage import TriageQueue
+import archive
+import detection
+import eventlog
+import geo
+import ingest
+import metrics
+import migrations
+import regions
+import routing
+import serialize
+import stats
 
 app = Flask(__name__)
 try:
@@ -13,15 +40,26 @@ except Exception:
     pass
 config_name = os.environ.get('FLASK_ENV', 'default')
 app.config.from_object(config[config_name])
+if app.config['TEMPLATE_CACHE_DIR']:
+    # The Jinja environment is still only created on the first render
+    app.jinja_options = {
+        **app.jinja_options,
+        'bytecode_cache': TemplateCache(os.path.join(app.root_path, app.config['TEMPLATE_CACHE_DIR']))
+    }
 
 db = SQLAlchemy(app)
 
 # Database Models
 class User(db.Model):
+    __table_args__ = (
+        db.Index('ix_user_driver_available', 'is_ambulance_driver', 'is_available'),
+        db.Index('ix_user_region', 'region'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
-    password_hash = db.Column(db.String(120), nullable=False)
+    password_hash = db.Column(db.String(255), nullable=False)  # scrypt hashes are ~162 characters
     is_admin = db.Column(db.Boolean, default=False)
     is_ambulance_driver = db.Column(db.Boolean, default=False)
     driver_id = db.Column(db.String(50), unique=True, nullable=True)  # Ambulance driver ID
@@ -29,8 +67,19 @@ class User(db.Model):
     current_longitude = db.Column(db.Float, nullable=True)
     is_available = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    region = db.Column(db.String(12), nullable=True)  # Tile of the last flushed position (regions.py)
 
 class Alert(db.Model):
+    # Keep in step with migrations.HOT_QUERY_INDEXES for existing databases
+    __table_args__ = (
+        db.Index('ix_alert_status_timestamp', 'status', 'timestamp'),
+        db.Index('ix_alert_assigned_timestamp', 'assigned_ambulance_id', 'timestamp'),
+        db.Index('ix_alert_user_timestamp', 'user_id', 'timestamp'),
+        db.Index('ix_alert_timestamp_id', 'timestamp', 'id'),
+        db.Index('ix_alert_lat_lon', 'latitude', 'longitude'),
+        db.Index('ix_alert_region_status', 'region', 'status'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     alert_type = db.Column(db.String(50), nullable=False)  # 'Accident' or 'Manual SOS'
     latitude = db.Column(db.Float, nullable=False)
@@ -44,6 +93,1004 @@ class Alert(db.Model):
     assigned_ambulance_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
     accepted_at = db.Column(db.DateTime, nullable=True)
     resolved_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+    reporter_count = db.Column(db.Integer, default=1)  # Distinct users whose reports merged into this incident
+    region = db.Column(db.String(12), nullable=True)  # Tile of the position, set on insert (regions.py)
+    dispatch_candidates = db.Column(db.Text, nullable=True)  # JSON [[unit id, distance m, eta s], ...] ranked at dispatch
+
+class ArchivedAlert(db.Model):
+    # Resolved alerts moved out of the hot table by archive.move_batch; same columns as Alert
+    __tablename__ = 'alert_archive'
+    __table_args__ = (
+        db.Index('ix_alert_archive_timestamp_id', 'timestamp', 'id'),
+        db.Index('ix_alert_archive_user_timestamp', 'user_id', 'timestamp'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    alert_type = db.Column(db.String(50), nullable=False)
+    latitude = db.Column(db.Float, nullable=False)
+    longitude = db.Column(db.Float, nullable=False)
+    timestamp = db.Column(db.DateTime)
+    resolved = db.Column(db.Boolean, default=True)
+    details = db.Column(db.Text)
+    user_id = db.Column(db.Integer, nullable=True)
+    impact_magnitude = db.Column(db.Float, nullable=True)
+    status = db.Column(db.String(20))
+    assigned_ambulance_id = db.Column(db.Integer, nullable=True)
+    accepted_at = db.Column(db.DateTime, nullable=True)
+    resolved_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime)
+    reporter_count = db.Column(db.Integer, default=1)
+    region = db.Column(db.String(12), nullable=True)
+    dispatch_candidates = db.Column(db.Text, nullable=True)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class AlertRequest(db.Model):
+    # Client idempotency keys: a retried POST /api/alerts returns the alert it created
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    key = db.Column(db.String(64), primary_key=True)
+    alert_id = db.Column(db.Integer, db.ForeignKey('alert.id'), nullable=False)
+    merged = db.Column(db.Boolean, default=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+class AlertReporter(db.Model):
+    # Users whose reports were merged into someone else's alert; they see it as their own.
+    # No foreign key on alert_id: rows keep pointing at alerts moved to the archive
+    alert_id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True, index=True)
+
+class AlertStatusCount(db.Model):
+    # Alerts currently in each status, maintained by stats.StatsRecorder
+    status = db.Column(db.String(20), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+class AlertRollup(db.Model):
+    # Alerts entering each status per hour/day, with summed response times
+    granularity = db.Column(db.String(8), primary_key=True)  # 'hour' or 'day'
+    bucket_start = db.Column(db.DateTime, primary_key=True)
+    status = db.Column(db.String(20), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    timed = db.Column(db.Integer, nullable=False, default=0)  # Entries with a known report time
+    response_seconds = db.Column(db.Float, nullable=False, default=0.0)  # Summed time since report
+
+# Latest ambulance positions; GPS pings land here and are flushed in bulk
+location_buffer = LocationBuffer()
+
+def flush_locations():
+    """Write buffered driver positions to the database in one bulk UPDATE"""
+    drained = location_buffer.drain()
+    if not drained:
+        return 0
+    try:
+        db.session.execute(update(User).execution_options(accounts=()), [
+            {'id': user_id, 'current_latitude': latitude, 'current_longitude': longitude,
+             'region': regions.region_of(latitude, longitude)}
+            for user_id, (latitude, longitude, _) in drained.items()
+        ])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        location_buffer.restore(drained)
+        raise
+    return len(drained)
+
+def _flush_locations_in_app_context():
+    with app.app_context():
+        flush_locations()
+
+location_flusher = PeriodicFlusher(app.config['LOCATION_FLUSH_INTERVAL'], _flush_locations_in_app_context,
+                                   logger=app.logger)
+atexit.register(location_flusher.stop)
+
+def archive_alerts(cutoff=None):
+    """Move alerts resolved before ``cutoff`` (default ARCHIVE_AFTER_DAYS ago) to the archive table"""
+    cutoff = cutoff or datetime.utcnow() - timedelta(days=app.config['ARCHIVE_AFTER_DAYS'])
+    batch_size = app.config['ARCHIVE_BATCH_SIZE']
+    moved = 0
+    while True:
+        # One short transaction per batch, so request writes are never held up for long
+        count = archive.move_batch(db.session, Alert.__table__, ArchivedAlert.__table__, cutoff, batch_size,
+                                   references=[AlertRequest.__table__.c.alert_id])
+        db.session.commit()
+        moved += count
+        if count < batch_size:
+            return moved
+
+def _archive_alerts_in_app_context():
+    with app.app_context():
+        archive_alerts()
+
+alert_archiver = PeriodicFlusher(app.config['ARCHIVE_INTERVAL'], _archive_alerts_in_app_context, name='alert-archiver',
+                                 logger=app.logger)
+
+def schedule_location_flush():
+    if app.config['LOCATION_FLUSH_INTERVAL'] <= 0:
+        flush_locations()
+        return
+    location_flusher.start()
+    if location_buffer.pending >= app.config['LOCATION_FLUSH_BATCH']:
+        location_flusher.wake()
+
+def remember_driver(user):
+    """Cache a driver's availability and stored position in the location buffer"""
+    location_buffer.set_available(user.id, user.is_available)
+    if user.current_latitude is not None and user.current_longitude is not None:
+        location_buffer.seed(user.id, user.current_latitude, user.current_longitude)
+
+# Dispatch index of available ambulances, warmed from the database on first use
+dispatch_index = SpatialIndex(app.config['DISPATCH_GRID_SIZE_DEG'])
+_dispatch_index_loaded = False
+
+def ensure_dispatch_index():
+    global _dispatch_index_loaded
+    if not _dispatch_index_loaded:
+        drivers = User.query.filter(User.is_ambulance_driver.is_(True)).all()
+        for driver in drivers:
+            remember_driver(driver)
+            sync_dispatch_index(driver.id)
+        _dispatch_index_loaded = True
+    return dispatch_index
+
+def refresh_driver_availability():
+    """Re-read every driver's availability: accepts and resolves on other workers change it"""
+    drivers = db.session.query(User.id, User.is_available, User.current_latitude, User.current_longitude).filter(
+        User.is_ambulance_driver.is_(True))
+    for driver in drivers:
+        if location_buffer.is_available(driver.id) != bool(driver.is_available):
+            remember_driver(driver)
+            sync_dispatch_index(driver.id)
+
+def driver_regions(user_id):
+    """A located driver's tile and the tiles around it; None while its position is unknown"""
+    position = location_buffer.position(user_id)
+    if position is None:
+        return None
+    return regions.neighbourhood(regions.region_of(*position))
+
+def offered(candidate_ids, driver_id):
+    """Whether a dispatched alert with these stored candidates is shown to a driver"""
+    # Nobody was in range at dispatch (or it predates stored candidates): offer it to everyone
+    if not candidate_ids or driver_id in candidate_ids:
+        return True
+    # Drivers without a known position, or off duty, keep receiving every dispatched alert
+    return not location_buffer.is_available(driver_id) or location_buffer.position(driver_id) is None
+
+def stored_candidate_ids(candidates):
+    """Unit ids in an alert's stored ``dispatch_candidates`` JSON, nearest first"""
+    return [unit_id for unit_id, _, _ in json.loads(candidates)] if candidates else []
+
+def note_offer(candidate_ids):
+    """Record an uncommitted write to an alert dispatched to ``candidate_ids``"""
+    if candidate_ids:
+        note_alert_candidates(db.session, candidate_ids)
+    else:
+        # Without candidates it is offered to every driver, wherever they are
+        note_alert_regions(db.session, None)
+
+def sync_dispatch_index(user_id):
+    """Reflect a driver's cached availability and position in the dispatch index"""
+    position = location_buffer.position(user_id)
+    if location_buffer.is_available(user_id) and position is not None:
+        dispatch_index.update(user_id, *position)
+    else:
+        dispatch_index.remove(user_id)
+
+def use_spatial_sql():
+    return app.config['GEO_SPATIAL_SQL'] and geo.has_postgis(db.engine)
+
+def load_road_router():
+    """Router over ROAD_GRAPH_FILE (memory-mapped, shared by forked workers), or None"""
+    path = app.config['ROAD_GRAPH_FILE']
+    if not path:
+        return None
+    try:
+        graph = routing.RoadGraph(os.path.join(app.root_path, path))
+    except OSError as e:
+        # Loaded at import: a missing graph must not keep the app from starting
+        app.logger.warning('Road graph %s unavailable (%s); ranking by straight-line distance', path, e)
+        return None
+    return routing.Router(
+        graph,
+        cell_size_deg=app.config['ROUTING_CELL_SIZE_DEG'],
+        cache_size=app.config['ROUTING_CACHE_SIZE'],
+        max_snap_m=app.config['ROUTING_MAX_SNAP_M'],
+        max_seconds=app.config['ROUTING_MAX_ETA']
+    )
+
+road_router = load_road_router()
+
+def rank_ambulances(alert):
+    """Best available ambulances for an alert as (user_id, distance_m, eta_s) triples.
+    
+    With a road graph the straight-line nearest ROUTING_CANDIDATE_POOL units
+    are re-ranked by road ETA; ``eta_s`` is None without one, and for units
+    off the graph, beyond ROUTING_MAX_ETA or slower than the first ``k``
+    (ranked last, by distance).
+    """
+    k = app.config['DISPATCH_CANDIDATES']
+    pool = app.config['ROUTING_CANDIDATE_POOL'] if road_router is not None else k
+    if app.config['DISPATCH_FROM_DATABASE']:
+        # Shared by every worker; positions lag by at most one location flush
+        available = db.select(User.id, User.current_latitude, User.current_longitude).where(
+            User.is_ambulance_driver.is_(True),
+            User.is_available.is_(True),
+            User.current_latitude.is_not(None),
+            User.current_longitude.is_not(None)
+        )
+        nearest = geo.nearest(
+            db.session, available, User.current_latitude, User.current_longitude,
+            alert.latitude, alert.longitude, k=pool, spatial=use_spatial_sql()
+        )
+        if road_router is not None and nearest:
+            positions = {user_id: (lat, lon) for user_id, lat, lon in db.session.execute(
+                db.select(User.id, User.current_latitude, User.current_longitude).where(
+                    User.id.in_([unit_id for unit_id, _ in nearest]))
+            )}
+    else:
+        index = ensure_dispatch_index()
+        # One small query per dispatch keeps this worker from offering the
+        # alert to drivers who went off duty through another worker
+        refresh_driver_availability()
+        nearest = index.nearest(alert.latitude, alert.longitude, k=pool)
+        if road_router is not None:
+            positions = {unit_id: index.position(unit_id) for unit_id, _ in nearest}
+    
+    etas = None
+    if road_router is not None and nearest:
+        etas = road_router.etas(alert.latitude, alert.longitude, [
+            (unit_id, *positions[unit_id]) for unit_id, _ in nearest if positions.get(unit_id)
+        ], k=k)
+    if etas is None:
+        # No road graph, or the alert is off it
+        return [(unit_id, distance, None) for unit_id, distance in nearest[:k]]
+    ranked = sorted(nearest, key=lambda unit: (etas.get(unit[0]) is None, etas.get(unit[0]) or 0.0, unit[1]))
+    return [(unit_id, distance, etas.get(unit_id)) for unit_id, distance in ranked[:k]]
+
+# Recent open incidents that new reports of the same crash are merged into
+alert_clusters = IncidentClusterer(app.config['ALERT_CLUSTER_RADIUS_M'], app.config['ALERT_CLUSTER_WINDOW'])
+_alert_clusters_loaded = False
+
+def utc_epoch(value):
+    return value.replace(tzinfo=timezone.utc).timestamp()
+
+def ensure_alert_clusters():
+    """Clusterer warmed with the open alerts still inside the merge window, or None if disabled"""
+    global _alert_clusters_loaded
+    if app.config['ALERT_CLUSTER_RADIUS_M'] <= 0:
+        return None
+    if not _alert_clusters_loaded:
+        cutoff = datetime.utcnow() - timedelta(seconds=app.config['ALERT_CLUSTER_WINDOW'])
+        recent = Alert.query.filter(Alert.updated_at >= cutoff, Alert.status != 'resolved').all()
+        for alert in recent:
+            alert_clusters.add(alert.id, alert.latitude, alert.longitude, alert.user_id, utc_epoch(alert.updated_at))
+        _alert_clusters_loaded = True
+    return alert_clusters
+
+def load_open_alerts(clusters, min_lat, min_lon, max_lat, max_lon):
+    """Add the open alerts in a box still inside the merge window to the clusterer.
+
+    Each worker's clusterer only knows the incidents it created or merged;
+    this picks up the ones other workers created since.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=app.config['ALERT_CLUSTER_WINDOW'])
+    rows = db.session.query(Alert.id, Alert.latitude, Alert.longitude, Alert.user_id, Alert.updated_at).filter(
+        Alert.updated_at >= cutoff, Alert.status != 'resolved',
+        geo.within_bbox(Alert.latitude, Alert.longitude, min_lat, min_lon, max_lat, max_lon, spatial=use_spatial_sql())
+    )
+    for alert_id, latitude, longitude, user_id, updated_at in rows:
+        if alert_id not in clusters:
+            clusters.add(alert_id, latitude, longitude, user_id, utc_epoch(updated_at))
+
+def add_reporter(alert, user_id):
+    """Record a user's report merged into ``alert``; True if they had not reported it before"""
+    if user_id is None or user_id == alert.user_id:
+        return False
+    try:
+        # A savepoint, so a concurrent report by the same user only undoes this row
+        with db.session.begin_nested():
+            db.session.add(AlertReporter(alert_id=alert.id, user_id=user_id))
+    except IntegrityError:
+        return False
+    return True
+
+def add_reporters(pairs):
+    """Record many (alert id, user id) co-reporters, skipping the ones already recorded"""
+    if not pairs:
+        return
+    known = {tuple(row) for row in db.session.query(AlertReporter.alert_id, AlertReporter.user_id).filter(
+        AlertReporter.alert_id.in_({alert_id for alert_id, _ in pairs}))}
+    rows = [{'alert_id': alert_id, 'user_id': user_id} for alert_id, user_id in set(pairs) - known]
+    if not rows:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(AlertReporter.__table__), rows)
+    except IntegrityError:
+        # Another worker recorded some of them meanwhile
+        for row in rows:
+            try:
+                with db.session.begin_nested():
+                    db.session.execute(insert(AlertReporter.__table__), row)
+            except IntegrityError:
+                pass
+
+def alert_reporters(alerts):
+    """Alert id -> ids of the users whose reports were merged into it"""
+    # Alerts reported once have no co-reporters, which spares most lookups
+    shared = [alert.id for alert in alerts if (alert.reporter_count or 1) > 1]
+    reporters = {}
+    if shared:
+        for alert_id, user_id in db.session.query(AlertReporter.alert_id, AlertReporter.user_id).filter(
+                AlertReporter.alert_id.in_(shared)):
+            reporters.setdefault(alert_id, []).append(user_id)
+    return reporters
+
+# Dashboard counters, written in the same transaction as each status change
+alert_stats = stats.StatsRecorder(AlertStatusCount.__table__, AlertRollup.__table__)
+
+def record_status_change(old_status, new_status, reported_at=None, at=None):
+    """Count an alert moving between statuses; call before committing the change"""
+    alert_stats.record(db.session, [(old_status, new_status, reported_at, at)])
+
+def claim_status(alert, previous, status, at=None, **values):
+    """Move ``alert`` from ``previous`` to ``status`` with one compare-and-set UPDATE.
+
+    As in accept_alert, concurrent changes serialise on the row and only one
+    matches the WHERE; returns whether this one did, and only then counts it
+    in the stats. ``values`` are further columns to set. Call before committing.
+    """
+    changed = db.session.execute(
+        update(Alert).where(Alert.id == alert.id, Alert.status == previous).values(status=status, **values)
+        .execution_options(synchronize_session=False, alert_regions={alert.region})
+    ).rowcount
+    if changed != 1:
+        return False
+    # Drivers the alert was (or is now) offered to see it wherever they are
+    if 'dispatch_candidates' in values:
+        note_offer(stored_candidate_ids(values['dispatch_candidates']))
+    if previous == 'dispatched':
+        note_offer(stored_candidate_ids(alert.dispatch_candidates))
+    record_status_change(previous, status, alert.timestamp, at)
+    return True
+
+_requests_pruned_at = 0.0
+
+def remember_request(idempotency_key, user_id, alert_id, merged):
+    if idempotency_key:
+        db.session.add(AlertRequest(user_id=user_id, key=idempotency_key, alert_id=alert_id, merged=merged))
+
+def replayed_request(idempotency_key, user_id):
+    """The stored outcome of an earlier request with this key, or None"""
+    global _requests_pruned_at
+    ttl = app.config['IDEMPOTENCY_KEY_TTL']
+    if time.time() - _requests_pruned_at > ttl / 24:
+        _requests_pruned_at = time.time()
+        AlertRequest.query.filter(AlertRequest.created_at < datetime.utcnow() - timedelta(seconds=ttl)).delete()
+        db.session.commit()
+    stored = db.session.get(AlertRequest, (user_id, idempotency_key))
+    if stored is None or stored.created_at < datetime.utcnow() - timedelta(seconds=ttl):
+        return None
+    return stored
+
+def ingest_alert(alert_type, latitude, longitude, details, user_id, impact_magnitude, idempotency_key=None,
+                 source='api'):
+    """Create an alert, or merge the report into a matching open incident.
+
+    Returns ``(alert, created)``; merged reports raise the incident's
+    ``reporter_count`` (once per user), make it visible to the reporter and
+    keep the largest impact magnitude.
+    An ``idempotency_key`` is stored in the same transaction; a concurrent
+    retry with the same key fails that commit with ``IntegrityError``.
+    The report goes to the event log as coming from ``source``.
+    """
+    report = {'user_id': user_id, 'alert_type': alert_type, 'latitude': latitude, 'longitude': longitude,
+              'details': details, 'impact_magnitude': impact_magnitude}
+    clusters = ensure_alert_clusters()
+    if clusters is not None and latitude is not None and longitude is not None:
+        incident_id = clusters.match(latitude, longitude)
+        if incident_id is None:
+            load_open_alerts(clusters, *geo.bounding_box(latitude, longitude, clusters.radius_m))
+            incident_id = clusters.match(latitude, longitude)
+        if incident_id is not None:
+            alert = db.session.get(Alert, incident_id)
+            if alert is not None and alert.status != 'resolved':
+                clusters.report(incident_id, user_id)
+                # SQL-side updates so concurrent merges do not lose counts
+                if add_reporter(alert, user_id):
+                    alert.reporter_count = func.coalesce(Alert.reporter_count, 1) + 1
+                if impact_magnitude is not None:
+                    current = func.coalesce(Alert.impact_magnitude, impact_magnitude)
+                    alert.impact_magnitude = case((current < impact_magnitude, impact_magnitude), else_=current)
+                alert.updated_at = datetime.utcnow()
+                remember_request(idempotency_key, user_id, alert.id, merged=True)
+                db.session.commit()
+                log_events([report_event(alert.id, False, source, **report)])
+                return alert, False
+            clusters.remove(incident_id)
+    
+    now = datetime.utcnow()
+    alert = Alert(
+        alert_type=alert_type,
+        latitude=latitude,
+        longitude=longitude,
+        timestamp=now,
+        details=details,
+        user_id=user_id,
+        impact_magnitude=impact_magnitude,
+        region=regions.region_of(latitude, longitude)
+    )
+    db.session.add(alert)
+    record_status_change(None, 'pending', at=now)
+    if idempotency_key:
+        db.session.flush()
+        remember_request(idempotency_key, user_id, alert.id, merged=False)
+    db.session.commit()
+    if clusters is not None and latitude is not None and longitude is not None:
+        clusters.add(alert.id, latitude, longitude, user_id)
+    log_events([report_event(alert.id, True, source, **report)])
+    return alert, True
+
+def ingest_alert_batch(columns):
+    """Create or merge many validated alerts (``ingest.parse_alerts`` columns) in one transaction.
+
+    Same clustering and co-reporters as ``ingest_alert``, including between
+    alerts of the batch, but new incidents go in with one multi-row INSERT
+    and merges with one executemany UPDATE. Returns ``(results, created, merged)``: results
+    are ``(alert_id, created)`` per input row; created and merged are alert
+    snapshots to publish after the caller commits.
+    """
+    clusters = ensure_alert_clusters()
+    radius, window = app.config['ALERT_CLUSTER_RADIUS_M'], app.config['ALERT_CLUSTER_WINDOW']
+    batch_clusters = IncidentClusterer(radius, window) if clusters is not None else None
+    
+    rows = list(zip(columns['alert_type'], columns['latitude'], columns['longitude'], columns['impact'],
+                    columns['details'], columns['user_id'], columns['reporter'], columns['reported_at']))
+    if clusters is not None and rows:
+        # Incidents other workers created around the batch
+        lats, lons = columns['latitude'], columns['longitude']
+        dlat = radius / METERS_PER_DEGREE
+        _, _, _, dlon = geo.bounding_box(max(abs(min(lats)), abs(max(lats))), 0.0, radius)
+        load_open_alerts(clusters, max(min(lats) - dlat, -90.0), max(min(lons) - dlon, -180.0),
+                         min(max(lats) + dlat, 90.0), min(max(lons) + dlon, 180.0))
+    # Open incidents this batch could merge into: one status check for all of them
+    matches = [clusters.match(row[1], row[2], row[7]) if clusters is not None else None for row in rows]
+    open_ids = {}  # alert id -> (region, owner)
+    candidate_ids = {match for match in matches if match is not None}
+    if candidate_ids:
+        open_ids = {alert_id: (region, owner) for alert_id, region, owner in db.session.query(
+            Alert.id, Alert.region, Alert.user_id).filter(Alert.id.in_(candidate_ids), Alert.status != 'resolved')}
+        for alert_id in candidate_ids - open_ids.keys():
+            clusters.remove(alert_id)
+    
+    incidents = []   # new alerts: [row, reporters, max impact]
+    merges = {}      # existing alert id -> [new reporters, max impact]
+    co_reporters = set()  # (alert id, user id) of users merged into another user's alert
+    placement = []   # per row: (alert id or incident index, is new incident, created by this row)
+    for row, match in zip(rows, matches):
+        alert_type, latitude, longitude, impact, details, user_id, reporter, reported_at = row
+        impact = None if impact != impact else impact  # NaN marks a missing magnitude
+        if match in open_ids:
+            merge = merges.setdefault(match, [0, None])
+            if clusters.report(match, reporter, reported_at):
+                merge[0] += 1
+            if impact is not None and (merge[1] is None or impact > merge[1]):
+                merge[1] = impact
+            if user_id is not None and user_id != open_ids[match][1]:
+                co_reporters.add((match, user_id))
+            placement.append((match, False, False))
+            continue
+        local = batch_clusters.match(latitude, longitude, reported_at) if batch_clusters is not None else None
+        if local is not None:
+            incident = incidents[local]
+            batch_clusters.report(local, reporter, reported_at)
+            incident[1].add(reporter)
+            if impact is not None and (incident[2] is None or impact > incident[2]):
+                incident[2] = impact
+            placement.append((local, True, False))
+            continue
+        if batch_clusters is not None:
+            batch_clusters.add(len(incidents), latitude, longitude, reporter, reported_at)
+        placement.append((len(incidents), True, True))
+        incidents.append([row, {reporter}, impact])
+    
+    now = datetime.utcnow()
+    values = []
+    for row, reporters, impact in incidents:
+        alert_type, latitude, longitude, _, details, user_id, _, reported_at = row
+        values.append({
+            'alert_type': alert_type, 'latitude': latitude, 'longitude': longitude,
+            'timestamp': datetime.utcfromtimestamp(reported_at), 'resolved': False, 'details': details,
+            'user_id': user_id, 'impact_magnitude': impact, 'status': 'pending', 'updated_at': now,
+            'reporter_count': len(reporters), 'region': regions.encode(latitude, longitude)
+        })
+    new_ids = []
+    if values:
+        statement = insert(Alert.__table__).execution_options(alert_regions={value['region'] for value in values})
+        if db.engine.dialect.insert_executemany_returning_sort_by_parameter_order:
+            new_ids = list(db.session.scalars(
+                statement.returning(Alert.__table__.c.id, sort_by_parameter_order=True), values))
+        else:
+            new_ids = [db.session.execute(statement, value).inserted_primary_key[0] for value in values]
+        alert_stats.record(db.session, [(None, 'pending', None, value['timestamp']) for value in values])
+        if clusters is not None:
+            # Registered before commit: if it fails, the status check above drops the ids again
+            for alert_id, (row, reporters, _) in zip(new_ids, incidents):
+                first, *others = reporters
+                clusters.add(alert_id, row[1], row[2], first, row[7])
+                for reporter in others:
+                    clusters.report(alert_id, reporter, row[7])
+        # Users report as their id; vehicle reporters are 'vehicle:<id>' strings
+        co_reporters.update((alert_id, reporter) for alert_id, (row, reporters, _) in zip(new_ids, incidents)
+                            for reporter in reporters if isinstance(reporter, int) and reporter != row[5])
+    add_reporters(co_reporters)
+    
+    if merges:
+        table = Alert.__table__
+        current = func.coalesce(table.c.impact_magnitude, bindparam('b_impact'))
+        db.session.execute(
+            update(table).where(table.c.id == bindparam('b_id')).values(
+                reporter_count=func.coalesce(table.c.reporter_count, 1) + bindparam('b_reporters'),
+                impact_magnitude=case((current < bindparam('b_impact'), bindparam('b_impact')), else_=current),
+                updated_at=now
+            ).execution_options(alert_regions={open_ids[alert_id][0] for alert_id in merges}),
+            [{'b_id': alert_id, 'b_reporters': reporters, 'b_impact': impact}
+             for alert_id, (reporters, impact) in merges.items()]
+        )
+    
+    results = [(new_ids[target] if is_new else target, creator) for target, is_new, creator in placement]
+    created = [SimpleNamespace(id=alert_id, accepted_at=None, resolved_at=None, assigned_ambulance_id=None,
+                               dispatch_candidates=None, **value)
+               for alert_id, value in zip(new_ids, values)]
+    return results, created, list(merges)
+
+# Open alerts in urgency order, kept in step with every alert change
+OPEN_STATUSES = ('pending', 'verified', 'dispatched')
+triage_queue = TriageQueue(
+    type_seconds=app.config['TRIAGE_TYPE_SECONDS'],
+    impact_threshold=app.config['ACCELERATION_THRESHOLD'],
+    impact_seconds=app.config['TRIAGE_IMPACT_SECONDS'],
+    reporter_seconds=app.config['TRIAGE_REPORTER_SECONDS'],
+    escalation_seconds=app.config['TRIAGE_ESCALATION_SECONDS'],
+    sla=app.config['TRIAGE_SLA']
+)
+_triage_synced_at = None
+
+def track_triage(alert, changed_at=None):
+    if alert.status in OPEN_STATUSES:
+        triage_queue.upsert(
+            alert.id, utc_epoch(alert.timestamp), alert.alert_type, alert.impact_magnitude,
+            alert.reporter_count, alert.status, changed_at
+        )
+    else:
+        triage_queue.remove(alert.id)
+
+def refresh_triage_queue():
+    """Apply alert changes made since the last refresh (by any worker) and escalate missed SLAs"""
+    global _triage_synced_at
+    synced_at = datetime.utcnow()
+    if _triage_synced_at is None:
+        changed = Alert.query.filter(Alert.status.in_(OPEN_STATUSES)).all()
+    else:
+        overlap = timedelta(seconds=app.config['ALERTS_SYNC_OVERLAP'])
+        changed = Alert.query.filter(Alert.updated_at >= _triage_synced_at - overlap).all()
+    for alert in changed:
+        track_triage(alert, utc_epoch(alert.updated_at) if alert.updated_at else None)
+    _triage_synced_at = synced_at
+    for _, status in triage_queue.escalate_due():
+        TRIAGE_ESCALATIONS.inc(status)
+    return triage_queue
+
+def triage_sort_key(alert):
+    entry = triage_queue.get(alert.id)
+    return (entry.key if entry else utc_epoch(alert.timestamp), alert.id)
+
+# Live alert change feed served on /api/events
+event_hub = EventHub(app.config['EVENT_HISTORY_SIZE'])
+
+def load_event_log():
+    """Append-only log in EVENT_LOG_DIR (shared by workers), or None; the directory is created on first append"""
+    path = app.config['EVENT_LOG_DIR']
+    if not path:
+        return None
+    return eventlog.EventLog(
+        os.path.join(app.root_path, path),
+        segment_bytes=app.config['EVENT_LOG_SEGMENT_BYTES'],
+        fsync=app.config['EVENT_LOG_FSYNC']
+    )
+
+# Every alert report, status transition and location fix, for audit and replay
+event_log = load_event_log()
+
+def log_events(events):
+    """Append (event_type, data) pairs to the event log, if there is one (call after commit)"""
+    if event_log is None or not events:
+        return
+    try:
+        event_log.append_many(events)
+    except OSError:
+        # The change is committed; a full or read-only disk must not fail the request
+        app.logger.exception('Event log append failed')
+
+def report_event(alert_id, created, source, **report):
+    """Log entry for an alert report and its outcome (a new alert, or merged into ``alert_id``)"""
+    return 'alert.reported', dict(report, alert_id=alert_id, created=created, source=source)
+
+def status_event(alert, previous, **extra):
+    """Log entry for the current user moving an alert from ``previous`` to its status"""
+    return 'alert.' + alert.status, dict(
+        extra, alert_id=alert.id, previous=previous, user_id=session.get('user_id'), endpoint=request.endpoint
+    )
+
+def location_event(user_id, latitude, longitude, recorded_at, source):
+    return 'location', {'user_id': user_id, 'latitude': latitude, 'longitude': longitude,
+                        'recorded_at': recorded_at, 'source': source}
+
+def alert_to_dict(alert):
+    return {
+        'id': alert.id,
+        'alert_type': alert.alert_type,
+        'latitude': alert.latitude,
+        'longitude': alert.longitude,
+        'timestamp': alert.timestamp.isoformat(),
+        'resolved': alert.resolved,
+        'details': alert.details,
+        'impact_magnitude': alert.impact_magnitude,
+        'status': alert.status,
+        'assigned_ambulance_id': alert.assigned_ambulance_id,
+        'accepted_at': alert.accepted_at.isoformat() if alert.accepted_at else None,
+        'resolved_at': alert.resolved_at.isoformat() if alert.resolved_at else None,
+        'updated_at': alert.updated_at.isoformat() if alert.updated_at else None,
+        'reporter_count': alert.reporter_count or 1
+    }
+
+def publish_alert_event(event_type, alert, candidates=None):
+    """Push an alert change to connected dashboards (call after commit)"""
+    track_triage(alert)
+    reporters = alert_reporters([alert]).get(alert.id, [])
+    data = {'alert': alert_to_dict(alert), '_owner_id': alert.user_id, '_reporter_ids': reporters}
+    if candidates is not None:
+        data['candidates'] = [unit_id for unit_id, _, _ in candidates]
+    event_hub.publish(event_type, data, alert_channels(alert, reporters))
+
+def publish_alert_events(event_type, alerts):
+    """Push many alert changes with a single wake-up of the streams (call after commit)"""
+    events = []
+    shared = alert_reporters(alerts)
+    for alert in alerts:
+        track_triage(alert)
+        reporters = shared.get(alert.id, [])
+        data = {'alert': alert_to_dict(alert), '_owner_id': alert.user_id, '_reporter_ids': reporters}
+        events.append((event_type, data, alert_channels(alert, reporters)))
+    if events:
+        event_hub.publish_many(events)
+
+def alert_channels(alert, reporters=()):
+    """Hub channels of an alert change: its region and the users it concerns"""
+    if alert.region is None or alert.dispatch_candidates == '[]':
+        # Unlocated alerts, and alerts dispatched with nobody in range, go to every stream
+        return None
+    channels = {f'region:{alert.region}', f'user:{alert.user_id}'} | {f'user:{user_id}' for user_id in reporters}
+    # Candidates may be ranked from beyond the tiles their streams follow
+    channels |= {f'user:{unit_id}' for unit_id in stored_candidate_ids(alert.dispatch_candidates)}
+    if alert.assigned_ambulance_id is not None:
+        channels.add(f'user:{alert.assigned_ambulance_id}')
+    return channels
+
+def event_channels(user_id, is_admin, is_ambulance_driver):
+    """Hub channels a stream subscribes to; None for every event"""
+    if is_admin:
+        return None
+    if not is_ambulance_driver:
+        return {f'user:{user_id}'}
+    # Drivers follow the tiles around their last reported position
+    nearby = driver_regions(user_id)
+    if nearby is None:
+        return None
+    return {f'user:{user_id}'} | {f'region:{region}' for region in nearby}
+
+def event_visible(data, user_id, is_admin, is_ambulance_driver):
+    """Apply the same audience rules as the polling endpoints to one event"""
+    alert = data['alert']
+    if is_admin:
+        return True
+    if is_ambulance_driver:
+        if alert['assigned_ambulance_id'] == user_id:
+            return True
+        if alert['status'] == 'dispatched':
+            return offered(data.get('candidates'), user_id)
+        # Lets other drivers drop an alert that has been taken or closed
+        return alert['status'] in ('accepted', 'resolved')
+    return data['_owner_id'] == user_id or user_id in data.get('_reporter_ids', ())
+
+def load_alerts_version():
+    """SharedVersion in ALERTS_VERSION_FILE, or a per-process one where the file cannot be written"""
+    path = app.config['ALERTS_VERSION_FILE'] or os.path.join(app.instance_path, 'alerts.version')
+    slots = app.config['REGION_CACHE_SLOTS']
+    try:
+        return SharedVersion(path, slots=slots)
+    except OSError as e:
+        # Read-only filesystems (e.g. Vercel): other processes' writes would go
+        # unseen, so cached responses could be stale indefinitely
+        app.logger.warning('Alert version file %s unavailable (%s); response caching disabled', path, e)
+        app.config['ALERTS_CACHE_ENABLED'] = False
+        return SharedVersion(slots=slots)
+
+# Alert data version, bumped after every committed alert write (by any worker
+# on this host) together with the changed alerts' regions, and the responses
+# rendered for the current version
+alerts_version = load_alerts_version()
+response_cache = ResponseCache(app.config['ALERTS_CACHE_SIZE'])
+
+def note_alert_regions(session, changed):
+    """Record an uncommitted alert write in ``changed`` regions (None: it may touch any)"""
+    known = session.info.get('alert_regions', set())
+    if known is None:
+        return
+    if changed is None or None in changed:
+        session.info['alert_regions'] = None
+    else:
+        session.info['alert_regions'] = known | set(changed)
+
+def note_alert_candidates(session, unit_ids):
+    """Record the drivers an uncommitted alert write concerns outside its region (dispatch candidates)"""
+    session.info.setdefault('alert_candidates', set()).update(unit_ids)
+
+@event.listens_for(Session, 'after_flush')
+def note_alert_flush(session, flush_context):
+    alerts = [obj for obj in (*session.new, *session.dirty, *session.deleted) if isinstance(obj, Alert)]
+    if alerts:
+        note_alert_regions(session, [alert.region for alert in alerts])
+        for alert in alerts:
+            note_alert_candidates(session, stored_candidate_ids(alert.dispatch_candidates))
+
+@event.listens_for(Session, 'do_orm_execute')
+def note_alert_statement(state):
+    # Bulk and compare-and-set statements bypass the flush; they name the
+    # regions they write with the `alert_regions` execution option
+    if state.is_select:
+        return
+    if getattr(state.statement, 'table', None) is Alert.__table__ or any(
+        mapper.class_ is Alert for mapper in state.all_mappers
+    ):
+        note_alert_regions(state.session, state.execution_options.get('alert_regions'))
+
+@event.listens_for(Session, 'after_commit')
+def bump_alerts_version(session):
+    if 'alert_regions' in session.info:
+        changed = session.info.pop('alert_regions')
+        candidates = session.info.pop('alert_candidates', ())
+        # Entries rendered for older stamps simply stop matching; the LRU drops them
+        alerts_version.bump(None if changed is None else
+                            {f'region:{region}' for region in changed} | {f'user:{unit_id}' for unit_id in candidates})
+
+@event.listens_for(Session, 'after_rollback')
+def forget_alert_changes(session):
+    session.info.pop('alert_regions', None)
+    session.info.pop('alert_candidates', None)
+
+# Password policy and the login path's copies of user credentials and roles
+password_hasher = PasswordHasher(app.config['PASSWORD_HASH_METHOD'], app.config['PASSWORD_HASH_WORKERS'])
+user_cache = UserCache(app.config['USER_CACHE_SIZE'], app.config['USER_CACHE_TTL'])
+ACCOUNT_FIELDS = CachedUser._fields
+
+def note_account_changes(session, usernames):
+    """Record an uncommitted write to the credentials or roles of ``usernames`` (None: any user)"""
+    known = session.info.get('changed_accounts', set())
+    if known is None:
+        return
+    session.info['changed_accounts'] = None if usernames is None else known | set(usernames)
+
+@event.listens_for(Session, 'after_flush')
+def note_account_flush(session, flush_context):
+    changed = set()
+    for user in (*session.dirty, *session.deleted):
+        if not isinstance(user, User):
+            continue
+        attrs = inspect(user).attrs
+        if user in session.deleted or any(attrs[field].history.has_changes() for field in ACCOUNT_FIELDS):
+            changed.update([user.username, *attrs.username.history.deleted])
+    if changed:
+        note_account_changes(session, changed)
+
+@event.listens_for(Session, 'do_orm_execute')
+def note_account_statement(state):
+    # Bulk statements on users name the accounts whose credentials or roles
+    # they write with the `accounts` execution option (() for none)
+    if state.is_select:
+        return
+    if getattr(state.statement, 'table', None) is User.__table__ or any(
+        mapper.class_ is User for mapper in state.all_mappers
+    ):
+        note_account_changes(state.session, state.execution_options.get('accounts'))
+
+@event.listens_for(Session, 'after_commit')
+def invalidate_user_cache(session):
+    if 'changed_accounts' in session.info:
+        user_cache.invalidate(session.info.pop('changed_accounts'))
+
+@event.listens_for(Session, 'after_rollback')
+def forget_account_changes(session):
+    session.info.pop('changed_accounts', None)
+
+def conditional_json(scope, build, *stamp_extra, regions=None, users=()):
+    """Serve ``build()`` with an ETag for the current alert version.
+
+    While the version is unchanged a matching ``If-None-Match`` gets ``304``
+    and other requests get the cached body, both without a query. ``scope``
+    names whose view this is (a role or a user) so tags and cached bodies are
+    never shared between audiences. A view limited to ``regions`` is only
+    invalidated by writes in those regions or to alerts offered to ``users``.
+    """
+    if not app.config['ALERTS_CACHE_ENABLED']:
+        return build()
+    # Read before building: a write committed meanwhile bumps past this stamp
+    if regions is None:
+        stamp = (alerts_version.epoch, alerts_version.current()) + stamp_extra
+    else:
+        keys = [f'region:{region}' for region in sorted(regions)] + [f'user:{user_id}' for user_id in users]
+        stamp = (alerts_version.epoch,) + alerts_version.regional(keys) + stamp_extra
+    key = (scope, request.full_path)
+    etag = '-'.join(f'{part:x}' for part in stamp + (zlib.crc32(repr(key).encode()),))
+    
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        body = response_cache.get(key, stamp)
+        if body is None:
+            response = build()
+            if not isinstance(response, Response) or response.status_code != 200:
+                return response
+            if response.is_streamed:
+                response.response = cache_when_sent(response.response, key, stamp)
+            else:
+                response_cache.put(key, stamp, response.get_data())
+        else:
+            response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Cookie')
+    return response
+
+def cache_when_sent(chunks, key, stamp):
+    """Pass a streamed body through, caching it once it has been sent in full"""
+    sent = []
+    for chunk in chunks:
+        sent.append(chunk)
+        yield chunk
+    response_cache.put(key, stamp, b''.join(sent))
+
+# Fields of the alert list endpoints, in response order
+ALERT_FIELDS = (
+    'id', 'alert_type', 'latitude', 'longitude', 'timestamp', 'resolved', 'details', 'impact_magnitude', 'status',
+    'assigned_ambulance_id', 'accepted_at', 'resolved_at', 'updated_at', 'reporter_count'
+)
+DISPATCHED_FIELDS = (
+    'id', 'alert_type', 'latitude', 'longitude', 'timestamp', 'details', 'impact_magnitude', 'status',
+    'reporter_count', 'priority', 'escalated', 'candidate_rank', 'distance_m', 'eta_s'
+)
+ASSIGNED_FIELDS = (
+    'id', 'alert_type', 'latitude', 'longitude', 'timestamp', 'accepted_at', 'resolved_at', 'details',
+    'impact_magnitude', 'status'
+)
+
+def alert_columns(model, fields):
+    """Columns selecting ``fields`` of ``model`` as plain row tuples"""
+    return [func.coalesce(model.reporter_count, 1).label('reporter_count') if field == 'reporter_count'
+            else getattr(model, field) for field in fields]
+
+def response_layout(available):
+    """(fields, layout) asked for with ``fields=a,b`` and ``format=columns``; ValueError if invalid"""
+    fields = tuple(field for field in request.args.get('fields', '').split(',') if field) or available
+    layout = request.args.get('format', 'rows')
+    if layout not in serialize.LAYOUTS or any(field not in available for field in fields):
+        raise ValueError('Invalid fields or format parameter')
+    return fields, layout
+
+def json_rows(rows, fields, layout, key=None, **members):
+    """Streamed JSON of row tuples, optionally as ``{key: rows, **members}``"""
+    chunks = serialize.iter_rows(rows, fields, layout)
+    if key is not None:
+        chunks = serialize.iter_envelope(key, chunks, **members)
+    return Response(chunks, mimetype='application/json')
+
+# Request, SQL and domain instrumentation exposed on /api/metrics
+metrics_registry = metrics.Registry()
+REQUEST_LATENCY = metrics_registry.histogram(
+    'autorescue_http_request_duration_seconds', 'Time spent in the request handler', ['method', 'endpoint'])
+REQUESTS = metrics_registry.counter(
+    'autorescue_http_requests_total', 'Requests handled', ['method', 'endpoint', 'status'])
+SQL_QUERIES = metrics_registry.histogram(
+    'autorescue_sql_queries_per_request', 'SQL statements executed per request', ['method', 'endpoint'],
+    buckets=metrics.QUERY_COUNT_BUCKETS)
+SQL_TIME = metrics_registry.histogram(
+    'autorescue_sql_duration_seconds_per_request', 'Time spent in SQL per request', ['method', 'endpoint'])
+TRIAGE_ESCALATIONS = metrics_registry.counter(
+    'autorescue_triage_escalations_total', 'Alerts escalated after missing their SLA', ['status'])
+ALERT_TIME_TO_ACCEPT = metrics_registry.histogram(
+    'autorescue_alert_time_to_accept_seconds', 'Alert timestamp to accepted_at', ['alert_type'],
+    buckets=metrics.RESPONSE_BUCKETS)
+ALERT_TIME_TO_RESOLVE = metrics_registry.histogram(
+    'autorescue_alert_time_to_resolve_seconds', 'Alert timestamp to resolved_at', ['alert_type'],
+    buckets=metrics.RESPONSE_BUCKETS)
+ALERT_ACCEPT_TO_RESOLVE = metrics_registry.histogram(
+    'autorescue_alert_accept_to_resolve_seconds', 'Alert accepted_at to resolved_at', ['alert_type'],
+    buckets=metrics.RESPONSE_BUCKETS)
+
+def _pool_stats():
+    pool = db.engine.pool
+    return {
+        (stat,): getattr(pool, stat)() if hasattr(pool, stat) else None
+        for stat in ('size', 'checkedin', 'checkedout', 'overflow')
+    }
+
+metrics_registry.gauge('autorescue_db_pool_connections', 'Database connection pool state', ['state'],
+                       collect=_pool_stats)
+metrics_registry.gauge('autorescue_location_buffer_pending', 'Driver positions not yet written to the database',
+                       collect=lambda: location_buffer.pending)
+metrics_registry.gauge('autorescue_dispatch_index_units', 'Available ambulances in the dispatch index',
+                       collect=lambda: len(dispatch_index))
+metrics_registry.gauge('autorescue_alert_clusters_open', 'Open incidents new reports can merge into',
+                       collect=lambda: len(alert_clusters))
+metrics_registry.gauge('autorescue_event_sequence', 'Sequence number of the latest published event',
+                       collect=lambda: event_hub.last_seq)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_started'].pop()
+    if has_request_context():
+        g.sql_queries = g.get('sql_queries', 0) + 1
+        g.sql_seconds = g.get('sql_seconds', 0.0) + elapsed
+
+def _handle_cursor_error(context):
+    started = context.connection.info.get('query_started') if context.connection is not None else None
+    if started:
+        started.pop()
+
+if app.config['METRICS_ENABLED']:
+    # Timing every statement is only worth it when something reads the numbers
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(Engine, 'handle_error', _handle_cursor_error)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.before_request
+def start_alert_archiver():
+    # Started from a request so the thread lives in the worker, like the location flusher
+    if app.config['ARCHIVE_INTERVAL'] > 0:
+        alert_archiver.start()
+
+@app.after_request
+def remember_response_status(response):
+    g.response_status = response.status_code
+    return response
+
+@app.teardown_request
+def record_request_metrics(exc=None):
+    # Teardown also runs for requests ended by an unhandled exception, which skip after_request
+    if app.config['METRICS_ENABLED'] and 'request_started' in g:
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUEST_LATENCY.observe(request.method, endpoint, value=time.perf_counter() - g.request_started)
+        REQUESTS.inc(request.method, endpoint, str(g.get('response_status', 500)))
+        SQL_QUERIES.observe(request.method, endpoint, value=g.get('sql_queries', 0))
+        SQL_TIME.observe(request.method, endpoint, value=g.get('sql_seconds', 0.0))
+
+def observe_response_times(alert):
+    """Feed the domain latency histograms after an alert is accepted or resolved"""
+    if not app.config['METRICS_ENABLED'] or alert.timestamp is None:
+        return
+    if alert.status == 'accepted' and alert.accepted_at:
+        ALERT_TIME_TO_ACCEPT.observe(alert.alert_type, value=(alert.accepted_at - alert.timestamp).total_seconds())
+    elif alert.status == 'resolved' and alert.resolved_at:
+        ALERT_TIME_TO_RESOLVE.observe(alert.alert_type, value=(alert.resolved_at - alert.timestamp).total_seconds())
+        if alert.accepted_at:
+            ALERT_ACCEPT_TO_RESOLVE.observe(
+                alert.alert_type, value=(alert.resolved_at - alert.accepted_at).total_seconds()
+            )
 
 # API Routes
 @app.route('/')
@@ -52,15 +1099,47 @@ def index():
         return redirect(url_for('dashboard'))
     return render_template('login.html')
 
-@app.route('/login', methods=['POST'])
-def login():
+def find_login_user(username):
+    """Credentials and roles of ``username`` (None if unknown), from the user cache while fresh"""
+    user = user_cache.get(username)
+    if user is None:
+        row = db.session.query(
+            User.id, User.username, User.password_hash, User.is_admin, User.is_ambulance_driver
+        ).filter_by(username=username).first()
+        if row is None:
+            return None
+        user = CachedUser(*row)
+        user_cache.put(username, user)
+    return user
+
+def login_credentials():
+    """The user a login request names (None if unknown) and the password it gives"""
     data = request.get_json()
-    username = data.get('username')
     password = data.get('password')
+    return find_login_user(data.get('username')), password if isinstance(password, str) else None
+
+@app.route('/login', methods=['POST'])
+def login():
+    user, password = login_credentials()
+    # The ASGI server checks the password on the hashing pool before calling the handler
+    verdict = request.environ.get('autorescue.login')
+    if user is None or password is None:
+        valid, rehashed = False, None
+    elif verdict is not None and verdict[0] == user.id:
+        valid, rehashed = verdict[1]
+    else:
+        valid, rehashed = password_hasher.verify(user.password_hash, password).result()
     
-    user = User.query.filter_by(username=username).first()
-    
-    if user and check_password_hash(user.password_hash, password):
+    if valid:
+        if rehashed:
+            # Stored with another method or cost than PASSWORD_HASH_METHOD
+            db.session.execute(
+                update(User)
+                .where(User.id == user.id, User.password_hash == user.password_hash)
+                .values(password_hash=rehashed)
+                .execution_options(accounts={user.username})
+            )
+            db.session.commit()
         session['user_id'] = user.id
         session['username'] = user.username
         session['is_admin'] = user.is_admin
@@ -89,7 +1168,7 @@ def register():
     user = User(
         username=username,
         email=email,
-        password_hash=generate_password_hash(password)
+        password_hash=password_hasher.hash(password)
     )
     
     db.session.add(user)
@@ -112,7 +1191,17 @@ def dashboard():
     elif session.get('is_ambulance_driver'):
         return render_template('ambulance_dashboard.html')
     else:
-        return render_template('driver_dashboard.html')
+        return render_template(
+            'driver_dashboard.html',
+            server_detection=get_accident_detector() is not None
+        )
+
+@app.route('/sw.js')
+def service_worker():
+    """Served from the root so the SOS outbox worker controls every page"""
+    response = app.send_static_file('sw.js')
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 # API Endpoints
 @app.route('/api/alerts', methods=['POST'])
@@ -122,52 +1211,237 @@ def create_alert():
     
     data = request.get_json()
     
-    alert = Alert(
-        alert_type=data.get('alert_type', 'Accident'),
-        latitude=data.get('latitude'),
-        longitude=data.get('longitude'),
-        details=data.get('details', ''),
-        user_id=session['user_id'],
-        impact_magnitude=data.get('impact_magnitude')
-    )
+    # Offline clients retry with the same key until they see a response
+    idempotency_key = request.headers.get('Idempotency-Key') or data.get('idempotency_key')
+    if idempotency_key is not None and not (isinstance(idempotency_key, str) and 0 < len(idempotency_key) <= 64):
+        return jsonify({'error': 'Idempotency key must be a string of at most 64 characters'}), 400
     
-    db.session.add(alert)
-    db.session.commit()
+    if idempotency_key:
+        stored = replayed_request(idempotency_key, session['user_id'])
+        if stored is not None:
+            return replay_response(stored)
+    
+    try:
+        alert, created = ingest_alert(
+            alert_type=data.get('alert_type', 'Accident'),
+            latitude=data.get('latitude'),
+            longitude=data.get('longitude'),
+            details=data.get('details', ''),
+            user_id=session['user_id'],
+            impact_magnitude=data.get('impact_magnitude'),
+            idempotency_key=idempotency_key
+        )
+    except IntegrityError:
+        # A concurrent retry of the same request committed first
+        db.session.rollback()
+        stored = replayed_request(idempotency_key, session['user_id']) if idempotency_key else None
+        if stored is None:
+            raise
+        return replay_response(stored)
+    publish_alert_event('alert.created' if created else 'alert.updated', alert)
     
     return jsonify({
         'success': True,
         'alert_id': alert.id,
-        'message': 'Alert created successfully'
+        'merged': not created,
+        'reporter_count': alert.reporter_count or 1,
+        'message': 'Alert created successfully' if created else 'Alert merged into an existing incident'
     })
 
+def replay_response(stored):
+    alert = db.session.get(Alert, stored.alert_id)
+    return jsonify({
+        'success': True,
+        'alert_id': stored.alert_id,
+        'merged': bool(stored.merged),
+        'reporter_count': (alert.reporter_count if alert else None) or 1,
+        'replayed': True,
+        'message': 'Alert already received'
+    })
+
+def encode_cursor(sort_value, alert_id):
+    """Keyset position: the sort column value and id of the last row returned"""
+    return f"{sort_value.isoformat() if sort_value else ''}~{alert_id}"
+
+def decode_cursor(value):
+    sort_value, alert_id = value.rsplit('~', 1)
+    return (datetime.fromisoformat(sort_value) if sort_value else None), int(alert_id)
+
+def parse_since(value):
+    """`since` is either an alert id watermark or an ISO-8601 timestamp"""
+    if value.isdigit():
+        return int(value)
+    return datetime.fromisoformat(value)
+
+def parse_bbox(value):
+    """`bbox=min_lon,min_lat,max_lon,max_lat` (GeoJSON order) as geo.within_bbox arguments"""
+    min_lon, min_lat, max_lon, max_lat = (float(part) for part in value.split(','))
+    if not (-90 <= min_lat <= max_lat <= 90 and -180 <= min_lon <= 180 and -180 <= max_lon <= 180):
+        raise ValueError('bbox out of range')
+    return min_lat, min_lon, max_lat, max_lon
+
 @app.route('/api/alerts', methods=['GET'])
 def get_alerts():
     if 'user_id' not in session:
         return jsonify({'error': 'Unauthorized'}), 401
     
-    if session.get('is_admin'):
-        alerts = Alert.query.order_by(Alert.timestamp.desc()).all()
+    scope = 'admin' if session.get('is_admin') else f"user:{session['user_id']}"
+    return conditional_json(scope, list_alerts)
+
+def list_alerts():
+    # `archived=1` pages through alerts moved to the archive; it is always paginated
+    model = ArchivedAlert if request.args.get('archived') in ('1', 'true') else Alert
+    try:
+        fields, layout = response_layout(ALERT_FIELDS)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    query = db.session.query(*alert_columns(model, fields))
+    if not session.get('is_admin'):
+        # Their own alerts and the ones their reports were merged into
+        query = query.filter(or_(model.user_id == session['user_id'], model.id.in_(
+            db.select(AlertReporter.alert_id).where(AlertReporter.user_id == session['user_id']))))
+    
+    # Without paging parameters keep returning the full list as a plain array
+    if model is Alert and not any(arg in request.args for arg in ('limit', 'cursor', 'since', 'status', 'bbox', 'region')):
+        return json_rows(query.order_by(model.timestamp.desc()).all(), fields, layout)
+    
+    # Taken before querying so the next `since` sync cannot miss a concurrent change
+    sync_token = datetime.utcnow().isoformat()
+    
+    statuses = [status for status in request.args.get('status', '').split(',') if status]
+    if statuses:
+        query = query.filter(model.status.in_(statuses))
+    
+    # Geohash prefixes: a region tile or any larger area containing tiles
+    prefixes = [prefix.lower() for prefix in request.args.get('region', '').split(',') if prefix]
+    if any(set(prefix) - set(regions.BASE32) for prefix in prefixes):
+        return jsonify({'error': 'Invalid region parameter'}), 400
+    if prefixes:
+        query = query.filter(or_(*(model.region.startswith(prefix[:regions.PRECISION]) for prefix in prefixes)))
+    
+    try:
+        limit = int(request.args.get('limit', app.config['ALERTS_PAGE_SIZE']))
+        cursor = decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+        since = parse_since(request.args['since']) if request.args.get('since') else None
+        bbox = parse_bbox(request.args['bbox']) if request.args.get('bbox') else None
+    except ValueError:
+        return jsonify({'error': 'Invalid limit, cursor, since or bbox parameter'}), 400
+    limit = min(max(limit, 1), app.config['ALERTS_MAX_PAGE_SIZE'])
+    
+    if bbox:
+        query = query.filter(geo.within_bbox(model.latitude, model.longitude, *bbox, spatial=use_spatial_sql()))
+    
+    if since is None:
+        # History mode: newest first, keyset-paginated on (timestamp, id)
+        sort_column = model.timestamp
+        if cursor:
+            query = query.filter(or_(
+                model.timestamp < cursor[0],
+                and_(model.timestamp == cursor[0], model.id < cursor[1])
+            ))
+        query = query.order_by(model.timestamp.desc(), model.id.desc())
+    elif isinstance(since, int):
+        # Delta mode by id watermark: alerts created after a known alert id
+        sort_column = None
+        if cursor:
+            since = max(since, cursor[1])
+        query = query.filter(model.id > since).order_by(model.id.asc())
     else:
-        alerts = Alert.query.filter_by(user_id=session['user_id']).order_by(Alert.timestamp.desc()).all()
+        # Delta mode by time: rows changed since the last sync, oldest change first
+        sort_column = model.updated_at
+        query = query.filter(model.updated_at >= since - timedelta(seconds=app.config['ALERTS_SYNC_OVERLAP']))
+        if cursor:
+            query = query.filter(or_(
+                model.updated_at > cursor[0],
+                and_(model.updated_at == cursor[0], model.id > cursor[1])
+            ))
+        query = query.order_by(model.updated_at.asc(), model.id.asc())
     
-    alerts_data = []
-    for alert in alerts:
-        alerts_data.append({
-            'id': alert.id,
-            'alert_type': alert.alert_type,
-            'latitude': alert.latitude,
-            'longitude': alert.longitude,
-            'timestamp': alert.timestamp.isoformat(),
-            'resolved': alert.resolved,
-            'details': alert.details,
-            'impact_magnitude': alert.impact_magnitude,
-            'status': alert.status,
-            'assigned_ambulance_id': alert.assigned_ambulance_id,
-            'accepted_at': alert.accepted_at.isoformat() if alert.accepted_at else None,
-            'resolved_at': alert.resolved_at.isoformat() if alert.resolved_at else None
-        })
+    # The cursor's id and sort value follow the requested fields
+    query = query.add_columns(model.id, *([sort_column] if sort_column is not None else []))
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last[len(fields) + 1] if sort_column is not None else None, last[len(fields)])
     
-    return jsonify(alerts_data)
+    return json_rows(rows, fields, layout, 'alerts', next_cursor=next_cursor, sync_token=sync_token)
+
+@app.route('/api/alerts/triage')
+def get_triage_queue():
+    """Open alerts, most urgent first, with their priority and SLA escalation flag"""
+    if 'user_id' not in session or not session.get('is_admin'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    try:
+        limit = int(request.args.get('limit', 20))
+    except ValueError:
+        return jsonify({'error': 'Invalid limit parameter'}), 400
+    limit = min(max(limit, 1), app.config['ALERTS_MAX_PAGE_SIZE'])
+    statuses = {status for status in request.args.get('status', '').split(',') if status} or None
+    
+    queue = refresh_triage_queue()
+    entries = queue.top(limit, statuses)
+    alerts = {alert.id: alert for alert in Alert.query.filter(Alert.id.in_([entry.alert_id for entry in entries]))}
+    
+    triaged = []
+    for entry in entries:
+        alert = alerts.get(entry.alert_id)
+        if alert is None or alert.status not in OPEN_STATUSES:
+            queue.remove(entry.alert_id)
+            continue
+        alert_data = alert_to_dict(alert)
+        alert_data['priority'] = round(queue.priority(entry), 1)
+        alert_data['escalated'] = entry.escalated
+        triaged.append(alert_data)
+    
+    return jsonify(triaged)
+
+@app.route('/api/stats')
+def get_stats():
+    """Alerts per status plus hourly/daily rollups, read from the maintained counters"""
+    if 'user_id' not in session or not session.get('is_admin'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    try:
+        hours = int(request.args.get('hours', app.config['STATS_HOURS']))
+        days = int(request.args.get('days', app.config['STATS_DAYS']))
+    except ValueError:
+        return jsonify({'error': 'Invalid hours or days parameter'}), 400
+    max_days = app.config['STATS_MAX_DAYS']
+    hours = min(max(hours, 0), max_days * 24)
+    days = min(max(days, 0), max_days)
+    
+    def serialize(bucket):
+        return {
+            'start': bucket['start'].isoformat(),
+            'counts': bucket['counts'],
+            'mean_time_to_accept': stats.mean_seconds(bucket['totals'], 'accepted'),
+            'mean_time_to_resolve': stats.mean_seconds(bucket['totals'], 'resolved')
+        }
+    
+    now = datetime.utcnow()
+    counts = alert_stats.status_counts(db.session)
+    hourly = alert_stats.series(db.session, 'hour', now - timedelta(hours=hours - 1)) if hours else []
+    daily = alert_stats.series(db.session, 'day', now - timedelta(days=days - 1)) if days else []
+    
+    # Window means weight every accepted/resolved alert in the hourly range equally
+    totals = {}
+    for bucket in hourly:
+        for status, (timed, seconds) in bucket['totals'].items():
+            previous = totals.get(status, (0, 0.0))
+            totals[status] = (previous[0] + timed, previous[1] + seconds)
+    
+    return jsonify({
+        'counts': counts,
+        'total': sum(counts.values()),
+        'open': sum(counts[status] for status in OPEN_STATUSES),
+        'mean_time_to_accept': stats.mean_seconds(totals, 'accepted'),
+        'mean_time_to_resolve': stats.mean_seconds(totals, 'resolved'),
+        'hourly': [serialize(bucket) for bucket in hourly],
+        'daily': [serialize(bucket) for bucket in daily]
+    })
 
 @app.route('/api/alerts/<int:alert_id>/resolve', methods=['PATCH'])
 def resolve_alert(alert_id):
@@ -175,10 +1449,17 @@ def resolve_alert(alert_id):
         return jsonify({'error': 'Unauthorized'}), 401
     
     alert = Alert.query.get_or_404(alert_id)
-    alert.resolved = True
-    alert.status = 'resolved'
+    previous = alert.status
+    resolved_at = alert.resolved_at or datetime.utcnow()
+    if not claim_status(alert, previous, 'resolved', resolved_at, resolved=True, resolved_at=resolved_at):
+        db.session.rollback()
+        return jsonify({'error': 'Alert was changed by another request'}), 409
     
     db.session.commit()
+    alert_clusters.remove(alert.id)
+    observe_response_times(alert)
+    publish_alert_event('alert.updated', alert)
+    log_events([status_event(alert, previous)])
     
     return jsonify({'success': True, 'message': 'Alert resolved'})
 
@@ -188,9 +1469,14 @@ def verify_alert(alert_id):
         return jsonify({'error': 'Unauthorized'}), 401
     
     alert = Alert.query.get_or_404(alert_id)
-    alert.status = 'verified'
+    previous = alert.status
+    if not claim_status(alert, previous, 'verified'):
+        db.session.rollback()
+        return jsonify({'error': 'Alert was changed by another request'}), 409
     
     db.session.commit()
+    publish_alert_event('alert.updated', alert)
+    log_events([status_event(alert, previous)])
     
     return jsonify({'success': True, 'message': 'Alert verified'})
 
@@ -200,50 +1486,137 @@ def dispatch_alert(alert_id):
         return jsonify({'error': 'Unauthorized'}), 401
     
     alert = Alert.query.get_or_404(alert_id)
-    alert.status = 'dispatched'
+    previous = alert.status
+    # Rank the nearest available units; only they are offered the alert. The
+    # ranking is stored with it so every worker shows drivers the same list
+    candidates = rank_ambulances(alert)
+    ranked = [[unit_id, round(distance, 1), round(eta) if eta is not None else None]
+              for unit_id, distance, eta in candidates]
+    if not claim_status(alert, previous, 'dispatched', dispatch_candidates=json.dumps(ranked)):
+        db.session.rollback()
+        return jsonify({'error': 'Alert was changed by another request'}), 409
     
     db.session.commit()
     
-    return jsonify({'success': True, 'message': 'Alert dispatched to responders'})
+    publish_alert_event('alert.updated', alert, candidates)
+    log_events([status_event(alert, previous, candidates=ranked)])
+    
+    return jsonify({
+        'success': True,
+        'message': 'Alert dispatched to responders',
+        'candidates': [
+            {'ambulance_id': unit_id, 'distance_m': round(distance, 1),
+             'eta_s': round(eta) if eta is not None else None}
+            for unit_id, distance, eta in candidates
+        ]
+    })
+
+def parse_fix_time(value):
+    """GPS fix time as epoch seconds from epoch milliseconds or ISO-8601, capped at now (ValueError if implausible)"""
+    return ingest.parse_timestamp(value)
 
 @app.route('/api/ambulance/update-location', methods=['POST'])
 def update_ambulance_location():
     if 'user_id' not in session or not session.get('is_ambulance_driver'):
         return jsonify({'error': 'Unauthorized'}), 401
     
-    data = request.get_json()
-    user = User.query.get(session['user_id'])
+    data = request.get_json() or {}
+    user_id = session['user_id']
     
-    if user:
-        user.current_latitude = data.get('latitude')
-        user.current_longitude = data.get('longitude')
-        db.session.commit()
-        return jsonify({'success': True})
+    # Accept a single fix or a batch: {"points": [{"latitude", "longitude", "timestamp"}, ...]}
+    try:
+        fixes = [
+            (float(point['latitude']), float(point['longitude']), parse_fix_time(point.get('timestamp')))
+            for point in (data.get('points') or [data])
+        ]
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'Invalid location payload'}), 400
+    # NaN, infinities and out-of-range coordinates would poison the dispatch index and region tiles
+    if not all(ingest.valid_positions([fix[0] for fix in fixes], [fix[1] for fix in fixes])):
+        return jsonify({'error': 'Invalid location payload'}), 400
     
-    return jsonify({'error': 'User not found'}), 404
+    # Only the first ping from a driver touches the database
+    if location_buffer.is_available(user_id) is None:
+        user = db.session.get(User, user_id)
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+        remember_driver(user)
+    
+    latest = max(range(len(fixes)), key=lambda i: (fixes[i][2], i))
+    location_buffer.record(user_id, *fixes[latest])
+    ensure_dispatch_index()
+    sync_dispatch_index(user_id)
+    schedule_location_flush()
+    log_events([location_event(user_id, *fix, 'api') for fix in fixes])
+    
+    return jsonify({'success': True, 'accepted': len(fixes)})
+
+@app.route('/api/ambulances')
+def get_ambulances():
+    """Ambulance positions for the admin map, served from the location buffer"""
+    if 'user_id' not in session or not session.get('is_admin'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    ensure_dispatch_index()
+    positions = location_buffer.positions()
+    drivers = db.session.query(User.id, User.username, User.driver_id).filter(
+        User.is_ambulance_driver.is_(True)
+    ).all()
+    
+    ambulances = []
+    for user_id, username, driver_id in drivers:
+        latitude, longitude, recorded_at = positions.get(user_id, (None, None, 0.0))
+        ambulances.append({
+            'id': user_id,
+            'username': username,
+            'driver_id': driver_id,
+            'latitude': latitude,
+            'longitude': longitude,
+            'is_available': location_buffer.is_available(user_id),
+            'last_seen': datetime.utcfromtimestamp(recorded_at).isoformat() if recorded_at else None
+        })
+    
+    return jsonify(ambulances)
 
 @app.route('/api/ambulance/accept-alert/<int:alert_id>', methods=['POST'])
 def accept_alert(alert_id):
     if 'user_id' not in session or not session.get('is_ambulance_driver'):
         return jsonify({'error': 'Unauthorized'}), 401
     
-    alert = Alert.query.get_or_404(alert_id)
-    
-    # Check if alert is already accepted
-    if alert.status == 'accepted':
-        return jsonify({'error': 'Alert already accepted by another driver'}), 400
-    
-    # Update alert status
-    alert.status = 'accepted'
-    alert.assigned_ambulance_id = session['user_id']
-    alert.accepted_at = datetime.utcnow()
+    # Compare-and-set on status in a single UPDATE: the database serialises
+    # concurrent accepts on the row, so exactly one driver matches the WHERE.
+    # Only dispatched alerts are offered to drivers, which also tells the
+    # stats counters which status the winner left.
+    now = datetime.utcnow()
+    claim = (
+        update(Alert)
+        .where(Alert.id == alert_id, Alert.status == 'dispatched')
+        .values(status='accepted', assigned_ambulance_id=session['user_id'], accepted_at=now, updated_at=now)
+        # The alert's region is only known once the claim returns it
+        .execution_options(synchronize_session=False, alert_regions=())
+    )
+    if db.engine.dialect.update_returning:
+        alert = db.session.scalars(claim.returning(Alert)).first()
+    else:
+        alert = db.session.get(Alert, alert_id) if db.session.execute(claim).rowcount else None
+    if alert is None:
+        db.session.rollback()
+        return jsonify({'error': 'Alert already accepted by another driver'}), 409
     
-    # Mark driver as unavailable
-    user = User.query.get(session['user_id'])
-    if user:
-        user.is_available = False
+    note_alert_regions(db.session, [alert.region])
+    note_offer(stored_candidate_ids(alert.dispatch_candidates))
     
+    # Mark driver as unavailable in the same transaction
+    db.session.execute(
+        update(User).where(User.id == session['user_id']).values(is_available=False).execution_options(accounts=())
+    )
+    record_status_change('dispatched', 'accepted', alert.timestamp, now)
     db.session.commit()
+    location_buffer.set_available(session['user_id'], False)
+    sync_dispatch_index(session['user_id'])
+    observe_response_times(alert)
+    publish_alert_event('alert.updated', alert)
+    log_events([status_event(alert, 'dispatched')])
     
     return jsonify({'success': True, 'message': 'Alert accepted successfully'})
 
@@ -259,16 +1632,24 @@ def resolve_alert_by_ambulance(alert_id):
         return jsonify({'error': 'Not authorized to resolve this alert'}), 403
     
     # Update alert status
-    alert.status = 'resolved'
-    alert.resolved = True
-    alert.resolved_at = datetime.utcnow()
+    previous = alert.status
+    resolved_at = datetime.utcnow()
+    if not claim_status(alert, previous, 'resolved', resolved_at, resolved=True, resolved_at=resolved_at):
+        db.session.rollback()
+        return jsonify({'error': 'Alert was changed by another request'}), 409
     
-    # Mark driver as available again
-    user = User.query.get(session['user_id'])
-    if user:
-        user.is_available = True
+    # Mark driver as available again, without loading the user
+    db.session.execute(
+        update(User).where(User.id == session['user_id']).values(is_available=True).execution_options(accounts=())
+    )
     
     db.session.commit()
+    alert_clusters.remove(alert.id)
+    observe_response_times(alert)
+    location_buffer.set_available(session['user_id'], True)
+    sync_dispatch_index(session['user_id'])
+    publish_alert_event('alert.updated', alert)
+    log_events([status_event(alert, previous)])
     
     return jsonify({'success': True, 'message': 'Alert resolved successfully'})
 
@@ -277,84 +1658,474 @@ def get_ambulance_alerts():
     if 'user_id' not in session or not session.get('is_ambulance_driver'):
         return jsonify({'error': 'Unauthorized'}), 401
     
-    # Get dispatched alerts (not yet accepted)
-    dispatched_alerts = Alert.query.filter_by(status='dispatched').all()
+    # Candidates also depend on driver positions and SLA escalations, which
+    # change without an alert write, so reuse is limited to a short time slot
+    slot = int(time.time() // app.config['ALERTS_CACHE_TTL'])
+    ensure_dispatch_index()
+    # A located driver's feed only covers nearby tiles and alerts it was ranked
+    # for, so other writes elsewhere keep it cached
+    nearby = driver_regions(session['user_id'])
+    scope = f"driver:{session['user_id']}:{min(nearby) if nearby else '*'}"
+    return conditional_json(scope, lambda: list_dispatched_alerts(nearby), slot, regions=nearby,
+                            users=(session['user_id'],))
+
+def list_dispatched_alerts(nearby=None):
+    try:
+        fields, layout = response_layout(DISPATCHED_FIELDS)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    alerts_data = []
+    driver_id = session['user_id']
+    
+    # Get dispatched alerts (not yet accepted) in the driver's tiles or ranked
+    # for it from further away, most urgent first
+    stored = DISPATCHED_FIELDS[:DISPATCHED_FIELDS.index('priority')]
+    query = db.session.query(*alert_columns(Alert, stored), Alert.dispatch_candidates).filter(
+        Alert.status == 'dispatched')
+    if nearby is not None:
+        # Stored candidates are json.dumps rows, so a unit id is always preceded by '['
+        query = query.filter(or_(Alert.region.in_(sorted(nearby)),
+                                 Alert.dispatch_candidates.contains(f'[{driver_id},', autoescape=True),
+                                 func.coalesce(Alert.dispatch_candidates, '[]') == '[]'))
+    dispatched_alerts = query.all()
+    refresh_triage_queue()
+    dispatched_alerts.sort(key=triage_sort_key)
+    
+    rows = []
     for alert in dispatched_alerts:
-        alerts_data.append({
-            'id': alert.id,
-            'alert_type': alert.alert_type,
-            'latitude': alert.latitude,
-            'longitude': alert.longitude,
-            'timestamp': alert.timestamp.isoformat(),
-            'details': alert.details,
-            'impact_magnitude': alert.impact_magnitude,
-            'status': alert.status
-        })
+        # Ranked once at dispatch; located, available drivers only see alerts
+        # they were among the nearest units for
+        *values, candidates = alert
+        candidates = json.loads(candidates) if candidates else []
+        ranked_ids = [unit_id for unit_id, _, _ in candidates]
+        if not offered(ranked_ids, driver_id):
+            continue
+        
+        # Triage and candidate fields are null when the alert has no entry or the driver no rank
+        entry = triage_queue.get(alert.id)
+        priority, escalated = (round(triage_queue.priority(entry), 1), entry.escalated) if entry else (None, None)
+        rank = distance = eta = None
+        if driver_id in ranked_ids:
+            rank = ranked_ids.index(driver_id)
+            _, distance, eta = candidates[rank]
+            rank += 1
+        rows.append(tuple(values) + (priority, escalated, rank, distance, eta))
     
-    return jsonify(alerts_data)
+    return json_rows(serialize.project(rows, DISPATCHED_FIELDS, fields), fields, layout)
 
 @app.route('/api/ambulance/my-alerts')
 def get_my_ambulance_alerts():
     if 'user_id' not in session or not session.get('is_ambulance_driver'):
         return jsonify({'error': 'Unauthorized'}), 401
     
+    return conditional_json(f"driver:{session['user_id']}", list_assigned_alerts)
+
+def list_assigned_alerts():
+    try:
+        fields, layout = response_layout(ASSIGNED_FIELDS)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
     # Get alerts assigned to this driver
-    my_alerts = Alert.query.filter_by(assigned_ambulance_id=session['user_id']).order_by(Alert.timestamp.desc()).all()
-    
-    alerts_data = []
-    for alert in my_alerts:
-        alerts_data.append({
-            'id': alert.id,
-            'alert_type': alert.alert_type,
-            'latitude': alert.latitude,
-            'longitude': alert.longitude,
-            'timestamp': alert.timestamp.isoformat(),
-            'accepted_at': alert.accepted_at.isoformat() if alert.accepted_at else None,
-            'resolved_at': alert.resolved_at.isoformat() if alert.resolved_at else None,
-            'details': alert.details,
-            'impact_magnitude': alert.impact_magnitude,
-            'status': alert.status
-        })
+    my_alerts = db.session.query(*alert_columns(Alert, fields)).filter(
+        Alert.assigned_ambulance_id == session['user_id']
+    ).order_by(Alert.timestamp.desc()).all()
+    
+    return json_rows(my_alerts, fields, layout)
+
+@app.route('/api/events')
+def alert_events():
+    """Server-Sent Events stream of alert changes for the current user"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    audience = (session['user_id'], bool(session.get('is_admin')), bool(session.get('is_ambulance_driver')))
+    heartbeat = app.config['EVENT_STREAM_HEARTBEAT']
+    max_age = app.config['EVENT_STREAM_MAX_AGE']
+    cursor = event_stream_cursor()
+    
+    def stream():
+        position, frames = open_event_stream(cursor)
+        yield from frames
+        channels = event_channels(*audience)
+        deadline = time.monotonic() + max_age
+        # A closed hub means the worker is shutting down; clients resume elsewhere
+        while time.monotonic() < deadline and not event_hub.closed:
+            events, complete = event_hub.wait(position, heartbeat, channels)
+            position, frames, channels = follow_regions(position, channels, audience)
+            if frames:
+                yield from frames
+                continue
+            if not events and complete:
+                yield ': keepalive\n\n'
+                continue
+            position, frames = event_frames(position, events, complete, audience)
+            yield from frames
+    
+    return Response(stream(), mimetype='text/event-stream', headers=EVENT_STREAM_HEADERS)
+
+EVENT_STREAM_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+def event_id(seq):
+    """SSE id of a hub position: `<hub instance>-<seq>`"""
+    return f'{event_hub.instance}-{seq}'
+
+def event_stream_cursor():
+    """Hub position to resume from (EventSource sends Last-Event-ID when it reconnects).
+
+    None when the id was issued by another worker's hub, or before a
+    restart: its sequence numbers say nothing about this one.
+    """
+    last_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    if not last_id:
+        return event_hub.last_seq
+    instance, _, seq = last_id.rpartition('-')
+    if instance != event_hub.instance or not seq.isdigit():
+        return None
+    return int(seq)
+
+def open_event_stream(cursor):
+    """Opening frames of a stream and the position to continue from"""
+    frames = ['retry: 3000\n\n']
+    if cursor is None or cursor > event_hub.last_seq:
+        # Resumed on another hub: start from its present and have the client catch up from the API
+        cursor = event_hub.last_seq
+        frames.append(format_sse(event_id(cursor), 'resync', {}))
+    return cursor, frames
+
+def follow_regions(position, channels, audience):
+    """Re-subscribe a stream whose driver has moved to other tiles.
+
+    The driver's feed now covers other alerts, so the client is told to
+    resync; returns (position, frames, channels).
+    """
+    current = event_channels(*audience)
+    if current == channels:
+        return position, [], channels
+    position = event_hub.last_seq
+    return position, [format_sse(event_id(position), 'resync', {})], current
+
+def event_frames(position, events, complete, audience):
+    """Frames for hub events visible to ``audience`` (user_id, is_admin, is_ambulance_driver)"""
+    frames = []
+    if not complete:
+        # Events filtered to a stream's channels may all be gone
+        resync = events[0][0] - 1 if events else event_hub.last_seq
+        frames.append(format_sse(event_id(resync), 'resync', {}))
+        position = max(position, resync)
+    for seq, event_type, data in events:
+        position = seq
+        if event_visible(data, *audience):
+            payload = {key: value for key, value in data.items() if not key.startswith('_')}
+            frames.append(format_sse(event_id(seq), event_type, payload))
+    return position, frames
+
+# Server-side accident detector, created on first upload when enabled
+_accident_detector = None
+
+def get_accident_detector():
+    global _accident_detector
+    if not app.config['SERVER_DETECTION_ENABLED'] or not detection.available:
+        return None
+    if _accident_detector is None:
+        _accident_detector = detection.AccidentDetector(
+            threshold=app.config['ACCELERATION_THRESHOLD'],
+            window=app.config['SMOOTHING_WINDOW'],
+            jerk_threshold=app.config['DETECTION_JERK_THRESHOLD'],
+            cooldown=app.config['DETECTION_COOLDOWN']
+        )
+    return _accident_detector
+
+def read_request_body(max_bytes):
+    """Raw request body, gunzipped if sent with Content-Encoding: gzip"""
+    data = request.get_data(cache=False)
+    if request.content_encoding == 'gzip':
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            data = decompressor.decompress(data, max_bytes + 1)
+        except zlib.error:
+            raise ValueError('Invalid gzip body')
+    if len(data) > max_bytes:
+        raise ValueError('Request body too large')
+    return data
+
+@app.route('/api/telemetry/accelerometer', methods=['POST'])
+def upload_accelerometer():
+    """Run server-side accident detection over a batch of raw accelerometer frames"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    detector = get_accident_detector()
+    if detector is None:
+        return jsonify({'error': 'Server-side detection is not enabled'}), 404
+    
+    max_frames = app.config['DETECTION_MAX_FRAMES']
+    try:
+        # JSON frames are far larger than packed ones; allow generous text per frame
+        payload = read_request_body(max_frames * 128)
+        frames, metadata = detection.decode_frames(payload, request.content_type)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if len(frames) > max_frames:
+        return jsonify({'error': f'At most {max_frames} frames per upload'}), 413
+    
+    latitude = metadata.get('latitude', request.args.get('latitude'))
+    longitude = metadata.get('longitude', request.args.get('longitude'))
+    # Check the position before detection runs: a detection starts the vehicle's cooldown
+    if latitude is not None or longitude is not None:
+        try:
+            latitude, longitude = float(latitude), float(longitude)
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Invalid position'}), 400
+        if not ingest.valid_positions([latitude], [longitude])[0]:
+            return jsonify({'error': 'Invalid position'}), 400
+    
+    detections = detector.process([(session['user_id'], frames)])
+    
+    alerts = []
+    for detected in detections:
+        if latitude is None or longitude is None:
+            continue
+        alert, created = ingest_alert(
+            alert_type='Accident',
+            latitude=latitude,
+            longitude=longitude,
+            details=f'Impact magnitude: {detected.peak_magnitude:.1f} m/s² (server-side detection)',
+            user_id=session['user_id'],
+            impact_magnitude=detected.peak_magnitude,
+            source='telemetry'
+        )
+        publish_alert_event('alert.created' if created else 'alert.updated', alert)
+        if alert not in alerts:
+            alerts.append(alert)
+    
+    return jsonify({
+        'success': True,
+        'frames': len(frames),
+        'detections': [
+            {
+                'timestamp': detected.timestamp,
+                'magnitude': round(detected.magnitude, 2),
+                'peak_magnitude': round(detected.peak_magnitude, 2),
+                'jerk': round(detected.jerk, 2)
+            }
+            for detected in detections
+        ],
+        'alert_ids': [alert.id for alert in alerts]
+    })
+
+def request_chunks(max_bytes, chunk_size=65536):
+    """Request body in chunks as it arrives, gunzipped if sent with Content-Encoding: gzip"""
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS) if request.content_encoding == 'gzip' else None
+    total = 0
+    while True:
+        chunk = request.stream.read(chunk_size)
+        if not chunk:
+            return
+        if decompressor is not None:
+            try:
+                chunk = decompressor.decompress(chunk, max_bytes - total + 1)
+            except zlib.error:
+                raise ingest.BatchError('Invalid gzip body')
+        total += len(chunk)
+        if total > max_bytes:
+            raise ingest.BatchError('Request body too large', 413)
+        yield chunk
+
+def in_chunks(column, values, size=500):
+    """``column IN values`` split so large batches stay under bind parameter limits"""
+    values = list(values)
+    if not values:
+        return false()
+    return or_(*(column.in_(values[start:start + size]) for start in range(0, len(values), size)))
+
+def apply_location_batch(columns):
+    """Buffer validated fixes (``ingest.parse_locations`` columns); returns (accepted indexes, errors)"""
+    names = {driver for driver in columns['driver'] if isinstance(driver, str)}
+    ids = {driver for driver in columns['driver'] if isinstance(driver, int)}
+    drivers = {}
+    if names or ids:
+        rows = db.session.query(
+            User.id, User.driver_id, User.is_available, User.current_latitude, User.current_longitude
+        ).filter(
+            User.is_ambulance_driver.is_(True),
+            or_(in_chunks(User.driver_id, names), in_chunks(User.id, ids))
+        )
+        for row in rows:
+            drivers[row.id] = row
+            if row.driver_id:
+                drivers[row.driver_id] = row
+    
+    accepted, errors, latest, logged = [], [], {}, []
+    for index, driver, latitude, longitude, recorded_at in zip(
+        columns['index'], columns['driver'], columns['latitude'], columns['longitude'], columns['recorded_at']
+    ):
+        row = drivers.get(driver)
+        if row is None:
+            errors.append((index, 'location', 'Unknown ambulance driver'))
+            continue
+        accepted.append(index)
+        logged.append(location_event(row.id, latitude, longitude, recorded_at, 'ingest'))
+        if row.id not in latest or latest[row.id][2] <= recorded_at:
+            latest[row.id] = (latitude, longitude, recorded_at)
+    
+    if latest:
+        ensure_dispatch_index()
+        for user_id, fix in latest.items():
+            if location_buffer.is_available(user_id) is None:
+                remember_driver(drivers[user_id])
+            location_buffer.record(user_id, *fix)
+            sync_dispatch_index(user_id)
+        schedule_location_flush()
+    log_events(logged)
+    return accepted, errors
+
+@app.route('/api/ingest', methods=['POST'])
+def ingest_batch():
+    """Bulk upload of alerts and ambulance positions from fleet gateways (bearer token auth)"""
+    tokens = app.config['INGEST_TOKENS']
+    if not tokens:
+        return jsonify({'error': 'Batch ingestion is not enabled'}), 404
+    supplied = request.headers.get('Authorization', '')
+    if not any(hmac.compare_digest(supplied, f'Bearer {token}') for token in tokens):
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    now = time.time()
+    try:
+        chunks = request_chunks(app.config['INGEST_MAX_BYTES'])
+        if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+            items = ingest.iter_ndjson(chunks)
+        else:
+            items = ingest.json_items(b''.join(chunks))
+        alert_items, location_items, errors = ingest.split_items(items, app.config['INGEST_MAX_ITEMS'])
+    except ingest.BatchError as e:
+        return jsonify({'error': str(e)}), e.status
+    
+    alerts, alert_errors = ingest.parse_alerts(alert_items, now)
+    locations, location_errors = ingest.parse_locations(location_items, now)
+    errors += alert_errors + location_errors
     
-    return jsonify(alerts_data)
+    # Reporting users must exist (alert.user_id is a foreign key)
+    user_ids = {user_id for user_id in alerts['user_id'] if user_id is not None}
+    if user_ids:
+        known = {user_id for (user_id,) in db.session.query(User.id).filter(in_chunks(User.id, user_ids))}
+        keep = [user_id is None or user_id in known for user_id in alerts['user_id']]
+        errors += [(index, 'alert', 'Unknown user_id') for index, ok in zip(alerts['index'], keep) if not ok]
+        alerts = ingest.select_rows(alerts, keep)
+    
+    created, merged_ids = [], []
+    results = []
+    if alerts['index']:
+        outcomes, created, merged_ids = ingest_alert_batch(alerts)
+        db.session.commit()
+        log_events([
+            report_event(alert_id, new, 'ingest', user_id=user_id, alert_type=alert_type, latitude=latitude,
+                         longitude=longitude, details=details, impact_magnitude=None if impact != impact else impact,
+                         reporter=reporter, reported_at=reported_at)
+            for (alert_id, new), alert_type, latitude, longitude, impact, details, user_id, reporter, reported_at
+            in zip(outcomes, alerts['alert_type'], alerts['latitude'], alerts['longitude'], alerts['impact'],
+                   alerts['details'], alerts['user_id'], alerts['reporter'], alerts['reported_at'])
+        ])
+        results += [
+            {'index': index, 'type': 'alert', 'status': 'created' if new else 'merged', 'alert_id': alert_id}
+            for index, (alert_id, new) in zip(alerts['index'], outcomes)
+        ]
+    publish_alert_events('alert.created', created)
+    if merged_ids:
+        publish_alert_events('alert.updated', Alert.query.filter(Alert.id.in_(merged_ids)).all())
+    
+    accepted, location_errors = apply_location_batch(locations)
+    errors += location_errors
+    results += [{'index': index, 'type': 'location', 'status': 'accepted'} for index in accepted]
+    results += [{'index': index, 'type': kind, 'status': 'rejected', 'error': error} for index, kind, error in errors]
+    results.sort(key=lambda result: result['index'])
+    
+    return jsonify({
+        'success': True,
+        'alerts': {
+            'created': sum(1 for result in results if result['status'] == 'created'),
+            'merged': sum(1 for result in results if result['status'] == 'merged')
+        },
+        'locations': {'accepted': len(accepted)},
+        'rejected': len(errors),
+        'results': results
+    })
+
+@app.cli.command('db-upgrade')
+def db_upgrade_command():
+    """Apply pending schema migrations to the configured database"""
+    applied = migrations.upgrade(db.engine, db.metadata)
+    print(f"Schema at version {migrations.current_version(db.engine)}"
+          + ('' if applied else ' (already up to date)'))
+
+@app.cli.command('compile-templates')
+def compile_templates_command():
+    """Compile every template into TEMPLATE_CACHE_DIR, so no process compiles them on first render"""
+    cache = app.jinja_env.bytecode_cache
+    if cache is None:
+        print('TEMPLATE_CACHE_DIR is not set')
+        return
+    os.makedirs(cache.directory, exist_ok=True)
+    names = app.jinja_env.list_templates()
+    for name in names:
+        app.jinja_env.get_template(name)
+    print(f"Compiled {len(names)} templates into {cache.directory}")
+
+@app.route('/api/metrics')
+def get_metrics():
+    """Prometheus text exposition of request, SQL, pool and alert response-time metrics"""
+    if not app.config['METRICS_ENABLED']:
+        return jsonify({'error': 'Metrics are disabled'}), 404
+    # Admin sessions, or scrapers presenting METRICS_TOKEN when one is configured
+    token = app.config['METRICS_TOKEN']
+    scraper = bool(token) and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+    if not (scraper or session.get('is_admin')):
+        return jsonify({'error': 'Unauthorized'}), 401
+    return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
 
 @app.route('/api/health')
 def health_check():
     return jsonify({'status': 'healthy', 'timestamp': datetime.utcnow().isoformat()})
 
-if __name__ == '__main__':
+def seed_default_users():
+    """Create the demo admin and ambulance accounts if they do not exist"""
+    # Create admin user if it doesn't exist
+    admin = User.query.filter_by(username='admin').first()
+    if not admin:
+        admin = User(
+            username='admin',
+            email='admin@autorescue.com',
+            password_hash=password_hasher.hash('admin123'),
+            is_admin=True
+        )
+        db.session.add(admin)
+        db.session.commit()
+        print("Admin user created: username=admin, password=admin123")
+    
+    # Create sample ambulance driver if it doesn't exist
+    ambulance = User.query.filter_by(username='ambulance1').first()
+    if not ambulance:
+        ambulance = User(
+            username='ambulance1',
+            email='ambulance1@autorescue.com',
+            password_hash=password_hasher.hash('ambulance123'),
+            is_ambulance_driver=True,
+            driver_id='AMB001',
+            is_available=True
+        )
+        db.session.add(ambulance)
+        db.session.commit()
+        print("Ambulance driver created: username=ambulance1, password=ambulance123")
+
+def prepare_database():
+    """Bring the schema up to date and seed it; run once per deployment, not per worker"""
     with app.app_context():
-        db.create_all()
-        
-        # Create admin user if it doesn't exist
-        admin = User.query.filter_by(username='admin').first()
-        if not admin:
-            admin = User(
-                username='admin',
-                email='admin@autorescue.com',
-                password_hash=generate_password_hash('admin123'),
-                is_admin=True
-            )
-            db.session.add(admin)
-            db.session.commit()
-            print("Admin user created: username=admin, password=admin123")
-        
-        # Create sample ambulance driver if it doesn't exist
-        ambulance = User.query.filter_by(username='ambulance1').first()
-        if not ambulance:
-            ambulance = User(
-                username='ambulance1',
-                email='ambulance1@autorescue.com',
-                password_hash=generate_password_hash('ambulance123'),
-                is_ambulance_driver=True,
-                driver_id='AMB001',
-                is_available=True
-            )
-            db.session.add(ambulance)
-            db.session.commit()
-            print("Ambulance driver created: username=ambulance1, password=ambulance123")
+        migrations.upgrade(db.engine, db.metadata)
+        if app.config['SEED_DEFAULT_USERS']:
+            seed_default_users()
+
+if __name__ == '__main__':
+    prepare_database()
     
     # Optional HTTPS support for mobile geolocation (required by browsers over network)
     # Configure via env:
@@ -381,4 +2152,4 @@ if __name__ == '__main__':
         except Exception as e:
             print(f"Failed to configure SSL: {e}. Starting HTTP.")
 
-    app.run(debug=True, host='0.0.0.0', port=5000, ssl_context=ssl_context)
+    app.run(debug=app.config['DEBUG'], host='0.0.0.0', port=5000, ssl_context=ssl_context)
@@ -0,0 +1,50 @@
+"""
+AutoRescue Alert Archive
+
+Alerts resolved more than ``ARCHIVE_AFTER_DAYS`` ago are moved out of the
+hot ``alert`` table into ``alert_archive`` (the same columns plus
+``archived_at``). The hot table then holds open incidents and recent history
+only, so the list, dispatch and triage queries touch the same number of rows
+however many years of history accumulate; old incidents stay available,
+paginated, from the archive.
+
+Each batch is a DELETE ... RETURNING on the hot table and an INSERT of the
+returned rows into the archive, in one transaction: exactly the rows removed
+are archived, and workers archiving at the same time cannot copy an alert
+twice (the second DELETE finds the rows already gone).
+"""
+
+from datetime import datetime
+
+from sqlalchemy import delete, func, insert, select
+
+
+def archivable(alerts, cutoff):
+    """Resolved alerts whose resolution is older than ``cutoff``"""
+    # Alerts resolved before resolved_at was tracked fall back to their last update
+    resolved_at = func.coalesce(alerts.c.resolved_at, alerts.c.updated_at, alerts.c.timestamp)
+    return (alerts.c.status == 'resolved') & (resolved_at < cutoff)
+
+
+def move_batch(session, alerts, archive, cutoff, batch_size, references=(), now=None):
+    """Archive up to ``batch_size`` alerts, oldest id first; returns how many moved.
+
+    ``references`` are columns of other tables pointing at alert ids; their
+    rows are deleted with the alerts they point to.
+    """
+    ids = select(alerts.c.id).where(archivable(alerts, cutoff)).order_by(alerts.c.id).limit(batch_size)
+    ids = [row[0] for row in session.execute(ids)]
+    if not ids:
+        return 0
+    for column in references:
+        session.execute(delete(column.table).where(column.in_(ids)))
+    matched = alerts.c.id.in_(ids) & archivable(alerts, cutoff)
+    if session.get_bind().dialect.delete_returning:
+        rows = session.execute(delete(alerts).where(matched).returning(*alerts.c)).mappings().all()
+    else:
+        rows = session.execute(select(alerts).where(matched).with_for_update()).mappings().all()
+        session.execute(delete(alerts).where(alerts.c.id.in_([row['id'] for row in rows])))
+    if rows:
+        now = now or datetime.utcnow()
+        session.execute(insert(archive), [dict(row, archived_at=now) for row in rows])
+    return len(rows)
@@ -0,0 +1,333 @@
+"""
+AutoRescue ASGI Entry Point
+
+Serves the same Flask application from an asyncio server such as uvicorn:
+
+    uvicorn asgi:application --host 0.0.0.0 --port 5000
+
+Ordinary requests run the unchanged Flask handlers on a bounded thread pool
+(``ASGI_THREADS``), so database work never blocks the event loop and never
+needs more connections than the pool has threads. Request bodies are passed
+through as they arrive, so streaming uploads such as NDJSON ingest still
+stream.
+
+The live event stream (``GET /api/events``) is served on the event loop
+itself: an idle subscriber is a suspended coroutine woken by the event hub,
+not a parked thread, so thousands of open dashboards cost no handler threads.
+
+Logins (``POST /login``) look the user up on the thread pool but wait for
+the password check on the hashing pool from the event loop, so a login storm
+does not tie up the handler threads other requests need.
+"""
+
+import asyncio
+import io
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import session
+
+import app as autorescue
+
+EVENT_STREAM_PATH = '/api/events'
+LOGIN_PATH = '/login'
+LOGIN_MAX_BYTES = 64 * 1024  # Larger login bodies go through the ordinary path
+
+
+class RequestBody(io.RawIOBase):
+    """``wsgi.input`` reading ASGI body messages from a worker thread"""
+
+    def __init__(self, receive, loop):
+        self.receive = receive
+        self.loop = loop
+        self.buffer = b''
+        self.more = True
+
+    def readable(self):
+        return True
+
+    def readinto(self, target):
+        while not self.buffer and self.more:
+            message = asyncio.run_coroutine_threadsafe(self.receive(), self.loop).result()
+            if message['type'] == 'http.disconnect':
+                self.more = False
+                break
+            self.buffer = message.get('body', b'')
+            self.more = message.get('more_body', False)
+        size = min(len(target), len(self.buffer))
+        target[:size] = self.buffer[:size]
+        self.buffer = self.buffer[size:]
+        return size
+
+
+def wsgi_environ(scope, body):
+    """PEP 3333 environ for an ASGI HTTP scope"""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.input_terminated': True,  # the server de-chunks bodies and ends them
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            key = name
+        else:
+            key = 'HTTP_' + name
+        environ[key] = environ[key] + ',' + value if key in environ else value
+    return environ
+
+
+class HubWaiter:
+    """Wakes coroutines on one event loop when the event hub publishes"""
+
+    def __init__(self, hub, loop):
+        self.hub = hub
+        self.loop = loop
+        self.changed = asyncio.Event()
+        # Channel -> events of coroutines waiting on it
+        self.waiting = {}
+        hub.add_listener(self.notify)
+
+    def notify(self, channels):
+        # Called on the publishing thread
+        self.loop.call_soon_threadsafe(self.wake, channels)
+
+    def wake(self, channels):
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+        if channels is None:
+            waiting = set().union(*self.waiting.values())
+        else:
+            waiting = set().union(*(self.waiting.get(channel, ()) for channel in channels))
+        for event in waiting:
+            event.set()
+
+    async def wait(self, seq, timeout, channels=None):
+        """(events, complete) after ``seq`` on ``channels``, once there are any or ``timeout`` elapses"""
+        if channels is None:
+            changed = self.changed
+            if self.hub.last_seq <= seq:
+                await self.wait_for(changed, timeout)
+            return self.hub.since(seq)
+        events, complete = self.hub.since(seq, channels)
+        if events or not complete:
+            return events, complete
+        # Only publishes to these channels (or to everyone) wake this coroutine
+        changed = asyncio.Event()
+        for channel in channels:
+            self.waiting.setdefault(channel, set()).add(changed)
+        try:
+            await self.wait_for(changed, timeout)
+        finally:
+            for channel in channels:
+                waiting = self.waiting[channel]
+                waiting.discard(changed)
+                if not waiting:
+                    del self.waiting[channel]
+        return self.hub.since(seq, channels)
+
+    @staticmethod
+    async def wait_for(event, timeout):
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def close(self):
+        self.hub.remove_listener(self.notify)
+
+
+class ASGIApplication:
+    """ASGI adapter running a Flask app's handlers on a bounded thread pool"""
+
+    def __init__(self, flask_app, threads=None):
+        self.app = flask_app
+        self.threads = threads or flask_app.config['ASGI_THREADS']
+        self.executor = None
+        self.waiter = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] != 'http':
+            # No WebSocket endpoints: refuse the handshake
+            await send({'type': 'websocket.close', 'code': 1000})
+            return
+        self.start()
+        if scope['path'] == EVENT_STREAM_PATH and scope['method'] == 'GET':
+            return await self.event_stream(scope, receive, send)
+        if scope['path'] == LOGIN_PATH and scope['method'] == 'POST':
+            return await self.login(scope, receive, send)
+        return await self.call_wsgi(scope, receive, send)
+
+    def start(self):
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(self.threads, thread_name_prefix='autorescue-handler')
+            self.waiter = HubWaiter(autorescue.event_hub, asyncio.get_running_loop())
+
+    def stop(self):
+        if self.waiter is not None:
+            self.waiter.close()
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+        # Write out positions still buffered for the next bulk flush
+        autorescue.location_flusher.stop()
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                self.start()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await asyncio.get_running_loop().run_in_executor(None, self.stop)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def call_wsgi(self, scope, receive, send, environ=None):
+        loop = asyncio.get_running_loop()
+        if environ is None:
+            environ = wsgi_environ(scope, io.BufferedReader(RequestBody(receive, loop)))
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                                   for name, value in headers]
+
+        def first_chunk():
+            # The handler and, for ordinary responses, the whole body in one hop
+            body = self.app(environ, start_response)
+            chunks = iter(body)
+            return body, chunks, next(chunks, None)
+
+        body, chunks, chunk = await loop.run_in_executor(self.executor, first_chunk)
+        try:
+            await send({'type': 'http.response.start', 'status': response['status'],
+                        'headers': response['headers']})
+            while chunk is not None:
+                if chunk:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                chunk = await loop.run_in_executor(self.executor, next, chunks, None)
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            if hasattr(body, 'close'):
+                await loop.run_in_executor(self.executor, body.close)
+
+    async def login(self, scope, receive, send):
+        """``login`` with the password check awaited instead of run on a handler thread"""
+        chunks = []
+        size = 0
+        more = True
+        while more and size <= LOGIN_MAX_BYTES:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            chunks.append(message.get('body', b''))
+            size += len(chunks[-1])
+            more = message.get('more_body', False)
+        body = b''.join(chunks)
+        if more:
+            # Hand the rest of the body to Flask as it arrives
+            loop = asyncio.get_running_loop()
+            reader = io.BufferedReader(RequestBody(receive, loop))
+            reader.raw.buffer = body
+            return await self.call_wsgi(scope, receive, send, wsgi_environ(scope, reader))
+
+        environ = wsgi_environ(scope, io.BytesIO(body))
+        user, password = await asyncio.get_running_loop().run_in_executor(
+            self.executor, self.login_credentials, environ
+        )
+        if user is not None and password is not None:
+            verdict = await asyncio.wrap_future(autorescue.password_hasher.verify(user.password_hash, password))
+            environ['autorescue.login'] = (user.id, verdict)
+        environ['wsgi.input'] = io.BytesIO(body)
+        return await self.call_wsgi(scope, receive, send, environ)
+
+    def login_credentials(self, environ):
+        with self.app.request_context(environ):
+            try:
+                return autorescue.login_credentials()
+            except Exception:
+                # Malformed body: the handler answers it as usual
+                return None, None
+
+    async def event_stream(self, scope, receive, send):
+        """``alert_events`` without a thread per subscriber"""
+        environ = wsgi_environ(scope, io.BytesIO())
+        # Decoding the session cookie is cheap and touches no database
+        with self.app.request_context(environ):
+            if 'user_id' not in session:
+                audience = None
+            else:
+                audience = (session['user_id'], bool(session.get('is_admin')),
+                            bool(session.get('is_ambulance_driver')))
+                cursor = autorescue.event_stream_cursor()
+        if audience is None:
+            # Let Flask produce the usual 401
+            return await self.call_wsgi(scope, receive, send)
+
+        headers = [(b'content-type', b'text/event-stream; charset=utf-8')]
+        headers += [(name.lower().encode(), value.encode()) for name, value in autorescue.EVENT_STREAM_HEADERS.items()]
+        await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+
+        disconnected = asyncio.ensure_future(self.until_disconnect(receive))
+        heartbeat = self.app.config['EVENT_STREAM_HEARTBEAT']
+        deadline = time.monotonic() + self.app.config['EVENT_STREAM_MAX_AGE']
+        try:
+            position, frames = autorescue.open_event_stream(cursor)
+            await self.send_frames(send, frames)
+            channels = autorescue.event_channels(*audience)
+            while not disconnected.done() and not autorescue.event_hub.closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                events, complete = await self.waiter.wait(position, min(heartbeat, remaining), channels)
+                position, frames, channels = autorescue.follow_regions(position, channels, audience)
+                if frames:
+                    await self.send_frames(send, frames)
+                    continue
+                if not events and complete:
+                    if time.monotonic() < deadline and not disconnected.done():
+                        await self.send_frames(send, [': keepalive\n\n'])
+                    continue
+                position, frames = autorescue.event_frames(position, events, complete, audience)
+                await self.send_frames(send, frames)
+            if not disconnected.done():
+                await send({'type': 'http.response.body', 'body': b''})
+        except OSError:
+            # Client went away mid-send
+            pass
+        finally:
+            disconnected.cancel()
+
+    @staticmethod
+    async def until_disconnect(receive):
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    @staticmethod
+    async def send_frames(send, frames):
+        if frames:
+            await send({'type': 'http.response.body', 'body': ''.join(frames).encode(), 'more_body': True})
+
+
+application = ASGIApplication(autorescue.app)
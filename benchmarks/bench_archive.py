@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Benchmark of hot alert queries as resolved history grows, with and without
+the archiver.
+
+For each history size a fresh database gets that many alerts resolved over
+the past years plus a fixed working set of open and recently resolved ones.
+The endpoints dashboards poll are timed with all history in the hot table,
+then again after archive_alerts() has moved everything resolved more than
+ARCHIVE_AFTER_DAYS ago into alert_archive. The archive is then paged through
+GET /api/alerts?archived=1 and checked against the number of rows moved.
+
+Usage: python benchmarks/bench_archive.py [--history 10000,100000]
+       [--active 500] [--repeat 10]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+ENDPOINTS = [
+    ('admin list (full)', 'admin', '/api/alerts'),
+    ('admin open page', 'admin', '/api/alerts?status=pending,verified,dispatched,accepted&limit=100'),
+    ('driver own alerts', 'driver', '/api/alerts'),
+    ('ambulance feed', 'ambulance', '/api/ambulance/alerts'),
+]
+
+
+def alert_rows(rng, count, user_ids, resolved_before):
+    """Alerts resolved at random times in the year(s) before ``resolved_before``"""
+    rows = []
+    for _ in range(count):
+        resolved_at = resolved_before - timedelta(seconds=rng.uniform(0, 3 * 365 * 86400))
+        reported = resolved_at - timedelta(minutes=rng.uniform(5, 90))
+        rows.append({
+            'alert_type': 'Accident', 'latitude': 40.5 + rng.random() * 0.45, 'longitude': -74.2 + rng.random() * 0.6,
+            'timestamp': reported, 'resolved': True, 'details': '', 'user_id': rng.choice(user_ids),
+            'impact_magnitude': 30.0, 'status': 'resolved', 'accepted_at': reported + timedelta(minutes=2),
+            'resolved_at': resolved_at, 'updated_at': resolved_at, 'reporter_count': 1,
+        })
+    return rows
+
+
+def active_rows(rng, count, now, user_ids):
+    """The working set: open alerts and ones resolved within the last days"""
+    rows = []
+    for i in range(count):
+        reported = now - timedelta(minutes=rng.uniform(1, 3 * 24 * 60))
+        status = ('pending', 'verified', 'dispatched', 'accepted', 'resolved')[i % 5]
+        rows.append({
+            'alert_type': 'Manual SOS', 'latitude': 40.5 + rng.random() * 0.45, 'longitude': -74.2 + rng.random() * 0.6,
+            'timestamp': reported, 'resolved': status == 'resolved', 'details': '', 'user_id': rng.choice(user_ids),
+            'impact_magnitude': None, 'status': status, 'accepted_at': None,
+            'resolved_at': reported + timedelta(minutes=30) if status == 'resolved' else None,
+            'updated_at': reported, 'reporter_count': 1,
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--history', default='10000,100000', help='comma-separated resolved alerts in history')
+    parser.add_argument('--active', type=int, default=500, help='open and recently resolved alerts')
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=10, help='requests timed per endpoint')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='autorescue-bench-')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+    os.environ['ALERTS_VERSION_FILE'] = os.path.join(workdir, 'alerts.version')
+
+    from sqlalchemy import insert
+    from werkzeug.security import generate_password_hash
+    from app import app, db, User, Alert, ArchivedAlert, archive_alerts, alert_clusters, triage_queue
+    import migrations
+
+    # Time the queries, not the response cache
+    app.config['ALERTS_CACHE_ENABLED'] = False
+    sizes = [int(size) for size in args.history.split(',') if size]
+    password = generate_password_hash('pw', method='pbkdf2:sha256:1000')
+
+    print(f"AutoRescue archival: history {sizes}, {args.active} active alerts, "
+          f"archive after {app.config['ARCHIVE_AFTER_DAYS']} days")
+    print('=' * 78)
+    print(f"{'history':>8}  {'endpoint':<20}{'hot rows':>10}{'before ms':>11}{'after ms':>10}{'archived':>10}")
+
+    failures = 0
+    for size in sizes:
+        rng = random.Random(args.seed)
+        now = datetime.utcnow()
+        with app.app_context():
+            # Start every size from an empty, freshly migrated database
+            db.drop_all()
+            with db.engine.begin() as conn:
+                conn.exec_driver_sql('DROP TABLE IF EXISTS schema_version')
+            migrations.upgrade(db.engine, db.metadata, log=None)
+            db.session.add(User(username='admin', email='admin@example.com', password_hash=password, is_admin=True))
+            db.session.add(User(username='ambulance', email='amb@example.com', password_hash=password,
+                                is_ambulance_driver=True, driver_id='AMB-1'))
+            db.session.add_all([User(username=f'driver{i}', email=f'driver{i}@example.com', password_hash=password)
+                                for i in range(args.users)])
+            db.session.commit()
+            user_ids = [user.id for user in User.query.filter(User.username.like('driver%'))]
+            cutoff = now - timedelta(days=app.config['ARCHIVE_AFTER_DAYS'])
+            rows = alert_rows(rng, size, user_ids, cutoff - timedelta(days=1))
+            for start in range(0, len(rows), 10000):
+                db.session.execute(insert(Alert), rows[start:start + 10000])
+            db.session.execute(insert(Alert), active_rows(rng, args.active, now, user_ids))
+            db.session.commit()
+        alert_clusters.clear()
+        triage_queue.clear()
+
+        clients = {}
+        for role, username in (('admin', 'admin'), ('driver', 'driver0'), ('ambulance', 'ambulance')):
+            clients[role] = app.test_client()
+            clients[role].post('/login', json={'username': username, 'password': 'pw'})
+
+        def measure():
+            timings = {}
+            for name, role, path in ENDPOINTS:
+                samples = []
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    clients[role].get(path)
+                    samples.append((time.perf_counter() - start) * 1000)
+                timings[name] = statistics.median(samples)
+            return timings
+
+        before = measure()
+        with app.app_context():
+            hot_before = Alert.query.count()
+            moved = archive_alerts()
+            hot_after = Alert.query.count()
+        after = measure()
+
+        # The archive must serve every moved alert exactly once through the paginated API
+        seen = set()
+        cursor = None
+        while True:
+            path = '/api/alerts?archived=1&limit=500' + (f'&cursor={cursor}' if cursor else '')
+            body = clients['admin'].get(path).get_json()
+            seen.update(alert['id'] for alert in body['alerts'])
+            cursor = body['next_cursor']
+            if not cursor:
+                break
+        with app.app_context():
+            archived = ArchivedAlert.query.count()
+        if moved != size or archived != size or len(seen) != size or hot_after != hot_before - size:
+            failures += 1
+            print(f"  MISMATCH: moved {moved}, archive holds {archived}, paged {len(seen)}, expected {size}")
+
+        for i, (name, _, _) in enumerate(ENDPOINTS):
+            label = f'{size:>8}' if i == 0 else ' ' * 8
+            print(f"{label}  {name:<20}{hot_after:>10}{before[name]:>11.1f}{after[name]:>10.1f}"
+                  f"{moved if i == 0 else '':>10}")
+
+    print('=' * 78)
+    if failures:
+        print(f"{failures} run(s) archived inconsistently")
+        sys.exit(1)
+    print('Every archived alert was moved once and served from the archive.')
+
+
+if __name__ == '__main__':
+    main()
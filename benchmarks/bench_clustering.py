@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Benchmark: cost of the ingest-time incident clustering step per SOS report.
+
+Feeds a stream of reports into clustering.IncidentClusterer at increasing
+report rates (so more incidents are live inside the merge window) and
+reports the time per match-and-insert. The cost should stay flat as the
+number of live incidents grows.
+
+Usage: python benchmarks/bench_clustering.py [--reports 200000] [--radius 50] [--window 120]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from clustering import IncidentClusterer
+
+
+def run(reports, rate, radius, window, rng):
+    clusterer = IncidentClusterer(radius, window)
+    merged = 0
+    peak = 0
+    now = 0.0
+    start = time.perf_counter()
+    for reporter in range(reports):
+        now += 1.0 / rate
+        # A metro area roughly 50 km across
+        latitude = 40.5 + rng.random() * 0.45
+        longitude = -74.2 + rng.random() * 0.6
+        incident_id = clusterer.match(latitude, longitude, now)
+        if incident_id is None:
+            clusterer.add(reporter, latitude, longitude, reporter, now)
+        else:
+            clusterer.report(incident_id, reporter, now)
+            merged += 1
+        if reporter % 1000 == 0:
+            peak = max(peak, len(clusterer))
+    elapsed = time.perf_counter() - start
+    return elapsed / reports * 1e6, merged, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--reports', type=int, default=200000)
+    parser.add_argument('--radius', type=float, default=50.0)
+    parser.add_argument('--window', type=float, default=120.0)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"AutoRescue clustering benchmark: {args.reports} reports, {args.radius:.0f} m / {args.window:.0f} s")
+    print("=" * 78)
+    print(f"{'reports/s':>10} {'live incidents':>16} {'merged':>10} {'us/report':>12}")
+    for rate in (1, 10, 100, 1000):
+        per_report, merged, live = run(args.reports, rate, args.radius, args.window, random.Random(args.seed))
+        print(f"{rate:>10} {live:>16} {merged:>10} {per_report:>12.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Benchmark of serverless cold start: process spawn to the first accepted SOS.
+
+Each run spawns a fresh interpreter that loads api/index.py the way the
+Vercel runtime does and sends POST /api/alerts through the WSGI app with the
+session cookie of an already logged-in driver (a phone keeps its cookie
+across cold instances). The time from spawn until the response reports the
+alert created is split into interpreter start, loading the entry point and
+the first request. The database is migrated and seeded once beforehand, as
+a deployment does.
+
+``--profile`` adds an import-time report (python -X importtime) of the
+entry point, by top-level package, and the slowest single modules.
+
+Usage: python benchmarks/bench_cold_start.py [--runs 10] [--profile]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Runs in the spawned process; prints epoch times of each phase as JSON
+CHILD = r'''
+import time
+started = time.time()
+import importlib.util, json, os, sys
+print('-- entry point --', file=sys.stderr, flush=True)
+spec = importlib.util.spec_from_file_location('index', os.path.join('api', 'index.py'))
+index = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(index)
+loaded = time.time()
+client = index.app.test_client()
+client.set_cookie('session', os.environ['BENCH_SESSION'])
+response = client.post('/api/alerts', json={'alert_type': 'Manual SOS', 'latitude': 40.71, 'longitude': -74.0})
+print(json.dumps({'started': started, 'loaded': loaded, 'done': time.time(), 'status': response.status_code,
+                  'accepted': bool((response.get_json() or {}).get('success'))}))
+'''
+
+
+def import_profile(env, top=15):
+    """(package, cumulative ms) of the entry point's imports and its slowest modules by self time"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', CHILD], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+    packages, modules = {}, []
+    # Imports finished before the marker belong to interpreter start-up (site, .pth files)
+    lines = result.stderr.split('-- entry point --\n', 1)[-1].splitlines()
+    for line in lines:
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        name = name.strip()
+        modules.append((int(own) / 1000, name))
+        if depth == 1:
+            package = name.split('.')[0]
+            packages[package] = packages.get(package, 0) + int(cumulative) / 1000
+    return sorted(packages.items(), key=lambda item: -item[1])[:top], sorted(modules, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10, help='cold starts timed')
+    parser.add_argument('--profile', action='store_true', help='print an import-time report of the entry point')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='autorescue-bench-')
+    env = dict(os.environ)
+    env['DATABASE_URL'] = os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+    env['ALERTS_VERSION_FILE'] = os.environ['ALERTS_VERSION_FILE'] = os.path.join(workdir, 'alerts.version')
+
+    from werkzeug.security import generate_password_hash
+    from app import app, db, User
+    import migrations
+
+    with app.app_context():
+        migrations.upgrade(db.engine, db.metadata, log=None)
+        db.session.add(User(username='driver', email='driver@example.com',
+                            password_hash=generate_password_hash('pw', method='pbkdf2:sha256:1000')))
+        db.session.commit()
+    client = app.test_client()
+    client.post('/login', json={'username': 'driver', 'password': 'pw'})
+    env['BENCH_SESSION'] = client.get_cookie('session').value
+
+    print(f"AutoRescue cold start: {args.runs} runs of api/index.py to the first POST /api/alerts")
+    print('=' * 78)
+    phases = {'interpreter': [], 'load entry point': [], 'first request': [], 'spawn to accepted': []}
+    failures = 0
+    for _ in range(args.runs):
+        spawned = time.time()
+        result = subprocess.run([sys.executable, '-c', CHILD], cwd=ROOT, env=env, capture_output=True, text=True)
+        try:
+            marks = json.loads(result.stdout.strip().splitlines()[-1])
+        except (IndexError, ValueError):
+            failures += 1
+            print(f"  FAILED: {result.stderr.strip().splitlines()[-1:]}")
+            continue
+        if not marks['accepted']:
+            failures += 1
+            print(f"  FAILED: POST /api/alerts returned {marks['status']} without creating the alert")
+            continue
+        phases['interpreter'].append((marks['started'] - spawned) * 1000)
+        phases['load entry point'].append((marks['loaded'] - marks['started']) * 1000)
+        phases['first request'].append((marks['done'] - marks['loaded']) * 1000)
+        phases['spawn to accepted'].append((marks['done'] - spawned) * 1000)
+
+    print(f"{'phase':<20}{'p50 ms':>10}{'min ms':>10}{'max ms':>10}")
+    for name, samples in phases.items():
+        if samples:
+            print(f"{name:<20}{statistics.median(samples):>10.0f}{min(samples):>10.0f}{max(samples):>10.0f}")
+
+    if args.profile:
+        packages, modules = import_profile(env)
+        print('-' * 78)
+        print(f"{'imported by the entry point':<40}{'cumulative ms':>14}")
+        for package, ms in packages:
+            print(f"{package:<40}{ms:>14.1f}")
+        print('-' * 78)
+        print(f"{'slowest modules':<40}{'self ms':>14}")
+        for ms, module in modules:
+            print(f"{module:<40}{ms:>14.1f}")
+
+    print('=' * 78)
+    if failures:
+        print(f"{failures} run(s) did not get their SOS accepted")
+        sys.exit(1)
+    print('Every cold start accepted its SOS.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Benchmark: server-side accident detection throughput.
+
+Feeds synthetic accelerometer streams for many vehicles through
+detection.AccidentDetector in upload-sized batches (every vehicle sends one
+chunk per round, all chunks of a round processed together) and reports
+frames per second on a single core, next to a pure-Python port of the
+driver dashboard's per-sample handleMotion loop.
+
+Usage: python benchmarks/bench_detection.py [--vehicles 1000] [--seconds 60] [--rate 50]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+
+import detection
+
+
+def synthetic_streams(vehicles, samples, rate, crash_fraction, rng):
+    """(vehicles, samples, 4) frames of road noise with a few impacts"""
+    t = np.arange(samples) / rate
+    frames = np.empty((vehicles, samples, 4))
+    frames[:, :, 0] = t
+    frames[:, :, 1:] = rng.normal(0.0, 1.5, size=(vehicles, samples, 3))
+    frames[:, :, 3] += 9.81
+    crashed = rng.random(vehicles) < crash_fraction
+    for vehicle in np.flatnonzero(crashed):
+        at = rng.integers(0, samples - rate // 2)
+        frames[vehicle, at:at + rate // 5, 1] += rng.uniform(30, 80)
+    return frames, int(crashed.sum())
+
+
+def python_reference(frames, threshold, window):
+    """handleMotion from driver_dashboard.html, one sample at a time"""
+    fired = 0
+    for vehicle in frames.tolist():
+        history = []
+        for _, x, y, z in vehicle:
+            history.append((x * x + y * y + z * z) ** 0.5)
+            if len(history) > window:
+                history.pop(0)
+            if sum(history) / len(history) > threshold:
+                fired += 1
+                break
+    return fired
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--vehicles', type=int, default=1000)
+    parser.add_argument('--seconds', type=int, default=60)
+    parser.add_argument('--rate', type=int, default=50, help='samples per second per vehicle')
+    parser.add_argument('--upload-interval', type=float, default=2.0, help='seconds of frames per upload')
+    parser.add_argument('--crash-fraction', type=float, default=0.01)
+    parser.add_argument('--reference-vehicles', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    samples = args.seconds * args.rate
+    frames, crashes = synthetic_streams(args.vehicles, samples, args.rate, args.crash_fraction, rng)
+    chunk = max(1, int(args.upload_interval * args.rate))
+
+    print(f"AutoRescue detection benchmark: {args.vehicles} vehicles, {args.seconds} s at {args.rate} Hz, "
+          f"{chunk} frames per upload")
+    print("=" * 78)
+
+    detector = detection.AccidentDetector()
+    detected = 0
+    start = time.process_time()
+    for begin in range(0, samples, chunk):
+        batch = [(vehicle, frames[vehicle, begin:begin + chunk]) for vehicle in range(args.vehicles)]
+        detected += len(detector.process(batch))
+    cpu = time.process_time() - start
+    total = args.vehicles * samples
+    print(f"{'vectorized (batched)':<28} {total / cpu:>14,.0f} frames/s/core   {detected} detections "
+          f"({crashes} impacts injected)")
+
+    detector = detection.AccidentDetector()
+    start = time.process_time()
+    for begin in range(0, samples, chunk):
+        for vehicle in range(args.vehicles):
+            detector.process([(vehicle, frames[vehicle, begin:begin + chunk])])
+    cpu = time.process_time() - start
+    print(f"{'vectorized (per upload)':<28} {total / cpu:>14,.0f} frames/s/core")
+
+    reference = frames[:args.reference_vehicles]
+    start = time.process_time()
+    python_reference(reference, 25.0, 5)
+    cpu = time.process_time() - start
+    print(f"{'per-sample Python loop':<28} {reference.shape[0] * samples / cpu:>14,.0f} frames/s/core")
+
+    realtime = args.vehicles * args.rate
+    print(f"\nReal-time load for this fleet: {realtime:,} frames/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Benchmark: nearest-ambulance lookup via the dispatch grid index versus a
+full-table haversine scan.
+
+Usage: python benchmarks/bench_dispatch.py [--units 5000] [--queries 1000] [--k 3]
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dispatch import SpatialIndex, haversine_m, rank_by_scan
+
+
+def make_units(count, center, spread_deg, rng):
+    """Random ambulance positions scattered around a city centre"""
+    lat0, lon0 = center
+    return [
+        (unit_id, lat0 + rng.uniform(-spread_deg, spread_deg), lon0 + rng.uniform(-spread_deg, spread_deg))
+        for unit_id in range(1, count + 1)
+    ]
+
+
+def table_scan(conn, latitude, longitude, k):
+    """What a naive SQL implementation does: read every row, rank in Python"""
+    rows = conn.execute(
+        'SELECT id, current_latitude, current_longitude FROM user '
+        'WHERE is_ambulance_driver = 1 AND is_available = 1'
+    ).fetchall()
+    ranked = sorted((haversine_m(latitude, longitude, lat, lon), unit_id) for unit_id, lat, lon in rows)
+    return [(unit_id, distance) for distance, unit_id in ranked[:k]]
+
+
+def timed(label, fn, queries):
+    start = time.perf_counter()
+    results = [fn(lat, lon) for lat, lon in queries]
+    elapsed = time.perf_counter() - start
+    per_query_us = elapsed / len(queries) * 1e6
+    print(f"{label:<28} {per_query_us:>10.1f} us/query  {len(queries) / elapsed:>10.0f} queries/s")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--units', type=int, default=5000)
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--k', type=int, default=3)
+    parser.add_argument('--spread', type=float, default=0.5, help='degrees around the city centre')
+    parser.add_argument('--cell', type=float, default=0.05, help='grid cell size in degrees')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    center = (40.7128, -74.0060)
+    units = make_units(args.units, center, args.spread, rng)
+    queries = [
+        (center[0] + rng.uniform(-args.spread, args.spread), center[1] + rng.uniform(-args.spread, args.spread))
+        for _ in range(args.queries)
+    ]
+
+    print(f"AutoRescue dispatch benchmark: {args.units} units, {args.queries} queries, k={args.k}")
+    print("=" * 70)
+
+    start = time.perf_counter()
+    index = SpatialIndex(args.cell)
+    for unit_id, lat, lon in units:
+        index.update(unit_id, lat, lon)
+    print(f"{'index build':<28} {(time.perf_counter() - start) * 1e3:>10.1f} ms total")
+
+    conn = sqlite3.connect(':memory:')
+    conn.execute(
+        'CREATE TABLE user (id INTEGER PRIMARY KEY, current_latitude FLOAT, current_longitude FLOAT, '
+        'is_ambulance_driver BOOLEAN, is_available BOOLEAN)'
+    )
+    conn.executemany('INSERT INTO user VALUES (?, ?, ?, 1, 1)', units)
+
+    indexed = timed('grid index', lambda lat, lon: index.nearest(lat, lon, k=args.k), queries)
+    scanned = timed('in-memory haversine scan', lambda lat, lon: rank_by_scan(units, lat, lon, k=args.k), queries)
+    timed('SQLite table scan', lambda lat, lon: table_scan(conn, lat, lon, args.k), queries)
+
+    mismatches = sum(
+        1 for a, b in zip(indexed, scanned) if [unit_id for unit_id, _ in a] != [unit_id for unit_id, _ in b]
+    )
+    print("=" * 70)
+    print(f"Result mismatches between index and scan: {mismatches}")
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Benchmark and cross-check of the database geo queries in geo.py.
+
+Seeds M ambulances and K alerts, then runs nearest-ambulance and
+bounding-box queries through geo.nearest / geo.within_bbox. On PostgreSQL
+with PostGIS this exercises the spatial SQL path; on SQLite (or PostgreSQL
+without PostGIS) the range-filter-plus-Python fallback. Every nearest result
+is checked against a full haversine scan and every box against a Python
+filter; the script exits non-zero on any mismatch.
+
+Usage: python benchmarks/bench_geo.py [--ambulances 2000] [--alerts 200000]
+       [--database-url postgresql://localhost/autorescue_bench]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def percentile(timings, fraction):
+    timings = sorted(timings)
+    return timings[min(len(timings) - 1, int(len(timings) * fraction))] * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ambulances', type=int, default=2000)
+    parser.add_argument('--alerts', type=int, default=200000)
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--radius', type=float, default=5000.0, help='metres for radius-limited nearest queries')
+    parser.add_argument('--database-url', help='empty database to use (default: throwaway SQLite file)')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    else:
+        workdir = tempfile.mkdtemp(prefix='autorescue-bench-')
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+
+    from app import app, db, User, Alert, use_spatial_sql
+    from dispatch import rank_by_scan
+    import geo
+    import migrations
+
+    rng = random.Random(args.seed)
+    # A metro area roughly 50 km across
+    point = lambda: (40.5 + rng.random() * 0.45, -74.2 + rng.random() * 0.6)
+
+    with app.app_context():
+        migrations.upgrade(db.engine, db.metadata, log=None)
+        ambulances = [(i + 1, *point()) for i in range(args.ambulances)]
+        db.session.execute(db.insert(User), [
+            {'id': unit_id, 'username': f'geo_amb{unit_id}', 'email': f'geo_amb{unit_id}@example.com',
+             'password_hash': '-', 'is_ambulance_driver': True, 'is_available': True,
+             'current_latitude': lat, 'current_longitude': lon}
+            for unit_id, lat, lon in ambulances
+        ])
+        alerts = [(i + 1, *point()) for i in range(args.alerts)]
+        now = datetime.utcnow()
+        for begin in range(0, len(alerts), 50000):
+            db.session.execute(db.insert(Alert), [
+                {'id': alert_id, 'alert_type': 'Accident', 'latitude': lat, 'longitude': lon,
+                 'timestamp': now, 'updated_at': now, 'status': 'resolved', 'resolved': True}
+                for alert_id, lat, lon in alerts[begin:begin + 50000]
+            ])
+        db.session.commit()
+        if db.engine.dialect.name in ('sqlite', 'postgresql'):
+            db.session.execute(db.text('ANALYZE'))
+            db.session.commit()
+
+        spatial = use_spatial_sql()
+        print(f"AutoRescue geo query benchmark: {args.ambulances} ambulances, {args.alerts} alerts "
+              f"on {db.engine.dialect.name} ({'PostGIS spatial SQL' if spatial else 'range filter + Python'})")
+        print("=" * 78)
+
+        available = db.select(User.id, User.current_latitude, User.current_longitude).where(
+            User.is_ambulance_driver.is_(True), User.is_available.is_(True)
+        )
+        mismatches = 0
+        for label, max_distance in (('nearest 3', None), (f'nearest 3 within {args.radius:.0f} m', args.radius)):
+            timings = []
+            for _ in range(args.queries):
+                lat, lon = point()
+                start = time.perf_counter()
+                found = geo.nearest(db.session, available, User.current_latitude, User.current_longitude,
+                                    lat, lon, k=3, max_distance_m=max_distance, spatial=spatial)
+                timings.append(time.perf_counter() - start)
+                expected = rank_by_scan(ambulances, lat, lon, 3)
+                if max_distance is not None:
+                    expected = [(unit_id, d) for unit_id, d in expected if d <= max_distance]
+                # PostGIS uses a spheroid, so compare ids and allow small distance differences
+                if [unit_id for unit_id, _ in found] != [unit_id for unit_id, _ in expected] or any(
+                        abs(a[1] - b[1]) > max(1.0, b[1] * 0.005) for a, b in zip(found, expected)):
+                    mismatches += 1
+            print(f"{label:<34} p50 {percentile(timings, 0.5):>8.2f} ms   p99 {percentile(timings, 0.99):>8.2f} ms")
+
+        timings = []
+        for _ in range(args.queries):
+            lat, lon = point()
+            box = geo.bounding_box(lat, lon, 1000)
+            query = db.select(Alert.id).where(geo.within_bbox(Alert.latitude, Alert.longitude, *box, spatial=spatial))
+            start = time.perf_counter()
+            found = set(db.session.scalars(query))
+            timings.append(time.perf_counter() - start)
+            min_lat, min_lon, max_lat, max_lon = box
+            expected = {alert_id for alert_id, a_lat, a_lon in alerts
+                        if min_lat <= a_lat <= max_lat and min_lon <= a_lon <= max_lon}
+            if found != expected:
+                mismatches += 1
+        print(f"{'alerts in 2 km box':<34} p50 {percentile(timings, 0.5):>8.2f} ms   p99 {percentile(timings, 0.99):>8.2f} ms")
+
+    if mismatches:
+        print(f"\n{mismatches} queries disagreed with the reference scan")
+        sys.exit(1)
+    print("\nAll queries matched the reference scan.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Benchmark of idle live-update connections: threaded gunicorn (the current
+deployment) against the ASGI entry point under uvicorn.
+
+Each server is started on a throwaway SQLite database and a growing number of
+dashboards open GET /api/events and sit idle. At every step the script
+counts how many streams the server actually started (sent their opening
+frame), times GET /api/health while they are all held open, and then posts
+one alert to check that it reaches every open stream. Server memory is read
+from /proc after each step.
+
+A threaded worker parks one thread per stream, so once its threads are used
+up further dashboards (and every other request) queue behind them. The ASGI
+server holds streams as suspended coroutines and keeps its handler threads
+for ordinary requests.
+
+Usage: python benchmarks/bench_idle_connections.py [--steps 100,500,1000,2000]
+       [--modes threaded,asgi] [--threads 32]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+TIMEOUT = 5.0  # seconds a stream or request may take before it counts as refused
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def server_command(mode, port, threads):
+    if mode == 'threaded':
+        return [sys.executable, '-m', 'gunicorn', '-k', 'gthread', '--threads', str(threads), '-w', '1',
+                '--worker-connections', '10000', '-b', f'127.0.0.1:{port}', '--log-level', 'warning',
+                'app:app']
+    return [sys.executable, '-m', 'uvicorn', 'asgi:application', '--host', '127.0.0.1', '--port', str(port),
+            '--log-level', 'warning', '--no-access-log', '--backlog', '4096']
+
+
+def rss_mb(pid):
+    """Resident memory of a process and its children"""
+    total = 0
+    pids = [pid]
+    for child in os.listdir('/proc'):
+        if child.isdigit():
+            try:
+                with open(f'/proc/{child}/stat') as stat:
+                    if int(stat.read().rsplit(')', 1)[1].split()[1]) == pid:
+                        pids.append(int(child))
+            except (OSError, IndexError, ValueError):
+                pass
+    for each in pids:
+        try:
+            with open(f'/proc/{each}/status') as status:
+                for line in status:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1])
+        except OSError:
+            pass
+    return total / 1024
+
+
+async def request(port, method, path, cookie, body=None):
+    """One request on a fresh connection; returns (status, body)"""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        data = json.dumps(body).encode() if body is not None else b''
+        head = (f'{method} {path} HTTP/1.1\r\nHost: localhost\r\nCookie: {cookie}\r\nConnection: close\r\n'
+                f'Content-Type: application/json\r\nContent-Length: {len(data)}\r\n\r\n')
+        writer.write(head.encode() + data)
+        response = await reader.read()
+        status = int(response.split(b' ', 2)[1])
+        return status, response.split(b'\r\n\r\n', 1)[1]
+    finally:
+        writer.close()
+
+
+class Stream:
+    """An idle EventSource: opens /api/events and records what arrives"""
+
+    def __init__(self, port, cookie):
+        self.port = port
+        self.cookie = cookie
+        self.opened = asyncio.get_running_loop().create_future()
+        self.received = ''
+        self.writer = None
+        self.task = asyncio.ensure_future(self.run())
+
+    async def run(self):
+        try:
+            reader, self.writer = await asyncio.open_connection('127.0.0.1', self.port)
+            self.writer.write((f'GET /api/events HTTP/1.1\r\nHost: localhost\r\nCookie: {self.cookie}\r\n'
+                               f'Accept: text/event-stream\r\n\r\n').encode())
+            while True:
+                chunk = await reader.read(65536)
+                if not chunk:
+                    break
+                self.received += chunk.decode(errors='replace')
+                if 'retry:' in self.received and not self.opened.done():
+                    self.opened.set_result(True)
+        except OSError:
+            pass
+        finally:
+            if not self.opened.done():
+                self.opened.set_result(False)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.task.cancel()
+
+
+async def timed(awaitable):
+    start = time.perf_counter()
+    try:
+        result = await asyncio.wait_for(awaitable, TIMEOUT)
+    except (asyncio.TimeoutError, OSError):
+        return None, None
+    return result, (time.perf_counter() - start) * 1000
+
+
+async def run_mode(mode, port, pid, cookie, steps, origin):
+    rows = []
+    streams = []
+    for target in steps:
+        while len(streams) < target:
+            streams.append(Stream(port, cookie))
+        # Give the server TIMEOUT seconds to start every stream opened so far
+        await asyncio.wait([stream.opened for stream in streams], timeout=TIMEOUT)
+        opened = [stream for stream in streams if stream.opened.done() and stream.opened.result()]
+
+        _, health_ms = await timed(request(port, 'GET', '/api/health', cookie))
+
+        # One alert, far from earlier ones so it is not merged, which every
+        # stream of this user should receive
+        posted, post_ms = await timed(request(port, 'POST', '/api/alerts', cookie, {
+            'alert_type': 'Manual SOS', 'latitude': origin + len(rows) * 0.1, 'longitude': -74.0}))
+        delivered = 0
+        if posted is not None and posted[0] == 200:
+            marker = f'"id": {json.loads(posted[1])["alert_id"]},'
+            deadline = time.monotonic() + TIMEOUT
+            while time.monotonic() < deadline:
+                delivered = sum(1 for stream in opened if marker in stream.received)
+                if delivered == len(opened):
+                    break
+                await asyncio.sleep(0.05)
+
+        rows.append((mode, target, len(opened), health_ms, post_ms, delivered, rss_mb(pid)))
+        print(f"{mode:<10}{target:>8}{len(opened):>8}{fmt(health_ms):>12}{fmt(post_ms):>12}"
+              f"{delivered:>11}{rows[-1][6]:>10.0f}")
+    for stream in streams:
+        stream.close()
+    await asyncio.sleep(0.1)
+    return rows
+
+
+def fmt(ms):
+    return 'timeout' if ms is None else f'{ms:.1f}'
+
+
+def wait_until_up(port, process):
+    import requests
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('server exited during startup')
+        try:
+            requests.get(f'http://127.0.0.1:{port}/api/health', timeout=1, headers={'Connection': 'close'})
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError('server did not start')
+
+
+def login(port):
+    import requests
+    response = requests.post(f'http://127.0.0.1:{port}/login', json={'username': 'bench', 'password': 'pw'},
+                             headers={'Connection': 'close'})
+    response.raise_for_status()
+    return '; '.join(f'{name}={value}' for name, value in response.cookies.items())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--steps', default='100,500,1000,2000', help='comma-separated open streams per step')
+    parser.add_argument('--modes', default='threaded,asgi', help='threaded (gunicorn gthread) and/or asgi (uvicorn)')
+    parser.add_argument('--threads', type=int, default=32, help='gunicorn threads per worker')
+    args = parser.parse_args()
+
+    steps = [int(step) for step in args.steps.split(',') if step]
+    modes = [mode for mode in args.modes.split(',') if mode]
+    workdir = tempfile.mkdtemp(prefix='autorescue-bench-')
+    env = dict(os.environ,
+               DATABASE_URL='sqlite:///' + os.path.join(workdir, 'bench.db'),
+               ALERTS_VERSION_FILE=os.path.join(workdir, 'alerts.version'),
+               SECRET_KEY='bench-secret',
+               # gunicorn reads gunicorn.conf.py from the project root: keep its output quiet
+               ACCESS_LOG='', SEED_DEFAULT_USERS='0')
+    os.environ.update(env)
+
+    from werkzeug.security import generate_password_hash
+    from app import app, db, User
+    import migrations
+
+    with app.app_context():
+        migrations.upgrade(db.engine, db.metadata, log=None)
+        db.session.add(User(username='bench', email='bench@example.com',
+                            password_hash=generate_password_hash('pw', method='pbkdf2:sha256:1000')))
+        db.session.commit()
+
+    print(f"AutoRescue idle connections: steps {steps}, gunicorn gthread with {args.threads} threads "
+          f"vs. uvicorn with {app.config['ASGI_THREADS']} handler threads")
+    print('=' * 78)
+    print(f"{'mode':<10}{'streams':>8}{'opened':>8}{'health ms':>12}{'alert ms':>12}{'delivered':>11}{'RSS MB':>10}")
+
+    failures = 0
+    for mode in modes:
+        port = free_port()
+        process = subprocess.Popen(server_command(mode, port, args.threads), cwd=ROOT, env=env)
+        try:
+            wait_until_up(port, process)
+            rows = asyncio.run(run_mode(mode, port, process.pid, login(port), steps, 10.0 + modes.index(mode) * 10))
+        finally:
+            process.send_signal(signal.SIGTERM)
+            try:
+                process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if mode == 'asgi':
+            # The async server is expected to hold every stream and deliver to all of them
+            failures += sum(1 for row in rows if row[2] != row[1] or row[5] != row[2] or row[3] is None)
+
+    print('=' * 78)
+    if failures:
+        print(f"{failures} ASGI step(s) refused streams or missed deliveries")
+        sys.exit(1)
+    print('Every ASGI stream opened and received its event.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Benchmark of gateway batch ingestion (POST /api/ingest) against one
+POST /api/alerts per event.
+
+Generates a fleet gateway's worth of events: alerts spread over a metro area
+(a fraction of them near-duplicates of an earlier report, as a pile-up would
+produce) plus ambulance position fixes. Each batch size is uploaded as JSON
+and as gzipped NDJSON through the Flask test client, and the per-event
+endpoint is timed on a sample for comparison. Every run is checked: each
+alert item must come back created or merged and the table must hold exactly
+the created ones.
+
+Usage: python benchmarks/bench_ingest.py [--batches 1000,10000,50000]
+       [--duplicates 0.1] [--single 500]
+"""
+
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def make_events(rng, count, duplicates, drivers):
+    """Alerts (with ``duplicates`` of them repeating an earlier position) and location fixes, about 1:1"""
+    events = []
+    recent = []
+    for i in range(count):
+        if i % 2 or not drivers:
+            if recent and rng.random() < duplicates:
+                latitude, longitude = rng.choice(recent)
+                latitude += rng.uniform(-0.0001, 0.0001)
+            else:
+                latitude, longitude = 40.5 + rng.random() * 0.45, -74.2 + rng.random() * 0.6
+                recent = (recent + [(latitude, longitude)])[-50:]
+            events.append({'type': 'alert', 'latitude': latitude, 'longitude': longitude,
+                           'impact_magnitude': round(rng.uniform(25, 80), 1), 'vehicle_id': f'veh-{i}',
+                           'details': 'Gateway crash report'})
+        else:
+            events.append({'type': 'location', 'driver_id': rng.choice(drivers),
+                           'latitude': 40.5 + rng.random() * 0.45, 'longitude': -74.2 + rng.random() * 0.6})
+    return events
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--batches', default='1000,10000,50000', help='comma-separated events per request')
+    parser.add_argument('--duplicates', type=float, default=0.1, help='fraction of alerts repeating a recent incident')
+    parser.add_argument('--drivers', type=int, default=200)
+    parser.add_argument('--single', type=int, default=500, help='events sent one per request for comparison')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='autorescue-bench-')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+    os.environ['ALERTS_VERSION_FILE'] = os.path.join(workdir, 'alerts.version')
+    os.environ['INGEST_TOKENS'] = 'bench-token'
+
+    from werkzeug.security import generate_password_hash
+    from app import app, db, User, Alert, alert_clusters
+    import migrations
+
+    rng = random.Random(args.seed)
+    batches = [int(size) for size in args.batches.split(',') if size]
+    with app.app_context():
+        migrations.upgrade(db.engine, db.metadata, log=None)
+        password = generate_password_hash('pw', method='pbkdf2:sha256:1000')
+        db.session.add(User(username='driver', email='driver@example.com', password_hash=password))
+        db.session.add_all([
+            User(username=f'amb{i}', email=f'amb{i}@example.com', password_hash=password,
+                 is_ambulance_driver=True, driver_id=f'AMB-{i}')
+            for i in range(args.drivers)
+        ])
+        db.session.commit()
+        reporter_id = User.query.filter_by(username='driver').one().id
+    drivers = [f'AMB-{i}' for i in range(args.drivers)]
+    auth = {'Authorization': 'Bearer bench-token'}
+    client = app.test_client()
+
+    print(f"AutoRescue batch ingestion: batches {batches}, {args.duplicates:.0%} duplicate alerts, "
+          f"{args.drivers} ambulances")
+    print('=' * 78)
+    print(f"{'mode':<26}{'events':>9}{'body KB':>10}{'seconds':>10}{'events/s':>12}{'created':>9}")
+
+    failures = 0
+
+    def check(events, response, expected_before):
+        nonlocal failures
+        body = response.get_json()
+        alerts = sum(1 for event in events if event['type'] == 'alert')
+        with app.app_context():
+            stored = Alert.query.count() - expected_before
+        ok = (response.status_code == 200 and body['rejected'] == 0
+              and body['alerts']['created'] + body['alerts']['merged'] == alerts
+              and stored == body['alerts']['created'])
+        if not ok:
+            failures += 1
+            print(f"  MISMATCH: status {response.status_code}, {body.get('alerts')}, {stored} rows stored")
+        return body['alerts']['created']
+
+    for size in batches:
+        for mode in ('json', 'ndjson+gzip'):
+            # Each run starts from an empty incident index so runs are comparable
+            alert_clusters.clear()
+            events = make_events(rng, size, args.duplicates, drivers)
+            if mode == 'json':
+                data = json.dumps(events).encode()
+                headers = dict(auth, **{'Content-Type': 'application/json'})
+            else:
+                data = gzip.compress('\n'.join(json.dumps(event) for event in events).encode())
+                headers = dict(auth, **{'Content-Type': 'application/x-ndjson', 'Content-Encoding': 'gzip'})
+            with app.app_context():
+                before = Alert.query.count()
+            start = time.perf_counter()
+            response = client.post('/api/ingest', data=data, headers=headers)
+            elapsed = time.perf_counter() - start
+            created = check(events, response, before)
+            print(f"{'batch ' + mode:<26}{size:>9}{len(data) / 1024:>10.0f}{elapsed:>10.2f}"
+                  f"{size / elapsed:>12.0f}{created:>9}")
+
+    # Baseline: the session-authenticated endpoint, one event and one commit per request
+    if args.single:
+        alert_clusters.clear()
+        with client.session_transaction() as session:
+            session['user_id'] = reporter_id
+        events = [event for event in make_events(rng, args.single * 2, args.duplicates, []) if event['type'] == 'alert']
+        events = events[:args.single]
+        start = time.perf_counter()
+        for event in events:
+            client.post('/api/alerts', json=event)
+        elapsed = time.perf_counter() - start
+        print(f"{'POST /api/alerts x N':<26}{len(events):>9}{'':>10}{elapsed:>10.2f}{len(events) / elapsed:>12.0f}{'':>9}")
+
+    print('=' * 78)
+    if failures:
+        print(f"{failures} run(s) returned inconsistent results")
+        sys.exit(1)
+    print('All batches ingested consistently.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Benchmark: ambulance location ingestion, write-through (one commit per ping)
+versus the coalescing location buffer, while SOS alerts are being created
+concurrently on the same SQLite database.
+
+Usage: python benchmarks/bench_locations.py [--drivers 200] [--pings 5000] [--threads 4]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def login(app, username, password):
+    client = app.test_client()
+    response = client.post('/login', json={'username': username, 'password': password})
+    assert response.get_json()['success'], f"login failed for {username}"
+    return client
+
+
+def run_phase(driver_clients, pings, threads, alerts_client):
+    per_thread = pings // threads
+    stop = threading.Event()
+    alert_latencies = []
+
+    def ping_worker(worker):
+        clients = driver_clients[worker::threads]
+        for n in range(per_thread):
+            client = clients[n % len(clients)]
+            client.post('/api/ambulance/update-location', json={'latitude': 40.0 + n * 1e-5, 'longitude': -74.0})
+
+    def alert_worker():
+        while not stop.is_set():
+            start = time.perf_counter()
+            alerts_client.post('/api/alerts', json={'alert_type': 'Manual SOS', 'latitude': 40.1, 'longitude': -74.1})
+            alert_latencies.append(time.perf_counter() - start)
+            time.sleep(0.01)
+
+    sos = threading.Thread(target=alert_worker)
+    workers = [threading.Thread(target=ping_worker, args=(w,)) for w in range(threads)]
+    sos.start()
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    sos.join()
+
+    alert_latencies.sort()
+    p50 = alert_latencies[len(alert_latencies) // 2] * 1e3 if alert_latencies else 0.0
+    p99 = alert_latencies[int(len(alert_latencies) * 0.99)] * 1e3 if alert_latencies else 0.0
+    return per_thread * threads / elapsed, p50, p99, len(alert_latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--drivers', type=int, default=200)
+    parser.add_argument('--pings', type=int, default=5000)
+    parser.add_argument('--threads', type=int, default=4)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='autorescue-bench-')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+
+    from werkzeug.security import generate_password_hash
+    from app import app, db, User, flush_locations, location_flusher
+    import migrations
+
+    # Cheap hash: login cost is not what this benchmark measures
+    password_hash = generate_password_hash('pw', method='pbkdf2:sha256:1000')
+    with app.app_context():
+        migrations.upgrade(db.engine, db.metadata, log=None)
+        db.session.add(User(username='bench_user', email='bench_user@example.com', password_hash=password_hash))
+        drivers = [
+            User(username=f'bench_amb{i}', email=f'bench_amb{i}@example.com', password_hash=password_hash,
+                 is_ambulance_driver=True, driver_id=f'BENCH{i:05d}')
+            for i in range(args.drivers)
+        ]
+        db.session.add_all(drivers)
+        db.session.commit()
+
+    alerts_client = login(app, 'bench_user', 'pw')
+    driver_clients = [login(app, f'bench_amb{i}', 'pw') for i in range(args.drivers)]
+
+    print(f"AutoRescue location ingestion benchmark: {args.drivers} drivers, {args.pings} pings, {args.threads} threads")
+    print("=" * 78)
+    print(f"{'mode':<16} {'pings/s':>10} {'SOS p50 ms':>12} {'SOS p99 ms':>12} {'SOS count':>10}")
+
+    for label, interval in (('write-through', 0), ('buffered', 1.0)):
+        app.config['LOCATION_FLUSH_INTERVAL'] = interval
+        location_flusher.interval = interval
+        rate, p50, p99, count = run_phase(driver_clients, args.pings, args.threads, alerts_client)
+        print(f"{label:<16} {rate:>10.0f} {p50:>12.2f} {p99:>12.2f} {count:>10}")
+
+    with app.app_context():
+        flush_locations()
+
+
+if __name__ == '__main__':
+    main()
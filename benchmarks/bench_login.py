@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Login storm benchmark: every user of a fleet logs in at once, as after a
+regional incident, while a dashboard keeps polling GET /api/health.
+
+All users start with passwords hashed at Werkzeug's default cost
+(``--stored``). Each scenario starts a server on that database:
+
+- threaded/stored: gunicorn gthread with the stored cost as the policy, i.e.
+  the login path as it was (one full-cost hash per login on a request thread)
+- threaded/tuned and asgi/tuned: ``PASSWORD_HASH_METHOD=--tuned``. The first
+  storm verifies at the stored cost and rehashes every user to the policy;
+  the second storm only pays the tuned cost and finds users in the cache.
+
+Logins per second, login latency and the health probe's latency during the
+storm are reported per storm, and every stored hash is checked to have been
+migrated to the tuned policy.
+
+Usage: python benchmarks/bench_login.py [--users 100] [--clients 50]
+       [--stored pbkdf2:sha256:600000] [--tuned pbkdf2:sha256:100000]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+TIMEOUT = 60.0  # seconds a request may take before it counts as failed
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def server_command(mode, port, threads):
+    if mode == 'threaded':
+        return [sys.executable, '-m', 'gunicorn', '-k', 'gthread', '--threads', str(threads), '-w', '1',
+                '-b', f'127.0.0.1:{port}', '--log-level', 'warning', 'app:app']
+    return [sys.executable, '-m', 'uvicorn', 'asgi:application', '--host', '127.0.0.1', '--port', str(port),
+            '--log-level', 'warning', '--no-access-log', '--backlog', '4096']
+
+
+def wait_until_up(port, process):
+    import requests
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('server exited during startup')
+        try:
+            requests.get(f'http://127.0.0.1:{port}/api/health', timeout=1, headers={'Connection': 'close'})
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError('server did not start')
+
+
+async def request(port, method, path, body=None):
+    """One request on a fresh connection; returns (status, body)"""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        data = json.dumps(body).encode() if body is not None else b''
+        head = (f'{method} {path} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n'
+                f'Content-Type: application/json\r\nContent-Length: {len(data)}\r\n\r\n')
+        writer.write(head.encode() + data)
+        response = await reader.read()
+        return int(response.split(b' ', 2)[1]), response.split(b'\r\n\r\n', 1)[1]
+    finally:
+        writer.close()
+
+
+async def storm(port, usernames, clients):
+    """Log every user in with ``clients`` concurrent connections while probing health"""
+    queue = list(usernames)
+    latencies = []
+    failed = 0
+    probes = []
+    done = asyncio.Event()
+
+    async def client():
+        nonlocal failed
+        while queue:
+            username = queue.pop()
+            start = time.perf_counter()
+            try:
+                status, body = await asyncio.wait_for(
+                    request(port, 'POST', '/login', {'username': username, 'password': 'pw'}), TIMEOUT)
+                ok = status == 200 and json.loads(body).get('success')
+            except (asyncio.TimeoutError, OSError, ValueError):
+                ok = False
+            if ok:
+                latencies.append((time.perf_counter() - start) * 1000)
+            else:
+                failed += 1
+
+    async def probe():
+        while not done.is_set():
+            start = time.perf_counter()
+            try:
+                await asyncio.wait_for(request(port, 'GET', '/api/health'), TIMEOUT)
+                probes.append((time.perf_counter() - start) * 1000)
+            except (asyncio.TimeoutError, OSError):
+                probes.append(TIMEOUT * 1000)
+            await asyncio.sleep(0.1)
+
+    prober = asyncio.ensure_future(probe())
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await prober
+    return elapsed, latencies, failed, probes
+
+
+def percentile(values, fraction):
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=100, help='users logging in per storm')
+    parser.add_argument('--clients', type=int, default=50, help='concurrent login connections')
+    parser.add_argument('--threads', type=int, default=8, help='gunicorn threads per worker')
+    parser.add_argument('--stored', default='pbkdf2:sha256:600000', help='hash method users start with')
+    parser.add_argument('--tuned', default='pbkdf2:sha256:100000', help='PASSWORD_HASH_METHOD of the tuned runs')
+    parser.add_argument('--scenarios', default='threaded/stored,threaded/tuned,asgi/tuned')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='autorescue-bench-')
+    env = dict(os.environ,
+               DATABASE_URL='sqlite:///' + os.path.join(workdir, 'bench.db'),
+               ALERTS_VERSION_FILE=os.path.join(workdir, 'alerts.version'),
+               SECRET_KEY='bench-secret',
+               # gunicorn reads gunicorn.conf.py from the project root: keep its output quiet
+               ACCESS_LOG='', SEED_DEFAULT_USERS='0')
+    os.environ.update(env)
+
+    from sqlalchemy import update
+    from werkzeug.security import generate_password_hash
+    from app import app, db, User
+    import migrations
+
+    usernames = [f'driver{i}' for i in range(args.users)]
+    # One hash shared by every user keeps the setup fast; each login still verifies at full cost
+    stored_hash = generate_password_hash('pw', method=args.stored)
+    with app.app_context():
+        migrations.upgrade(db.engine, db.metadata, log=None)
+        db.session.add_all([User(username=name, email=f'{name}@example.com', password_hash=stored_hash,
+                                 is_ambulance_driver=True) for name in usernames])
+        db.session.commit()
+
+    print(f"AutoRescue login storm: {args.users} users, {args.clients} concurrent clients, "
+          f"stored {args.stored}, tuned {args.tuned}")
+    print('=' * 78)
+    print(f"{'scenario':<16}{'storm':>6}{'logins/s':>10}{'p50 ms':>9}{'p99 ms':>9}{'failed':>8}"
+          f"{'health p50':>11}{'health max':>11}")
+
+    failures = 0
+    for scenario in [scenario for scenario in args.scenarios.split(',') if scenario]:
+        mode, policy = scenario.split('/')
+        method = args.stored if policy == 'stored' else args.tuned
+        with app.app_context():
+            db.session.execute(update(User).values(password_hash=stored_hash))
+            db.session.commit()
+        port = free_port()
+        process = subprocess.Popen(server_command(mode, port, args.threads), cwd=ROOT,
+                                   env=dict(env, PASSWORD_HASH_METHOD=method))
+        try:
+            wait_until_up(port, process)
+            for number in (1, 2) if policy == 'tuned' else (1,):
+                elapsed, latencies, failed, probes = asyncio.run(storm(port, usernames, args.clients))
+                failures += failed
+                print(f"{scenario:<16}{number:>6}{len(latencies) / elapsed:>10.1f}"
+                      f"{percentile(latencies, 0.5):>9.0f}{percentile(latencies, 0.99):>9.0f}{failed:>8}"
+                      f"{statistics.median(probes):>11.1f}{max(probes):>11.1f}")
+        finally:
+            process.send_signal(signal.SIGTERM)
+            try:
+                process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+        if policy == 'tuned':
+            with app.app_context():
+                migrated = sum(1 for (password_hash,) in db.session.query(User.password_hash)
+                               if password_hash.startswith(args.tuned + '$'))
+            if migrated != args.users:
+                failures += 1
+                print(f"  MISMATCH: {migrated} of {args.users} hashes migrated to {args.tuned}")
+
+    print('=' * 78)
+    if failures:
+        print(f"{failures} failed login(s) or unmigrated hash run(s)")
+        sys.exit(1)
+    print('Every login succeeded and every tuned run migrated all stored hashes.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Benchmark: query plans and latency of the hot alert queries before and after
+the hot-query index migration.
+
+Seeds a throwaway SQLite database with N alerts, runs each hot query from
+app.py with the indexes dropped, applies migrations.add_hot_query_indexes and
+runs them again. Exits non-zero if any hot query still does a full table scan
+or a temporary sort once the indexes exist.
+
+Usage: python benchmarks/bench_query_plans.py [--alerts 1000000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+ALERT_INSERT = (
+    'INSERT INTO alert (id, alert_type, latitude, longitude, timestamp, resolved, details, '
+    'user_id, impact_magnitude, status, assigned_ambulance_id, updated_at) '
+    'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'
+)
+STATUSES = [('resolved', 0.97), ('pending', 0.01), ('verified', 0.01), ('accepted', 0.0099), ('dispatched', 0.0001)]
+
+
+def seed(engine, alert_count, user_count, driver_count, rng):
+    now = datetime.utcnow()
+    statuses = [status for status, _ in STATUSES]
+    weights = [weight for _, weight in STATUSES]
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        cursor.executemany(
+            'INSERT INTO user (id, username, email, password_hash, is_admin, is_ambulance_driver, is_available) '
+            'VALUES (?, ?, ?, ?, 0, ?, 1)',
+            [(i, f'user{i}', f'user{i}@example.com', '-', int(i > user_count))
+             for i in range(1, user_count + driver_count + 1)]
+        )
+        batch = []
+        for alert_id in range(1, alert_count + 1):
+            timestamp = now - timedelta(seconds=(alert_count - alert_id) * 30)
+            status = rng.choices(statuses, weights)[0]
+            assigned = rng.randint(user_count + 1, user_count + driver_count) if status in ('accepted', 'resolved') else None
+            batch.append((
+                alert_id, 'Accident', rng.uniform(40, 41), rng.uniform(-74, -73), str(timestamp),
+                int(status == 'resolved'), '', rng.randint(1, user_count), 30.0, status, assigned,
+                str(timestamp + timedelta(minutes=5))
+            ))
+            if len(batch) == 50000:
+                cursor.executemany(ALERT_INSERT, batch)
+                batch = []
+        if batch:
+            cursor.executemany(ALERT_INSERT, batch)
+        raw.commit()
+        cursor.execute('ANALYZE')
+        raw.commit()
+    finally:
+        raw.close()
+    return now
+
+
+def hot_queries(Alert, now, user_count, driver_count):
+    """The filters and orderings used by the alert endpoints in app.py"""
+    return {
+        'ambulance feed (status=dispatched)':
+            Alert.query.filter_by(status='dispatched'),
+        'my alerts (assigned, newest first)':
+            Alert.query.filter_by(assigned_ambulance_id=user_count + 1).order_by(Alert.timestamp.desc()),
+        'user alerts (user_id, newest first)':
+            Alert.query.filter_by(user_id=7).order_by(Alert.timestamp.desc()),
+        'admin page (newest 100)':
+            Alert.query.order_by(Alert.timestamp.desc(), Alert.id.desc()).limit(100),
+        'status page (pending,verified)':
+            Alert.query.filter(Alert.status.in_(['pending', 'verified']))
+            .order_by(Alert.timestamp.desc(), Alert.id.desc()).limit(100),
+        'delta sync (updated_at >= t)':
+            Alert.query.filter(Alert.updated_at >= now - timedelta(minutes=1))
+            .order_by(Alert.updated_at.asc(), Alert.id.asc()).limit(100),
+    }
+
+
+def explain(engine, query):
+    compiled = query.statement.compile(dialect=engine.dialect, compile_kwargs={'literal_binds': True})
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + str(compiled)).all()
+    return [row[-1] for row in rows]
+
+
+def is_full_scan(plan):
+    return any(step == 'SCAN alert' or 'TEMP B-TREE' in step for step in plan)
+
+
+def measure(query, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        query.all()
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return timings[len(timings) // 2] * 1e3
+
+
+def run_phase(label, engine, queries, repeat):
+    print(f"\n{label}")
+    print("-" * 78)
+    results = {}
+    for name, query in queries.items():
+        plan = explain(engine, query)
+        elapsed_ms = measure(query, repeat)
+        results[name] = (plan, elapsed_ms)
+        print(f"{name:<38} {elapsed_ms:>10.2f} ms   {'FULL SCAN' if is_full_scan(plan) else 'index'}")
+        for step in plan:
+            print(f"    {step}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--alerts', type=int, default=1000000)
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--drivers', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='autorescue-bench-')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+
+    from app import app, db, Alert
+    import migrations
+
+    with app.app_context():
+        engine = db.engine
+        migrations.upgrade(engine, db.metadata, log=None)
+        with engine.begin() as conn:
+            for table, name, _ in migrations.HOT_QUERY_INDEXES:
+                migrations.drop_index(conn, table, name)
+            migrations.drop_index(conn, 'alert', 'ix_alert_updated_at')
+
+        print(f"AutoRescue query-plan benchmark: {args.alerts} alerts, {args.users} users, {args.drivers} drivers")
+        print("=" * 78)
+        start = time.perf_counter()
+        now = seed(engine, args.alerts, args.users, args.drivers, random.Random(args.seed))
+        print(f"Seeded in {time.perf_counter() - start:.1f} s")
+
+        queries = hot_queries(Alert, now, args.users, args.drivers)
+        before = run_phase('Without hot-query indexes', engine, queries, args.repeat)
+
+        start = time.perf_counter()
+        with engine.begin() as conn:
+            migrations.add_hot_query_indexes(conn, db.metadata)
+            migrations.create_index(conn, 'alert', 'ix_alert_updated_at', ['updated_at'])
+            conn.exec_driver_sql('ANALYZE')
+        print(f"\nIndex migration took {time.perf_counter() - start:.1f} s")
+
+        after = run_phase('With hot-query indexes', engine, queries, args.repeat)
+
+    print("\nSummary")
+    print("=" * 78)
+    remaining_scans = []
+    for name in queries:
+        speedup = before[name][1] / after[name][1] if after[name][1] else float('inf')
+        print(f"{name:<38} {before[name][1]:>10.2f} ms -> {after[name][1]:>8.2f} ms  ({speedup:.0f}x)")
+        if is_full_scan(after[name][0]):
+            remaining_scans.append(name)
+
+    if remaining_scans:
+        print(f"\nFull scans remain: {', '.join(remaining_scans)}")
+        sys.exit(1)
+    print("\nNo hot query performs a full table scan.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Benchmark of a driver's feed, cache and live stream as national alert
+volume grows outside the driver's region.
+
+For each national volume a fresh database gets a fixed number of dispatched
+alerts around the driver (New York) plus that many dispatched alerts spread
+over the rest of the country. Two ambulance drivers poll
+/api/ambulance/alerts: one with a reported position, whose feed covers its
+own region tile and the eight around it, and one without, who still gets the
+national feed. Then alerts are reported far away, one at a time: after each,
+both drivers revalidate with their ETag and a stream subscriber per driver
+counts how often it was woken. A last report next to the located driver must
+reach its feed and stream.
+
+Usage: python benchmarks/bench_regions.py [--national 0,10000,100000]
+       [--local 100] [--writes 20] [--repeat 10]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DRIVER_POSITION = (40.75, -73.98)
+# Continental United States
+NATIONAL_BOUNDS = (25.0, -124.0, 48.5, -67.0)
+
+
+def dispatched_rows(rng, count, now, user_id, position, exclude, regions):
+    """Dispatched alerts around ``position`` (+-0.05 degrees) or, without one, anywhere
+    in NATIONAL_BOUNDS outside the ``exclude`` tiles"""
+    rows = []
+    while len(rows) < count:
+        if position:
+            latitude = position[0] + rng.uniform(-0.05, 0.05)
+            longitude = position[1] + rng.uniform(-0.05, 0.05)
+        else:
+            latitude = rng.uniform(NATIONAL_BOUNDS[0], NATIONAL_BOUNDS[2])
+            longitude = rng.uniform(NATIONAL_BOUNDS[1], NATIONAL_BOUNDS[3])
+        region = regions.encode(latitude, longitude)
+        if region in exclude:
+            continue
+        reported = now - timedelta(minutes=rng.uniform(1, 30))
+        rows.append({
+            'alert_type': 'Accident', 'latitude': latitude, 'longitude': longitude, 'timestamp': reported,
+            'resolved': False, 'details': '', 'user_id': user_id, 'impact_magnitude': 30.0,
+            'status': 'dispatched', 'updated_at': reported, 'reporter_count': 1, 'region': region,
+        })
+    return rows
+
+
+class StreamCounter:
+    """A subscriber thread counting its wake-ups with events"""
+
+    def __init__(self, hub, channels):
+        self.hub = hub
+        self.channels = channels
+        self.position = hub.last_seq
+        self.woken = 0
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while self.running:
+            events, _ = self.hub.wait(self.position, 0.2, self.channels)
+            if events:
+                self.woken += 1
+                self.position = events[-1][0]
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
+        return self.woken
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--national', default='0,10000,100000',
+                        help='comma-separated dispatched alerts outside the driver region')
+    parser.add_argument('--local', type=int, default=100, help='dispatched alerts around the driver')
+    parser.add_argument('--writes', type=int, default=20, help='alerts reported elsewhere while revalidating')
+    parser.add_argument('--repeat', type=int, default=10, help='feed requests timed per driver')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='autorescue-bench-')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+    os.environ['ALERTS_VERSION_FILE'] = os.path.join(workdir, 'alerts.version')
+
+    from sqlalchemy import insert
+    from werkzeug.security import generate_password_hash
+    from app import app, db, User, Alert, alert_clusters, triage_queue, event_hub, event_channels
+    import migrations
+    import regions
+
+    # Every ETag change comes from an alert write, not from the time slot
+    app.config['ALERTS_CACHE_TTL'] = 3600
+    app.config['ALERT_CLUSTER_RADIUS_M'] = 0
+    sizes = [int(size) for size in args.national.split(',') if size]
+    password = generate_password_hash('pw', method='pbkdf2:sha256:1000')
+    nearby = regions.neighbourhood(regions.encode(*DRIVER_POSITION))
+
+    print(f"AutoRescue regions: national {sizes}, {args.local} local alerts, {args.writes} remote writes, "
+          f"tiles of {regions.PRECISION} geohash characters")
+    print('=' * 78)
+    print(f"{'national':>8}  {'driver':<10}{'feed rows':>10}{'feed ms':>9}{'304s':>8}{'wakeups':>9}{'local seen':>12}")
+
+    failures = 0
+    for size in sizes:
+        rng = random.Random(args.seed)
+        now = datetime.utcnow()
+        with app.app_context():
+            # Start every size from an empty, freshly migrated database
+            db.drop_all()
+            with db.engine.begin() as conn:
+                conn.exec_driver_sql('DROP TABLE IF EXISTS schema_version')
+            migrations.upgrade(db.engine, db.metadata, log=None)
+            db.session.add(User(username='reporter', email='reporter@example.com', password_hash=password))
+            for name in ('located', 'national'):
+                db.session.add(User(username=name, email=f'{name}@example.com', password_hash=password,
+                                    is_ambulance_driver=True, driver_id=name.upper()))
+            db.session.commit()
+            ids = {user.username: user.id for user in User.query}
+            db.session.execute(insert(Alert), dispatched_rows(rng, args.local, now, ids['reporter'],
+                                                             DRIVER_POSITION, set(), regions))
+            rows = dispatched_rows(rng, size, now, ids['reporter'], None, nearby, regions)
+            for start in range(0, len(rows), 10000):
+                db.session.execute(insert(Alert), rows[start:start + 10000])
+            db.session.commit()
+        alert_clusters.clear()
+        triage_queue.clear()
+
+        clients = {}
+        for name in ('reporter', 'located', 'national'):
+            clients[name] = app.test_client()
+            clients[name].post('/login', json={'username': name, 'password': 'pw'})
+        clients['located'].post('/api/ambulance/update-location',
+                                json={'latitude': DRIVER_POSITION[0], 'longitude': DRIVER_POSITION[1]})
+        drivers = ('located', 'national')
+
+        # Feed cost without the response cache
+        app.config['ALERTS_CACHE_ENABLED'] = False
+        feed_rows, feed_ms = {}, {}
+        for name in drivers:
+            samples = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                response = clients[name].get('/api/ambulance/alerts')
+                samples.append((time.perf_counter() - start) * 1000)
+            feed_rows[name] = len(response.get_json())
+            feed_ms[name] = statistics.median(samples)
+
+        # Revalidation and stream wake-ups while alerts are reported elsewhere
+        app.config['ALERTS_CACHE_ENABLED'] = True
+        etags = {name: clients[name].get('/api/ambulance/alerts').headers['ETag'] for name in drivers}
+        streams = {name: StreamCounter(event_hub, event_channels(ids[name], False, True)) for name in drivers}
+        not_modified = dict.fromkeys(drivers, 0)
+        for _ in range(args.writes):
+            while True:
+                latitude = rng.uniform(NATIONAL_BOUNDS[0], NATIONAL_BOUNDS[2])
+                longitude = rng.uniform(NATIONAL_BOUNDS[1], NATIONAL_BOUNDS[3])
+                if regions.encode(latitude, longitude) not in nearby:
+                    break
+            clients['reporter'].post('/api/alerts', json={'alert_type': 'Accident', 'latitude': latitude,
+                                                          'longitude': longitude})
+            for name in drivers:
+                response = clients[name].get('/api/ambulance/alerts', headers={'If-None-Match': etags[name]})
+                if response.status_code == 304:
+                    not_modified[name] += 1
+                else:
+                    etags[name] = response.headers['ETag']
+            time.sleep(0.01)
+
+        # A report next to the located driver has to reach its feed and stream
+        remote_wakeups = {name: streams[name].woken for name in drivers}
+        clients['reporter'].post('/api/alerts', json={'alert_type': 'Accident', 'latitude': DRIVER_POSITION[0],
+                                                      'longitude': DRIVER_POSITION[1]})
+        local_seen = clients['located'].get('/api/ambulance/alerts',
+                                            headers={'If-None-Match': etags['located']}).status_code == 200
+        deadline = time.monotonic() + 1
+        while streams['located'].woken == remote_wakeups['located'] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        local_seen = local_seen and streams['located'].woken > remote_wakeups['located']
+        for stream in streams.values():
+            stream.stop()
+
+        if not local_seen or feed_rows['national'] < size or feed_rows['located'] > args.local:
+            failures += 1
+            print(f"  MISMATCH: feed rows {feed_rows}, local write seen: {local_seen}")
+        for i, name in enumerate(drivers):
+            label = f'{size:>8}' if i == 0 else ' ' * 8
+            seen = ('yes' if local_seen else 'NO') if name == 'located' else ''
+            print(f"{label}  {name:<10}{feed_rows[name]:>10}{feed_ms[name]:>9.1f}"
+                  f"{not_modified[name]:>5}/{args.writes:<3}{remote_wakeups[name]:>8}{seen:>12}")
+
+    print('=' * 78)
+    if failures:
+        print(f"{failures} run(s) leaked national volume into the regional feed or missed a local alert")
+        sys.exit(1)
+    print('The located driver\'s feed, cache and stream only followed its own region.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Benchmark of ETA-aware dispatch on a road graph.
+
+Speed: a synthetic street grid of ``--grid`` x ``--grid`` intersections is
+written in the graph file format and memory-mapped. For random alerts, the
+ETAs from ``--units`` available ambulances are computed with one backward
+search (cold, cache cleared), with the search stopped at the 3 fastest as
+dispatch does (cold top 3), and again from the (cell, cell) cache (warm).
+ETAs are checked against single-pair A* routes.
+
+Quality: the bundled test city (data/test_city.graph, a street grid split by
+a river with one bridge and a motorway on its east edge) gets random
+ambulances and alerts. Each alert is ranked through the app's
+rank_ambulances once by straight-line distance and once by road ETA, and the
+true road time of each first choice is compared.
+
+Usage: python benchmarks/bench_routing.py [--grid 100] [--units 50,200]
+       [--alerts 200]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from dispatch import haversine_m
+
+TEST_CITY = 'data/test_city.graph'
+TEST_CITY_BOUNDS = (40.70, -74.02, 40.78, -73.92)
+
+
+def grid_graph(size, rng, spacing=0.002, origin=(40.0, -75.0)):
+    """Street grid with a random 30-60 km/h speed per block and one in ten blocks closed"""
+    nodes = [(origin[0] + row * spacing, origin[1] + col * spacing) for row in range(size) for col in range(size)]
+    edges = []
+    for row in range(size):
+        for col in range(size):
+            here = row * size + col
+            for there in ((here + 1) if col + 1 < size else None, (here + size) if row + 1 < size else None):
+                if there is None or rng.random() < 0.1:
+                    continue
+                speed = rng.uniform(30, 60) / 3.6
+                seconds = haversine_m(*nodes[here], *nodes[there]) / speed
+                edges.append((here, there, seconds))
+                edges.append((there, here, seconds))
+    return nodes, edges
+
+
+def random_point(rng, bounds):
+    return rng.uniform(bounds[0], bounds[2]), rng.uniform(bounds[1], bounds[3])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--grid', type=int, default=100, help='intersections per side of the synthetic grid')
+    parser.add_argument('--units', default='50,200', help='comma-separated available ambulances per search')
+    parser.add_argument('--alerts', type=int, default=200, help='alerts timed and ranked')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='autorescue-bench-')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+    os.environ['ALERTS_VERSION_FILE'] = os.path.join(workdir, 'alerts.version')
+    os.environ['ROAD_GRAPH_FILE'] = TEST_CITY
+
+    import routing
+    rng = random.Random(args.seed)
+    failures = 0
+
+    # Search speed on the synthetic grid
+    nodes, edges = grid_graph(args.grid, rng)
+    path = os.path.join(workdir, 'grid.graph')
+    routing.write_graph(path, nodes, edges)
+    start = time.perf_counter()
+    graph = routing.RoadGraph(path)
+    load_ms = (time.perf_counter() - start) * 1000
+    bounds = (nodes[0][0], nodes[0][1], nodes[-1][0], nodes[-1][1])
+    print(f"AutoRescue routing: {graph.node_count} node grid ({graph.edge_count} edges, "
+          f"{os.path.getsize(path) / 1024:.0f} KB, mapped in {load_ms:.0f} ms), {args.alerts} alerts")
+    print('=' * 78)
+    print(f"{'units':>6}{'cold p50 ms':>13}{'cold p95 ms':>13}{'top 3 p50 ms':>14}{'warm p50 ms':>13}"
+          f"{'A* pair ms':>12}")
+    for units in [int(count) for count in args.units.split(',') if count]:
+        router = routing.Router(graph, max_seconds=3600)
+        cold, top, warm, single = [], [], [], []
+        for _ in range(args.alerts):
+            alert = random_point(rng, bounds)
+            sources = [(unit, *random_point(rng, bounds)) for unit in range(units)]
+            router.clear()
+            start = time.perf_counter()
+            fastest = router.etas(*alert, sources, k=3)
+            top.append((time.perf_counter() - start) * 1000)
+            router.clear()
+            start = time.perf_counter()
+            etas = router.etas(*alert, sources)
+            cold.append((time.perf_counter() - start) * 1000)
+            start = time.perf_counter()
+            router.etas(*alert, sources)
+            warm.append((time.perf_counter() - start) * 1000)
+            unit, lat, lon = sources[0]
+            start = time.perf_counter()
+            pair = router.route_seconds(lat, lon, *alert)
+            single.append((time.perf_counter() - start) * 1000)
+            expected = etas[unit]
+            if (pair is None) != (expected is None) or (pair is not None and abs(pair - expected) > 1e-3):
+                failures += 1
+                print(f"  MISMATCH: A* {pair} vs. search {expected}")
+            # The early-stopped search must find the same three fastest units
+            ranked = sorted((seconds, unit) for unit, seconds in etas.items() if seconds is not None)[:3]
+            if ranked != sorted((seconds, unit) for unit, seconds in fastest.items() if seconds is not None)[:3]:
+                failures += 1
+                print(f"  MISMATCH: top 3 {fastest} vs. full search")
+        cold.sort()
+        print(f"{units:>6}{statistics.median(cold):>13.2f}{cold[int(len(cold) * 0.95)]:>13.2f}"
+              f"{statistics.median(top):>14.2f}{statistics.median(warm):>13.2f}{statistics.median(single):>12.2f}")
+    graph.close()
+
+    # Dispatch quality on the bundled test city, through the app's ranking
+    from app import app, db, dispatch_index
+    import app as autorescue
+    import migrations
+    with app.app_context():
+        migrations.upgrade(db.engine, db.metadata, log=None)
+    router = autorescue.road_router
+    print('-' * 78)
+    print(f"test city {TEST_CITY}: {router.graph.node_count} nodes; first choice's true road time")
+    print(f"{'ranking':<16}{'mean s':>9}{'p95 s':>9}{'worse by >2 min':>17}")
+    chosen = {'straight line': [], 'road eta': []}
+    with app.app_context():
+        for _ in range(args.alerts):
+            dispatch_index.clear()
+            units = {unit: random_point(rng, TEST_CITY_BOUNDS) for unit in range(1, 9)}
+            for unit, position in units.items():
+                dispatch_index.update(unit, *position)
+            alert = SimpleNamespace(latitude=0.0, longitude=0.0)
+            alert.latitude, alert.longitude = random_point(rng, TEST_CITY_BOUNDS)
+            for name in chosen:
+                autorescue.road_router = router if name == 'road eta' else None
+                unit = autorescue.rank_ambulances(alert)[0][0]
+                chosen[name].append(router.route_seconds(*units[unit], alert.latitude, alert.longitude))
+        autorescue.road_router = router
+    worse = sum(1 for line, eta in zip(chosen['straight line'], chosen['road eta']) if line - eta > 120)
+    for name, times in chosen.items():
+        times = sorted(times)
+        print(f"{name:<16}{statistics.mean(times):>9.0f}{times[int(len(times) * 0.95)]:>9.0f}"
+              f"{worse if name == 'straight line' else 0:>17}")
+    if any(eta > line + 1e-6 for line, eta in zip(chosen['straight line'], chosen['road eta'])):
+        failures += 1
+        print('  MISMATCH: an ETA-ranked first choice was slower than the straight-line one')
+
+    print('=' * 78)
+    if failures:
+        print(f"{failures} mismatch(es) between searches or rankings")
+        sys.exit(1)
+    print('Every one-to-many ETA matched A*, and ETA ranking never picked a slower unit.')
+
+
+if __name__ == '__main__':
+    main()
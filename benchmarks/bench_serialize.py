@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Benchmark of alert list serialization at dashboard scale.
+
+A fresh database gets ``--alerts`` alerts. The admin's full list is built
+the old way (ORM objects, alert_to_dict, jsonify) and through list_alerts,
+which selects row tuples and streams them through serialize.py, as one
+object per alert and as the columnar format (one array per field), with the
+JSON encoder in use and with the standard library one. Each is timed
+(median of ``--repeat``) and its peak Python memory measured with
+tracemalloc while the body is consumed chunk by chunk, the way a server
+sends it. Every body must decode to the same alerts as the old one.
+
+Usage: python benchmarks/bench_serialize.py [--alerts 100000] [--repeat 5]
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def alert_rows(rng, count, user_id, now):
+    rows = []
+    for i in range(count):
+        reported = now - timedelta(seconds=rng.uniform(0, 30 * 86400))
+        status = ('pending', 'verified', 'dispatched', 'accepted', 'resolved')[i % 5]
+        rows.append({
+            'alert_type': rng.choice(('Accident', 'Manual SOS')), 'latitude': 40.5 + rng.random() * 0.45,
+            'longitude': -74.2 + rng.random() * 0.6, 'timestamp': reported, 'resolved': status == 'resolved',
+            'details': 'Impact detected' if i % 3 else '', 'user_id': user_id,
+            'impact_magnitude': round(rng.uniform(25, 80), 2), 'status': status,
+            'accepted_at': reported + timedelta(minutes=2) if status in ('accepted', 'resolved') else None,
+            'resolved_at': reported + timedelta(minutes=30) if status == 'resolved' else None,
+            'updated_at': reported, 'reporter_count': rng.choice((None, 1, 1, 2)),
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--alerts', type=int, default=100000, help='alerts in the list')
+    parser.add_argument('--repeat', type=int, default=5, help='timed builds per variant')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='autorescue-bench-')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+    os.environ['ALERTS_VERSION_FILE'] = os.path.join(workdir, 'alerts.version')
+
+    from flask import jsonify, session
+    from sqlalchemy import insert
+    from app import app, db, User, Alert, alert_to_dict, list_alerts
+    import migrations
+    import serialize
+
+    app.config['ALERTS_CACHE_ENABLED'] = False
+    rng = random.Random(args.seed)
+    with app.app_context():
+        migrations.upgrade(db.engine, db.metadata, log=None)
+        admin = User(username='admin', email='admin@example.com', password_hash='-', is_admin=True)
+        db.session.add(admin)
+        db.session.commit()
+        rows = alert_rows(rng, args.alerts, admin.id, datetime.utcnow())
+        for start in range(0, len(rows), 10000):
+            db.session.execute(insert(Alert), rows[start:start + 10000])
+        db.session.commit()
+        admin_id = admin.id
+    del rows
+
+    def orm_jsonify():
+        alerts = Alert.query.order_by(Alert.timestamp.desc()).all()
+        yield jsonify([alert_to_dict(alert) for alert in alerts]).get_data()
+
+    def streamed(query):
+        def build():
+            return list_alerts().response
+        build.path = '/api/alerts' + query
+        return build
+
+    variants = [('orm + jsonify', orm_jsonify, None)]
+    # serialize.encode as it is without orjson installed
+    stdlib = json.JSONEncoder(separators=(',', ':'), default=serialize._isoformat)
+    stdlib_encode = lambda value: stdlib.encode(value).encode()
+    encoders = [('orjson', serialize.encode)] if serialize.orjson is not None else []
+    encoders.append(('json', stdlib_encode))
+    for encoder_name, encode in encoders:
+        variants.append((f'rows, {encoder_name}', streamed(''), encode))
+        variants.append((f'columns, {encoder_name}', streamed('?format=columns'), encode))
+    encode_default = serialize.encode
+
+    def run(build, encode, keep=False):
+        """Consume the body a chunk at a time; returns its size (and the body if ``keep``)"""
+        serialize.encode = encode or encode_default
+        try:
+            with app.test_request_context(getattr(build, 'path', '/api/alerts')):
+                session['user_id'] = admin_id
+                session['is_admin'] = True
+                size, chunks = 0, []
+                for chunk in build():
+                    size += len(chunk)
+                    if keep:
+                        chunks.append(chunk)
+                return size, b''.join(chunks)
+        finally:
+            serialize.encode = encode_default
+
+    print(f"AutoRescue serialization: {args.alerts} alerts, "
+          f"{'orjson' if serialize.orjson is not None else 'json (orjson not installed)'} encoder")
+    print('=' * 78)
+    print(f"{'variant':<22}{'p50 ms':>10}{'min ms':>10}{'peak MB':>10}{'body MB':>10}{'vs. old':>10}")
+
+    failures = 0
+    _, old_body = run(orm_jsonify, None, keep=True)
+    expected = json.loads(old_body)
+    del old_body
+    baseline = None
+    for name, build, encode in variants:
+        _, body = run(build, encode, keep=True)
+        decoded = json.loads(body)
+        del body
+        if isinstance(decoded, dict):
+            decoded = [dict(zip(decoded, values)) for values in zip(*decoded.values())]
+        if decoded != expected:
+            failures += 1
+            print(f"  MISMATCH: {name} decodes to different alerts")
+        del decoded
+
+        samples = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            size, _ = run(build, encode)
+            samples.append((time.perf_counter() - start) * 1000)
+        tracemalloc.start()
+        run(build, encode)
+        peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+        median = statistics.median(samples)
+        baseline = baseline or median
+        print(f"{name:<22}{median:>10.0f}{min(samples):>10.0f}{peak:>10.1f}{size / 2 ** 20:>10.1f}"
+              f"{baseline / median:>9.1f}x")
+
+    print('=' * 78)
+    if failures:
+        print(f"{failures} variant(s) did not match the ORM + jsonify output")
+        sys.exit(1)
+    print('Every streamed body decoded to the same alerts as the ORM + jsonify one.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Load test: hundreds of ambulance drivers accepting the same alert at once.
+
+Seeds N drivers and one dispatched alert per round, releases every driver's
+POST /api/ambulance/accept-alert/<id> together from a barrier and checks
+that exactly one request wins (200), every other one gets 409, the alert is
+assigned to the winner and only the winner was marked unavailable. Exits
+non-zero on any violation.
+
+Runs in-process on the Flask test client against a throwaway SQLite file by
+default. With --url it targets a running server (e.g. several gunicorn
+workers); DATABASE_URL must then point at that server's database so the
+drivers and alerts can be seeded.
+
+Usage: python benchmarks/load_accept_race.py [--drivers 300] [--rounds 5] [--url http://127.0.0.1:5000]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+class LiveClient:
+    """requests.Session with the test client's post(path, json=...) shape"""
+
+    def __init__(self, base_url):
+        import requests
+        self.base_url = base_url.rstrip('/')
+        self.session = requests.Session()
+        # Rounds sit idle longer than the server's keep-alive timeout; a
+        # reused connection closed by the server would show up as an error
+        self.session.headers['Connection'] = 'close'
+
+    def post(self, path, json=None):
+        return self.session.post(self.base_url + path, json=json)
+
+
+def status_of(response):
+    return getattr(response, 'status_code', None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--drivers', type=int, default=300)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--url', help='base URL of a running server (default: in-process test client)')
+    args = parser.parse_args()
+
+    if not args.url:
+        workdir = tempfile.mkdtemp(prefix='autorescue-bench-')
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+
+    from werkzeug.security import generate_password_hash
+    from app import app, db, User, Alert
+    import migrations
+
+    # Unique names so repeated runs against a live database do not collide
+    prefix = f'race{uuid.uuid4().hex[:6]}'
+    password_hash = generate_password_hash('pw', method='pbkdf2:sha256:1000')
+    with app.app_context():
+        migrations.upgrade(db.engine, db.metadata, log=None)
+        drivers = [
+            User(username=f'{prefix}_{i}', email=f'{prefix}_{i}@example.com', password_hash=password_hash,
+                 is_ambulance_driver=True, driver_id=f'{prefix.upper()}{i:05d}')
+            for i in range(args.drivers)
+        ]
+        db.session.add_all(drivers)
+        db.session.commit()
+        driver_ids = [driver.id for driver in drivers]
+
+    clients = []
+    for i in range(args.drivers):
+        client = LiveClient(args.url) if args.url else app.test_client()
+        response = client.post('/login', json={'username': f'{prefix}_{i}', 'password': 'pw'})
+        assert response.status_code == 200, f"login failed for {prefix}_{i}"
+        clients.append(client)
+
+    target = args.url or 'in-process test client'
+    print(f"AutoRescue accept race: {args.drivers} concurrent drivers x {args.rounds} rounds ({target})")
+    print("=" * 78)
+    print(f"{'round':>5} {'winners':>8} {'409s':>6} {'errors':>7} {'p50 ms':>8} {'p99 ms':>8}  result")
+
+    failures = 0
+    for round_number in range(1, args.rounds + 1):
+        with app.app_context():
+            User.query.filter(User.id.in_(driver_ids)).update({'is_available': True}, synchronize_session=False)
+            alert = Alert(alert_type='Accident', latitude=40.0, longitude=-74.0, status='dispatched')
+            db.session.add(alert)
+            db.session.commit()
+            alert_id = alert.id
+
+        barrier = threading.Barrier(args.drivers)
+        results = [None] * args.drivers
+        latencies = [0.0] * args.drivers
+
+        def accept(index):
+            barrier.wait()
+            start = time.perf_counter()
+            try:
+                results[index] = status_of(clients[index].post(f'/api/ambulance/accept-alert/{alert_id}'))
+            except Exception as e:
+                results[index] = repr(e)
+            latencies[index] = time.perf_counter() - start
+
+        threads = [threading.Thread(target=accept, args=(i,)) for i in range(args.drivers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        winners = [driver_ids[i] for i, status in enumerate(results) if status == 200]
+        conflicts = results.count(409)
+        errors = args.drivers - len(winners) - conflicts
+        with app.app_context():
+            alert = db.session.get(Alert, alert_id)
+            unavailable = {user.id for user in User.query.filter(User.id.in_(driver_ids), User.is_available.is_(False))}
+
+        ok = (len(winners) == 1 and errors == 0 and alert.status == 'accepted'
+              and alert.assigned_ambulance_id == winners[0] and unavailable == {winners[0]})
+        failures += not ok
+        latencies.sort()
+        print(f"{round_number:>5} {len(winners):>8} {conflicts:>6} {errors:>7} "
+              f"{latencies[len(latencies) // 2] * 1e3:>8.1f} {latencies[int(len(latencies) * 0.99)] * 1e3:>8.1f}  "
+              f"{'ok' if ok else 'FAIL'}")
+        if errors:
+            print(f"      unexpected responses: {sorted({str(r) for r in results if r not in (200, 409)})}")
+
+    if failures:
+        print(f"\n{failures} of {args.rounds} rounds did not have exactly one winner")
+        sys.exit(1)
+    print("\nEvery round had exactly one winner.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+Load test: mixed API workload with per-endpoint latency and throughput.
+
+Seeds N users, M ambulances and K historical alerts, then runs worker
+threads for a fixed duration. Each request is picked by weight from the mix:
+SOS bursts (POST /api/alerts), admin, user and ambulance dashboard polling,
+location pings, dispatches, and accepts that several drivers race for.
+Reports count, errors, req/s and p50/p95/p99 latency per endpoint and can
+write them as JSON. Pass --baseline with an earlier JSON file to print the
+change between two runs.
+
+Runs in-process on the Flask test client against a throwaway SQLite file by
+default. With --url it targets a running server (e.g. gunicorn); DATABASE_URL
+must then point at that server's database so the accounts can be seeded.
+
+Usage: python benchmarks/load_test.py [--users 1000] [--ambulances 100] [--alerts 100000]
+       [--duration 30] [--threads 16] [--url http://127.0.0.1:8000] [--output results.json]
+"""
+
+import argparse
+import collections
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# action -> default weight
+DEFAULT_MIX = {
+    'sos': 5,
+    'admin_poll': 15,
+    'user_poll': 15,
+    'ambulance_poll': 20,
+    'location': 30,
+    'dispatch': 5,
+    'accept': 10,
+}
+
+
+class LiveClient:
+    """requests.Session with the parts of the Flask test client used here"""
+
+    def __init__(self, base_url):
+        import requests
+        self.base_url = base_url.rstrip('/')
+        self.session = requests.Session()
+
+    def open(self, method, path, json=None):
+        return self.session.request(method, self.base_url + path, json=json)
+
+
+def request(client, method, path, json=None):
+    """Issue a request on either client type and return (status, body or None)"""
+    if isinstance(client, LiveClient):
+        response = client.open(method, path, json=json)
+        body = response.json() if 'json' in response.headers.get('Content-Type', '') else None
+        return response.status_code, body
+    response = client.open(path, method=method, json=json)
+    return response.status_code, response.get_json(silent=True)
+
+
+class Recorder:
+    """Latency samples and error counts per endpoint"""
+
+    def __init__(self):
+        self.latencies = collections.defaultdict(list)
+        self.errors = collections.Counter()
+        self.lock = threading.Lock()
+
+    def record(self, endpoint, elapsed, ok):
+        with self.lock:
+            self.latencies[endpoint].append(elapsed)
+            if not ok:
+                self.errors[endpoint] += 1
+
+    def summary(self, duration):
+        results = {}
+        for endpoint in sorted(self.latencies):
+            samples = sorted(self.latencies[endpoint])
+            pick = lambda fraction: samples[min(len(samples) - 1, int(len(samples) * fraction))] * 1e3
+            results[endpoint] = {
+                'count': len(samples),
+                'errors': self.errors[endpoint],
+                'rps': round(len(samples) / duration, 1),
+                'mean_ms': round(sum(samples) / len(samples) * 1e3, 3),
+                'p50_ms': round(pick(0.50), 3),
+                'p95_ms': round(pick(0.95), 3),
+                'p99_ms': round(pick(0.99), 3),
+                'max_ms': round(samples[-1] * 1e3, 3),
+            }
+        return results
+
+
+def seed(app, db, User, Alert, prefix, users, ambulances, alerts, rng):
+    """Bulk-insert accounts and historical alerts; returns (user ids, driver ids)"""
+    from werkzeug.security import generate_password_hash
+
+    # Cheap hash: login cost is not what this benchmark measures
+    password_hash = generate_password_hash('pw', method='pbkdf2:sha256:1000')
+    with app.app_context():
+        db.session.add(User(username=f'{prefix}_admin', email=f'{prefix}_admin@example.com',
+                            password_hash=password_hash, is_admin=True))
+        db.session.execute(db.insert(User), [
+            {'username': f'{prefix}_user{i}', 'email': f'{prefix}_user{i}@example.com', 'password_hash': password_hash}
+            for i in range(users)
+        ])
+        db.session.execute(db.insert(User), [
+            {'username': f'{prefix}_amb{i}', 'email': f'{prefix}_amb{i}@example.com', 'password_hash': password_hash,
+             'is_ambulance_driver': True, 'is_available': True, 'driver_id': f'{prefix.upper()}{i:05d}',
+             'current_latitude': 40.5 + rng.random() * 0.45, 'current_longitude': -74.2 + rng.random() * 0.6}
+            for i in range(ambulances)
+        ])
+        db.session.commit()
+        user_ids = [row.id for row in db.session.execute(
+            db.select(User.id).where(User.username.like(f'{prefix}_user%')).order_by(User.id))]
+        driver_ids = [row.id for row in db.session.execute(
+            db.select(User.id).where(User.username.like(f'{prefix}_amb%')).order_by(User.id))]
+
+        now = datetime.utcnow()
+        for begin in range(0, alerts, 50000):
+            rows = []
+            for n in range(begin, min(begin + 50000, alerts)):
+                timestamp = now - timedelta(seconds=(alerts - n) * 30)
+                rows.append({
+                    'alert_type': 'Accident', 'latitude': 40.5 + rng.random() * 0.45,
+                    'longitude': -74.2 + rng.random() * 0.6, 'timestamp': timestamp,
+                    'updated_at': timestamp + timedelta(minutes=5), 'user_id': rng.choice(user_ids),
+                    'impact_magnitude': 30.0, 'status': 'resolved', 'resolved': True,
+                    'assigned_ambulance_id': rng.choice(driver_ids) if driver_ids else None,
+                })
+            db.session.execute(db.insert(Alert), rows)
+        db.session.commit()
+    return user_ids, driver_ids
+
+
+def login(make_client, username):
+    client = make_client()
+    status, body = request(client, 'POST', '/login', {'username': username, 'password': 'pw'})
+    if status != 200 or not body or not body.get('success'):
+        raise RuntimeError(f"login failed for {username}")
+    return client
+
+
+class Workload:
+    """Shared state between worker threads: open alerts and the dispatch/accept pipeline"""
+
+    def __init__(self, recorder, mix, rng_seed):
+        self.recorder = recorder
+        self.actions = list(mix)
+        self.weights = [mix[action] for action in self.actions]
+        self.pending = collections.deque(maxlen=1000)     # alert ids waiting for dispatch
+        self.dispatched = collections.deque(maxlen=1000)  # alert ids drivers race to accept
+        self.rng_seed = rng_seed
+
+    def timed(self, endpoint, client, method, path, json=None, ok_statuses=(200,)):
+        start = time.perf_counter()
+        try:
+            status, body = request(client, method, path, json)
+        except Exception:
+            status, body = None, None
+        self.recorder.record(endpoint, time.perf_counter() - start, status in ok_statuses)
+        return status, body
+
+    def run(self, worker, sessions, deadline):
+        rng = random.Random(self.rng_seed + worker)
+        admin, users, drivers = sessions
+        while time.perf_counter() < deadline:
+            action = rng.choices(self.actions, self.weights)[0]
+            if action == 'sos':
+                # A burst of reports from several users at once
+                for client in rng.sample(users, min(len(users), rng.randint(1, 5))):
+                    _, body = self.timed('POST /api/alerts', client, 'POST', '/api/alerts', {
+                        'alert_type': 'Manual SOS', 'latitude': 40.5 + rng.random() * 0.45,
+                        'longitude': -74.2 + rng.random() * 0.6, 'impact_magnitude': rng.uniform(20, 60)
+                    })
+                    if body and body.get('alert_id') and not body.get('merged'):
+                        self.pending.append(body['alert_id'])
+            elif action == 'admin_poll':
+                self.timed('GET /api/alerts (admin page)', admin, 'GET', '/api/alerts?limit=100')
+            elif action == 'user_poll':
+                self.timed('GET /api/alerts (user)', rng.choice(users), 'GET', '/api/alerts')
+            elif action == 'ambulance_poll':
+                self.timed('GET /api/ambulance/alerts', rng.choice(drivers), 'GET', '/api/ambulance/alerts')
+            elif action == 'location':
+                self.timed('POST /api/ambulance/update-location', rng.choice(drivers), 'POST',
+                           '/api/ambulance/update-location',
+                           {'latitude': 40.5 + rng.random() * 0.45, 'longitude': -74.2 + rng.random() * 0.6})
+            elif action == 'dispatch':
+                try:
+                    alert_id = self.pending.popleft()
+                except IndexError:
+                    continue
+                status, _ = self.timed('PATCH /api/alerts/<id>/dispatch', admin, 'PATCH',
+                                       f'/api/alerts/{alert_id}/dispatch')
+                if status == 200:
+                    self.dispatched.append(alert_id)
+            elif action == 'accept':
+                # Every worker goes for the newest dispatched alert, so accepts collide
+                try:
+                    alert_id = self.dispatched[-1]
+                except IndexError:
+                    continue
+                client = rng.choice(drivers)
+                status, _ = self.timed('POST /api/ambulance/accept-alert/<id>', client, 'POST',
+                                       f'/api/ambulance/accept-alert/{alert_id}', ok_statuses=(200, 409))
+                if status == 200:
+                    try:
+                        self.dispatched.remove(alert_id)
+                    except ValueError:
+                        pass
+                    self.timed('POST /api/ambulance/resolve-alert/<id>', client, 'POST',
+                               f'/api/ambulance/resolve-alert/{alert_id}')
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results, baseline=None):
+    print(f"{'endpoint':<40} {'count':>7} {'err':>5} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for endpoint, stats in results.items():
+        print(f"{endpoint:<40} {stats['count']:>7} {stats['errors']:>5} {stats['rps']:>8.1f} "
+              f"{stats['p50_ms']:>8.2f} {stats['p95_ms']:>8.2f} {stats['p99_ms']:>8.2f}")
+        previous = (baseline or {}).get(endpoint)
+        if previous:
+            change = lambda key: (stats[key] / previous[key] - 1) * 100 if previous[key] else 0.0
+            print(f"{'  vs baseline':<40} {'':>7} {'':>5} {change('rps'):>+7.0f}% "
+                  f"{change('p50_ms'):>+7.0f}% {change('p95_ms'):>+7.0f}% {change('p99_ms'):>+7.0f}%")
+
+
+def parse_mix(value):
+    mix = dict(DEFAULT_MIX)
+    for part in filter(None, value.split(',')):
+        action, weight = part.split('=')
+        if action not in mix:
+            raise argparse.ArgumentTypeError(f"unknown action {action!r}; choose from {', '.join(DEFAULT_MIX)}")
+        mix[action] = float(weight)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--ambulances', type=int, default=100)
+    parser.add_argument('--alerts', type=int, default=100000, help='historical alerts to seed')
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--sessions', type=int, default=8, help='logged-in users and drivers per thread')
+    parser.add_argument('--mix', type=parse_mix, default=dict(DEFAULT_MIX),
+                        help='weights, e.g. sos=10,location=50 (others keep their defaults)')
+    parser.add_argument('--url', help='base URL of a running server (default: in-process test client)')
+    parser.add_argument('--output', help='write results as JSON')
+    parser.add_argument('--baseline', help='JSON from an earlier run to compare against')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    if not args.url:
+        workdir = tempfile.mkdtemp(prefix='autorescue-bench-')
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+
+    from app import app, db, User, Alert, flush_locations
+    import migrations
+
+    with app.app_context():
+        migrations.upgrade(db.engine, db.metadata, log=None)
+        backend = db.engine.dialect.name
+
+    # Unique names so repeated runs against a live database do not collide
+    prefix = f'load{uuid.uuid4().hex[:6]}'
+    rng = random.Random(args.seed)
+    start = time.perf_counter()
+    user_ids, driver_ids = seed(app, db, User, Alert, prefix, args.users, args.ambulances, args.alerts, rng)
+    seeded_in = time.perf_counter() - start
+
+    make_client = (lambda: LiveClient(args.url)) if args.url else app.test_client
+    sessions = []
+    for worker in range(args.threads):
+        admin = login(make_client, f'{prefix}_admin')
+        users = [login(make_client, f'{prefix}_user{i}')
+                 for i in range(worker, args.users, args.threads)[:args.sessions]]
+        drivers = [login(make_client, f'{prefix}_amb{i}')
+                   for i in range(worker, args.ambulances, args.threads)[:args.sessions]]
+        if not users or not drivers:
+            parser.error('need at least one user and one ambulance per thread')
+        sessions.append((admin, users, drivers))
+
+    target = args.url or 'in-process test client'
+    print(f"AutoRescue load test: {args.users} users, {args.ambulances} ambulances, {args.alerts} alerts, "
+          f"{args.threads} threads x {args.duration:.0f} s ({target}, {backend})")
+    print(f"Seeded in {seeded_in:.1f} s")
+    print("=" * 86)
+
+    recorder = Recorder()
+    workload = Workload(recorder, args.mix, args.seed)
+    deadline = time.perf_counter() + args.duration
+    threads = [threading.Thread(target=workload.run, args=(worker, sessions[worker], deadline))
+               for worker in range(args.threads)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    if not args.url:
+        with app.app_context():
+            flush_locations()
+
+    results = recorder.summary(elapsed)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['endpoints']
+    print_results(results, baseline)
+    total = sum(stats['count'] for stats in results.values())
+    errors = sum(stats['errors'] for stats in results.values())
+    print(f"\n{total} requests in {elapsed:.1f} s ({total / elapsed:.0f} req/s), {errors} errors")
+
+    if args.output:
+        report = {
+            'meta': {
+                'started_at': datetime.utcnow().isoformat(),
+                'revision': git_revision(),
+                'target': target,
+                'backend': backend,
+                'python': platform.python_version(),
+                'users': args.users,
+                'ambulances': args.ambulances,
+                'alerts': args.alerts,
+                'threads': args.threads,
+                'duration_s': round(elapsed, 2),
+                'mix': args.mix,
+            },
+            'endpoints': results,
+        }
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""
+Replay an event log (EVENT_LOG_DIR, see eventlog.py) through the app at N x
+real time, to load-test dispatch and other changes against recorded traffic.
+
+Records written by one request are sent back as one request on the Flask
+test client against a fresh database: location fixes to
+/api/ambulance/update-location, reports to POST /api/alerts, gateway records
+to /api/ingest, and verify, dispatch, accept and resolve to their endpoints
+as the user who made them. Users are created with their recorded ids; alert
+ids are mapped to the ones the replay creates. Accelerometer detections are
+replayed as plain reports (raw frames are not logged).
+
+Requests are paced by the record timestamps divided by ``--speed`` (0: as
+fast as possible). Latency per event type, how far the replay fell behind
+schedule, and how often dispatch still ranks the recorded first choice first
+are reported. The incident merge window is shortened by the same factor;
+unpaced, reports recorded as separate alerts may merge, and later changes to
+them are skipped. Without a log directory a synthetic one is recorded first:
+``--drivers`` ambulances pinging every 10 s and ``--rate`` alerts a minute
+over ``--minutes``, in the bundled test city (set ROAD_GRAPH_FILE to replay
+it with ETA ranking).
+
+Usage: python benchmarks/replay_events.py [LOG_DIR] [--speed 10] [--from 0]
+       [--limit N] [--minutes 30] [--drivers 20] [--rate 6]
+"""
+
+import argparse
+import heapq
+import itertools
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import eventlog
+from dispatch import haversine_m
+
+CITY_BOUNDS = (40.70, -74.02, 40.78, -73.92)
+INGEST_TOKEN = 'replay'
+
+
+def synthetic_log(directory, minutes, drivers, rate, rng):
+    """Record a shift of pings, reports and status changes as the app would log them"""
+    log = eventlog.EventLog(directory)
+    admin, first_reporter = 1, 2 + drivers
+    positions = {unit: (rng.uniform(CITY_BOUNDS[0], CITY_BOUNDS[2]), rng.uniform(CITY_BOUNDS[1], CITY_BOUNDS[3]))
+                 for unit in range(2, 2 + drivers)}
+    busy = set()
+    start = time.time() - minutes * 60
+    order = itertools.count()  # Ties in time keep scheduling order
+    queue = [(start + rng.uniform(0, 10), next(order), 'ping', unit) for unit in positions]
+    at = start
+    while True:
+        at += rng.expovariate(rate / 60)
+        if at > start + minutes * 60:
+            break
+        queue.append((at, next(order), 'report', None))
+    heapq.heapify(queue)
+    alerts, reported_at = {}, {}
+
+    def later(delay, action, subject):
+        heapq.heappush(queue, (at + delay, next(order), action, subject))
+
+    while queue:
+        at, _, action, subject = heapq.heappop(queue)
+        if action == 'ping':
+            latitude, longitude = positions[subject]
+            latitude = min(max(latitude + rng.gauss(0, 0.0005), CITY_BOUNDS[0]), CITY_BOUNDS[2])
+            longitude = min(max(longitude + rng.gauss(0, 0.0005), CITY_BOUNDS[1]), CITY_BOUNDS[3])
+            positions[subject] = (latitude, longitude)
+            log.append_many([('location', {'user_id': subject, 'latitude': latitude, 'longitude': longitude,
+                                           'recorded_at': at, 'source': 'api'})], at)
+            if at < start + minutes * 60:
+                later(10, 'ping', subject)
+        elif action == 'report':
+            alert_id = len(alerts) + 1
+            while True:
+                # Reports the app would have merged (see ALERT_CLUSTER_*) are kept apart
+                position = (rng.uniform(CITY_BOUNDS[0], CITY_BOUNDS[2]), rng.uniform(CITY_BOUNDS[1], CITY_BOUNDS[3]))
+                if all(at - reported > 120 or haversine_m(*position, *alerts[other]) > 100
+                       for other, reported in reported_at.items()):
+                    break
+            alerts[alert_id], reported_at[alert_id] = position, at
+            gateway = rng.random() < 0.2
+            report = {'user_id': None if gateway else first_reporter + rng.randrange(50),
+                      'alert_type': rng.choice(['Accident', 'Manual SOS']), 'latitude': alerts[alert_id][0],
+                      'longitude': alerts[alert_id][1], 'details': '', 'impact_magnitude': rng.uniform(25, 80),
+                      'alert_id': alert_id, 'created': True, 'source': 'ingest' if gateway else 'api'}
+            if gateway:
+                report.update(reporter=f'vehicle:{rng.randrange(1000)}', reported_at=at)
+            log.append_many([('alert.reported', report)], at)
+            # One in ten is a false alarm the dispatcher closes straight away
+            later(rng.uniform(10, 40), 'dismiss' if rng.random() < 0.1 else 'verify', alert_id)
+        elif action == 'dismiss':
+            log.append_many([('alert.resolved', {'alert_id': subject, 'previous': 'pending', 'user_id': admin,
+                                                 'endpoint': 'resolve_alert'})], at)
+        elif action == 'verify':
+            log.append_many([('alert.verified', {'alert_id': subject, 'previous': 'pending', 'user_id': admin,
+                                                 'endpoint': 'verify_alert'})], at)
+            later(rng.uniform(10, 40), 'dispatch', subject)
+        elif action == 'dispatch':
+            ranked = sorted((haversine_m(*positions[unit], *alerts[subject]), unit)
+                            for unit in positions if unit not in busy)[:3]
+            log.append_many([('alert.dispatched', {
+                'candidates': [[unit, round(distance, 1), None] for distance, unit in ranked],
+                'alert_id': subject, 'previous': 'verified', 'user_id': admin, 'endpoint': 'dispatch_alert'
+            })], at)
+            if ranked:
+                later(rng.uniform(5, 30), 'accept', (subject, [unit for _, unit in ranked]))
+        elif action == 'accept':
+            alert_id, units = subject
+            free = [unit for unit in units if unit not in busy]
+            if free:
+                busy.add(free[0])
+                log.append_many([('alert.accepted', {'alert_id': alert_id, 'previous': 'dispatched',
+                                                     'user_id': free[0], 'endpoint': 'accept_alert'})], at)
+                later(rng.uniform(300, 900), 'resolve', (alert_id, free[0]))
+        elif action == 'resolve':
+            alert_id, unit = subject
+            busy.discard(unit)
+            log.append_many([('alert.resolved', {'alert_id': alert_id, 'previous': 'accepted', 'user_id': unit,
+                                                 'endpoint': 'resolve_alert_by_ambulance'})], at)
+    log.close()
+
+
+def request_key(record):
+    """Records appended by one request share this key and their timestamp"""
+    source = record.data.get('source')
+    if source == 'ingest' or (record.type == 'location' and source == 'api'):
+        return record.type, source, record.data['user_id'] if source == 'api' else None
+    return record.offset
+
+
+def request_groups(records):
+    group = []
+    for record in records:
+        if group and (record.timestamp != group[0].timestamp or request_key(record) != request_key(group[0])):
+            yield group
+            group = []
+        group.append(record)
+    if group:
+        yield group
+
+
+class Replayer:
+    """Sends recorded requests back through the app as their users"""
+
+    def __init__(self, app):
+        self.app = app
+        self.clients = {}
+        self.alert_ids = {}  # recorded alert id -> replayed alert id
+        self.skipped = 0
+        self.merged = 0  # Recorded as new alerts, merged into another incident by the replay
+        self.dispatches = 0
+        self.same_first_choice = 0
+
+    def client(self, user_id):
+        if user_id not in self.clients:
+            client = self.app.test_client()
+            client.post('/login', json={'username': f'user{user_id}', 'password': 'pw'})
+            self.clients[user_id] = client
+        return self.clients[user_id]
+
+    def remember(self, record, alert_id, merged):
+        if merged and record.data['created']:
+            # Replayed faster than the clustering window: later changes to the
+            # recorded alert would hit the incident it was merged into
+            self.merged += 1
+            return
+        self.alert_ids[record.data['alert_id']] = alert_id
+
+    def ingest(self, body):
+        return self.app.test_client().post('/api/ingest', json=body,
+                                           headers={'Authorization': f'Bearer {INGEST_TOKEN}'})
+
+    def send(self, group, shift):
+        """Replay one request; returns whether it got a 2xx (None when skipped)"""
+        first = group[0]
+        data = first.data
+        if first.type == 'location':
+            fixes = [{'latitude': record.data['latitude'], 'longitude': record.data['longitude'],
+                      'timestamp': (record.data['recorded_at'] + shift) * 1000} for record in group]
+            if data['source'] == 'ingest':
+                return self.ingest({'locations': [dict(fix, user_id=record.data['user_id'])
+                                                  for fix, record in zip(fixes, group)]}).status_code == 200
+            return self.client(data['user_id']).post('/api/ambulance/update-location',
+                                                     json={'points': fixes}).status_code == 200
+
+        if first.type == 'alert.reported':
+            fields = ('alert_type', 'latitude', 'longitude', 'details', 'impact_magnitude')
+            if data['source'] == 'ingest':
+                items = []
+                for record in group:
+                    item = {field: record.data[field] for field in fields}
+                    reporter = record.data.get('reporter')
+                    if isinstance(reporter, str) and reporter.startswith('vehicle:'):
+                        item['vehicle_id'] = reporter[len('vehicle:'):]
+                    items.append(dict(item, user_id=record.data['user_id'],
+                                      timestamp=(record.data['reported_at'] + shift) * 1000))
+                response = self.ingest({'alerts': items})
+                if response.status_code != 200:
+                    return False
+                for record, result in zip(group, response.get_json()['results']):
+                    self.remember(record, result.get('alert_id'), result['status'] == 'merged')
+                return True
+            response = self.client(data['user_id']).post('/api/alerts', json={field: data[field] for field in fields})
+            if response.status_code != 200:
+                return False
+            body = response.get_json()
+            self.remember(first, body['alert_id'], body['merged'])
+            return True
+
+        alert_id = self.alert_ids.get(data['alert_id'])
+        if alert_id is None:
+            # Reported before the replayed range, or merged away
+            self.skipped += 1
+            return None
+        client = self.client(data['user_id'])
+        endpoint = data.get('endpoint')
+        if endpoint == 'verify_alert':
+            response = client.patch(f'/api/alerts/{alert_id}/verify')
+        elif endpoint == 'dispatch_alert':
+            response = client.patch(f'/api/alerts/{alert_id}/dispatch')
+            if response.status_code == 200 and data.get('candidates'):
+                self.dispatches += 1
+                candidates = response.get_json()['candidates']
+                if candidates and candidates[0]['ambulance_id'] == data['candidates'][0][0]:
+                    self.same_first_choice += 1
+        elif endpoint == 'accept_alert':
+            response = client.post(f'/api/ambulance/accept-alert/{alert_id}')
+        elif endpoint == 'resolve_alert':
+            response = client.patch(f'/api/alerts/{alert_id}/resolve')
+        elif endpoint == 'resolve_alert_by_ambulance':
+            response = client.post(f'/api/ambulance/resolve-alert/{alert_id}')
+        else:
+            self.skipped += 1
+            return None
+        return 200 <= response.status_code < 300
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('log', nargs='?', help='event log directory (a synthetic log if omitted)')
+    parser.add_argument('--speed', type=float, default=10.0, help='multiple of real time (0 = unpaced)')
+    parser.add_argument('--from', dest='start', type=int, default=0, help='first offset replayed')
+    parser.add_argument('--limit', type=int, help='records replayed')
+    parser.add_argument('--minutes', type=int, default=30, help='synthetic log length')
+    parser.add_argument('--drivers', type=int, default=20, help='synthetic ambulances')
+    parser.add_argument('--rate', type=float, default=6.0, help='synthetic alerts per minute')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='autorescue-replay-')
+    if not args.log:
+        args.log = os.path.join(workdir, 'events')
+        synthetic_log(args.log, args.minutes, args.drivers, args.rate, random.Random(args.seed))
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'replay.db')
+    os.environ['ALERTS_VERSION_FILE'] = os.path.join(workdir, 'alerts.version')
+    os.environ['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:1000'
+    # The replay itself is not logged
+    os.environ.pop('EVENT_LOG_DIR', None)
+
+    log = eventlog.EventLog(args.log)
+    end = args.start + args.limit if args.limit else None
+    records = list(log.read(args.start, end))
+    if not records:
+        sys.exit(f'No records in {args.log} from offset {args.start}')
+
+    from app import app, db, alert_clusters, password_hasher, User
+    import migrations
+
+    app.config['INGEST_TOKENS'] = [INGEST_TOKEN]
+    if args.speed > 0:
+        # Reports merge into incidents reported within the same recorded time
+        app.config['ALERT_CLUSTER_WINDOW'] /= args.speed
+        alert_clusters.window = app.config['ALERT_CLUSTER_WINDOW']
+    admins, drivers, users = set(), set(), set()
+    for record in records:
+        user_id = record.data.get('user_id')
+        if user_id is None:
+            continue
+        users.add(user_id)
+        if record.data.get('endpoint') in ('verify_alert', 'dispatch_alert', 'resolve_alert'):
+            admins.add(user_id)
+        if record.type == 'location' or record.data.get('endpoint') in ('accept_alert', 'resolve_alert_by_ambulance'):
+            drivers.add(user_id)
+    with app.app_context():
+        migrations.upgrade(db.engine, db.metadata, log=None)
+        password_hash = password_hasher.hash('pw')
+        db.session.add_all([User(id=user_id, username=f'user{user_id}', email=f'user{user_id}@example.com',
+                                 password_hash=password_hash, is_admin=user_id in admins,
+                                 is_ambulance_driver=user_id in drivers,
+                                 driver_id=f'UNIT{user_id}' if user_id in drivers else None)
+                            for user_id in sorted(users)])
+        db.session.commit()
+
+    span = records[-1].timestamp - records[0].timestamp
+    print(f"AutoRescue replay: {len(records)} records from {args.log} (offsets {records[0].offset}-"
+          f"{records[-1].offset}), {span / 60:.1f} min recorded, speed {args.speed:g}x, "
+          f"{len(drivers)} drivers, {len(admins)} dispatchers")
+    print('=' * 78)
+
+    replayer = Replayer(app)
+    latencies, failed, lags = {}, {}, []
+    started = time.perf_counter()
+    for group in request_groups(records):
+        if args.speed > 0:
+            due = started + (group[0].timestamp - records[0].timestamp) / args.speed
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            lags.append(max(-delay, 0.0) * 1000)
+        # Recorded fix and report times keep their age relative to the request
+        shift = time.time() - group[0].timestamp
+        begin = time.perf_counter()
+        ok = replayer.send(group, shift)
+        if ok is None:
+            continue
+        latencies.setdefault(group[0].type, []).append((time.perf_counter() - begin) * 1000)
+        if not ok:
+            failed[group[0].type] = failed.get(group[0].type, 0) + 1
+    elapsed = time.perf_counter() - started
+
+    print(f"{'event':<18}{'requests':>9}{'failed':>8}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for event_type, samples in sorted(latencies.items()):
+        print(f"{event_type:<18}{len(samples):>9}{failed.get(event_type, 0):>8}{statistics.median(samples):>9.1f}"
+              f"{percentile(samples, 0.99):>9.1f}{max(samples):>9.1f}")
+    print('-' * 78)
+    requests = sum(len(samples) for samples in latencies.values())
+    print(f"{requests} requests in {elapsed:.1f} s ({requests / elapsed:.0f}/s, {span / elapsed if elapsed else 0:.1f}x "
+          f"real time), {replayer.skipped} skipped")
+    if replayer.merged:
+        print(f"{replayer.merged} report(s) recorded as new alerts were merged into other incidents "
+              f"(changes to them skipped)")
+    if lags:
+        print(f"behind schedule: p50 {statistics.median(lags):.1f} ms, p99 {percentile(lags, 0.99):.1f} ms, "
+              f"max {max(lags):.1f} ms")
+    if replayer.dispatches:
+        print(f"dispatch ranked the recorded first choice first in {replayer.same_first_choice} of "
+              f"{replayer.dispatches} dispatches")
+    print('=' * 78)
+    if failed:
+        print(f"{sum(failed.values())} replayed request(s) failed")
+        sys.exit(1)
+    print('Every replayed request succeeded.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+"""
+AutoRescue Response Cache
+
+Dashboards poll the alert lists far more often than alerts change. A data
+version that every worker bumps after committing an alert write lets an
+unchanged poll be answered from memory: ``304 Not Modified`` when the client
+already holds the current ETag, otherwise the body rendered for the same
+version. The version lives in a small memory-mapped file, so all worker
+processes on a host see each other's writes with a plain memory read.
+
+Besides the global version the file holds a table of per-region counters
+(regions hashed onto a fixed number of slots), so a response that only
+covers a few regions stays valid while alerts change elsewhere.
+
+TemplateCache keeps the Python code Jinja compiles the page templates to,
+so a fresh process renders its first dashboard without compiling it.
+"""
+
+import collections
+import contextlib
+import mmap
+import os
+import struct
+import threading
+import zlib
+
+from jinja2 import FileSystemBytecodeCache
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers in other processes are not serialised
+    fcntl = None
+
+_LAYOUT = struct.Struct('<QQQ')  # version, epoch, version of writes to unknown regions
+_SLOT = struct.Struct('<Q')
+
+
+class SharedVersion:
+    """Counter shared by processes through a memory-mapped file (in-process only without a path).
+
+    Raises OSError when the file cannot be created or mapped.
+    """
+
+    def __init__(self, path=None, slots=0):
+        self._lock = threading.Lock()
+        self._file = None
+        self.slots = slots
+        size = _LAYOUT.size + _SLOT.size * slots
+        if path is None:
+            self._map = bytearray(size)
+            _LAYOUT.pack_into(self._map, 0, 0, int.from_bytes(os.urandom(4), 'little'), 0)
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._file = open(path, 'a+b')
+            try:
+                with self._exclusive():
+                    self._file.seek(0, os.SEEK_END)
+                    if self._file.tell() != size:
+                        # A new, truncated or differently sized file gets a fresh
+                        # epoch, so tags issued against old counters never match again
+                        self._file.truncate(0)
+                        self._file.write(_LAYOUT.pack(0, int.from_bytes(os.urandom(4), 'little'), 0))
+                        self._file.write(bytes(size - _LAYOUT.size))
+                        self._file.flush()
+                self._map = mmap.mmap(self._file.fileno(), size)
+            except OSError:
+                self._file.close()
+                raise
+        self.epoch = _LAYOUT.unpack_from(self._map)[1]
+
+    @contextlib.contextmanager
+    def _exclusive(self):
+        with self._lock:
+            locked = self._file is not None and fcntl is not None
+            if locked:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if locked:
+                    fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+
+    def current(self):
+        return _LAYOUT.unpack_from(self._map)[0]
+
+    def bump(self, regions=None):
+        """Advance the version and the counters of ``regions`` (all of them when None)"""
+        with self._exclusive():
+            version, epoch, anywhere = _LAYOUT.unpack_from(self._map)
+            if regions is None:
+                anywhere += 1
+            elif self.slots:
+                for offset in {self._offset(region) for region in regions}:
+                    _SLOT.pack_into(self._map, offset, _SLOT.unpack_from(self._map, offset)[0] + 1)
+            _LAYOUT.pack_into(self._map, 0, version + 1, epoch, anywhere)
+        return version + 1
+
+    def regional(self, regions):
+        """Stamp that changes whenever a write may have touched one of ``regions``"""
+        anywhere = _LAYOUT.unpack_from(self._map)[2]
+        if not self.slots:
+            return (anywhere, self.current())
+        offsets = sorted({self._offset(region) for region in regions})
+        return (anywhere, *(_SLOT.unpack_from(self._map, offset)[0] for offset in offsets))
+
+    def _offset(self, region):
+        return _LAYOUT.size + _SLOT.size * (zlib.crc32(region.encode()) % self.slots)
+
+
+class ResponseCache:
+    """Rendered bodies keyed by (scope, path), valid while their stamp is current"""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()  # key -> (stamp, body)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, stamp):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != stamp:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, stamp, body):
+        with self._lock:
+            self._entries[key] = (stamp, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class TemplateCache(FileSystemBytecodeCache):
+    """Compiled templates in a directory, used while their source checksum matches.
+
+    Filled by ``flask compile-templates``; a read-only deployment that cannot
+    store a newly compiled template just compiles it again in the next process.
+    """
+
+    def __init__(self, directory):
+        super().__init__(directory, '%s.jinja')
+
+    def dump_bytecode(self, bucket):
+        try:
+            super().dump_bytecode(bucket)
+        except OSError:
+            pass
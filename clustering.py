@@ -0,0 +1,136 @@
+"""
+AutoRescue Incident Clustering
+
+One crash often produces several SOS reports: ``handleMotion`` can fire more
+than once, and every phone in a vehicle or pile-up reports on its own. New
+reports are matched against recent open incidents in a time-windowed spatial
+hash, and a report within ``radius_m`` metres and ``window`` seconds of an
+incident's latest report is merged into it instead of becoming a new alert.
+
+Cells are at least ``radius_m`` wide everywhere in their row, so a match can
+only be in the 3x3 block of cells around the report, and expired entries are
+popped from a heap keyed by each incident's latest report, so reports may
+arrive out of time order (backfills, gateway batches). Matching is constant
+time and insertion logarithmic in the number of open incidents.
+"""
+
+import heapq
+import math
+import threading
+import time
+
+from dispatch import METERS_PER_DEGREE, haversine_m
+
+
+class Incident:
+    __slots__ = ('incident_id', 'latitude', 'longitude', 'cell', 'last_report', 'reporters')
+
+    def __init__(self, incident_id, latitude, longitude, cell, reported_at, reporter):
+        self.incident_id = incident_id
+        self.latitude = latitude
+        self.longitude = longitude
+        self.cell = cell
+        self.last_report = reported_at
+        self.reporters = {reporter}
+
+
+class IncidentClusterer:
+    """Recent open incidents bucketed by position, expiring after ``window`` seconds"""
+
+    def __init__(self, radius_m=50.0, window=120.0):
+        self.radius_m = float(radius_m)
+        self.window = float(window)
+        self.row_size = self.radius_m / METERS_PER_DEGREE
+        self._cells = {}      # (row, col) -> {incident_id: Incident}
+        self._incidents = {}  # incident_id -> Incident
+        self._expiry = []  # heap of (last_report, incident_id), stale entries included
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._incidents)
+
+    def __contains__(self, incident_id):
+        return incident_id in self._incidents
+
+    def _col_size(self, row):
+        # Use the row edge nearest a pole, where a degree of longitude is shortest
+        edge = max(abs(row * self.row_size), abs((row + 1) * self.row_size))
+        return self.row_size / max(math.cos(math.radians(min(edge, 89.0))), 1e-6)
+
+    def _cell(self, latitude, longitude):
+        row = int(math.floor(latitude / self.row_size))
+        return row, int(math.floor(longitude / self._col_size(row)))
+
+    def match(self, latitude, longitude, reported_at=None):
+        """Id of the nearest open incident within range of a new report, or None"""
+        reported_at = time.time() if reported_at is None else reported_at
+        row = int(math.floor(latitude / self.row_size))
+        best, best_distance = None, self.radius_m
+        cutoff = reported_at - self.window
+        with self._lock:
+            self._expire(reported_at)
+            for r in (row - 1, row, row + 1):
+                col = int(math.floor(longitude / self._col_size(r)))
+                for c in (col - 1, col, col + 1):
+                    for incident in self._cells.get((r, c), {}).values():
+                        # A backfilled report can be older than the expiry clock
+                        if incident.last_report < cutoff:
+                            continue
+                        distance = haversine_m(latitude, longitude, incident.latitude, incident.longitude)
+                        if distance <= best_distance:
+                            best, best_distance = incident.incident_id, distance
+        return best
+
+    def add(self, incident_id, latitude, longitude, reporter=None, reported_at=None):
+        """Track a newly created incident"""
+        reported_at = time.time() if reported_at is None else reported_at
+        cell = self._cell(latitude, longitude)
+        with self._lock:
+            self._discard(incident_id)
+            incident = Incident(incident_id, latitude, longitude, cell, reported_at, reporter)
+            self._cells.setdefault(cell, {})[incident_id] = incident
+            self._incidents[incident_id] = incident
+            heapq.heappush(self._expiry, (reported_at, incident_id))
+
+    def report(self, incident_id, reporter=None, reported_at=None):
+        """Record another report of an incident; True if ``reporter`` is new to it"""
+        reported_at = time.time() if reported_at is None else reported_at
+        with self._lock:
+            incident = self._incidents.get(incident_id)
+            if incident is None:
+                return True
+            incident.last_report = max(incident.last_report, reported_at)
+            heapq.heappush(self._expiry, (incident.last_report, incident_id))
+            if reporter in incident.reporters:
+                return False
+            incident.reporters.add(reporter)
+            return True
+
+    def remove(self, incident_id):
+        """Stop merging into an incident (e.g. once it is resolved)"""
+        with self._lock:
+            self._discard(incident_id)
+
+    def clear(self):
+        with self._lock:
+            self._cells.clear()
+            self._incidents.clear()
+            self._expiry.clear()
+
+    def _discard(self, incident_id):
+        incident = self._incidents.pop(incident_id, None)
+        if incident is not None:
+            cell = self._cells.get(incident.cell)
+            cell.pop(incident_id, None)
+            if not cell:
+                del self._cells[incident.cell]
+
+    def _expire(self, now):
+        # Heap entries superseded by a later report are skipped; each entry
+        # is popped once, so the cost is amortised over the inserts
+        cutoff = now - self.window
+        while self._expiry and self._expiry[0][0] < cutoff:
+            reported_at, incident_id = heapq.heappop(self._expiry)
+            incident = self._incidents.get(incident_id)
+            if incident is not None and incident.last_report < cutoff:
+                self._discard(incident_id)
@@ -4,6 +4,33 @@ AutoRescue Configuration Settings
 
 import os
 
+def database_uri(default='sqlite:///autorescue.db'):
+    """DATABASE_URL with Heroku/Neon-style ``postgres://`` URLs normalised for SQLAlchemy"""
+    uri = os.environ.get('DATABASE_URL') or default
+    if uri.startswith('postgres://'):
+        uri = 'postgresql://' + uri[len('postgres://'):]
+    return uri
+
+def engine_options(uri):
+    """Connection pool settings for server databases (SQLite keeps SQLAlchemy's defaults)"""
+    if uri.startswith('sqlite'):
+        return {}
+    options = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 10)),  # seconds waiting for a free connection
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),  # seconds, below typical server idle limits
+        'pool_pre_ping': True,  # drop connections the server or a proxy closed
+        'pool_use_lifo': True,  # let idle connections beyond the working set time out
+    }
+    if uri.startswith('postgresql'):
+        statement_timeout = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 5000))
+        options['connect_args'] = {
+            'options': f'-c statement_timeout={statement_timeout}',
+            'application_name': 'autorescue',
+        }
+    return options
+
 class Config:
     """Base configuration class"""
     
@@ -11,16 +38,109 @@ class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'your-secret-key-change-in-production'
     
     # Database settings
-    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///autorescue.db'
+    SQLALCHEMY_DATABASE_URI = database_uri()
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SEED_DEFAULT_USERS = os.environ.get('SEED_DEFAULT_USERS', '1') != '0'  # Create the demo admin/ambulance1 accounts
+    
+    # Geo query settings
+    GEO_SPATIAL_SQL = True  # Use PostGIS for nearest/bounding-box queries when the database has it
+    DISPATCH_FROM_DATABASE = False  # Rank dispatch candidates with a database query instead of the in-process index
     
     # Accident detection settings
     ACCELERATION_THRESHOLD = 25.0  # m/s² - threshold for accident detection
     SMOOTHING_WINDOW = 5  # Number of readings to average for smoothing
     
+    # Server-side accident detection (optional, requires NumPy)
+    SERVER_DETECTION_ENABLED = False  # Clients upload raw accelerometer frames instead of detecting locally
+    DETECTION_JERK_THRESHOLD = 0.0  # m/s³ - minimum jerk when crossing the threshold (0 = off)
+    DETECTION_COOLDOWN = 30  # seconds - at most one alert per vehicle per impact
+    DETECTION_MAX_FRAMES = 50000  # Frames accepted per upload
+    
     # Alert settings
     AUTO_REFRESH_INTERVAL = 30000  # milliseconds - admin dashboard refresh interval
     
+    # Alert deduplication settings
+    ALERT_CLUSTER_RADIUS_M = 50  # metres - reports this close to an open incident merge into it (0 = off)
+    ALERT_CLUSTER_WINDOW = 120  # seconds since the incident's latest report
+    
+    IDEMPOTENCY_KEY_TTL = 86400  # seconds - retries of POST /api/alerts with the same key are collapsed
+    
+    # Fleet gateway batch ingestion (POST /api/ingest); disabled without tokens
+    INGEST_TOKENS = [token for token in os.environ.get('INGEST_TOKENS', '').split(',') if token]
+    INGEST_MAX_ITEMS = 50000  # Alerts plus locations per request
+    INGEST_MAX_BYTES = 64 * 1024 * 1024  # Uncompressed body size
+    
+    # Triage settings: urgency as seconds of head start over the real report time
+    TRIAGE_TYPE_SECONDS = {'Accident': 60, 'Manual SOS': 0}
+    TRIAGE_IMPACT_SECONDS = 10  # per m/s² above ACCELERATION_THRESHOLD
+    TRIAGE_REPORTER_SECONDS = 60  # per additional reporter of the same incident
+    TRIAGE_ESCALATION_SECONDS = 600  # once an alert misses its SLA
+    TRIAGE_SLA = {'pending': 120, 'verified': 120, 'dispatched': 180}  # seconds allowed in each status
+    
+    # Alert listing settings
+    ALERTS_PAGE_SIZE = 100  # Default page size for paginated /api/alerts
+    ALERTS_MAX_PAGE_SIZE = 500
+    ALERTS_SYNC_OVERLAP = 2  # seconds - re-send window covering in-flight commits on `since` syncs
+    ALERTS_CACHE_ENABLED = True  # ETags, 304s and cached bodies for the alert list endpoints
+    ALERTS_CACHE_SIZE = 1024  # Rendered responses kept per worker
+    ALERTS_CACHE_TTL = 5  # seconds - ambulance feed reuse limit (it also depends on driver positions)
+    ALERTS_VERSION_FILE = os.environ.get('ALERTS_VERSION_FILE')  # Shared by workers; default instance/alerts.version
+    
+    # Archive settings: resolved alerts leave the hot table after ARCHIVE_AFTER_DAYS
+    ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', 30))
+    ARCHIVE_INTERVAL = 3600  # seconds between archiver runs in each worker (0 = off)
+    ARCHIVE_BATCH_SIZE = 1000  # Alerts moved per transaction
+    
+    # Dashboard statistics settings
+    STATS_HOURS = 24  # Hourly buckets returned by /api/stats by default
+    STATS_DAYS = 30  # Daily buckets returned by /api/stats by default
+    STATS_MAX_DAYS = 366
+    
+    # Region settings: alerts and ambulances are partitioned by geohash tile (regions.py)
+    REGION_CACHE_SLOTS = 4096  # Per-region version counters in the alerts version file
+    
+    # Dispatch settings
+    DISPATCH_GRID_SIZE_DEG = 0.05  # degrees - spatial index cell size (~5.5 km)
+    DISPATCH_CANDIDATES = 3  # Nearest available ambulances offered each dispatched alert
+    
+    # Road routing (routing.py): rank dispatch candidates by ETA on a road graph
+    ROAD_GRAPH_FILE = os.environ.get('ROAD_GRAPH_FILE')  # e.g. data/test_city.graph; unset = straight-line ranking
+    ROUTING_CANDIDATE_POOL = 50  # Straight-line nearest available units whose ETAs are compared
+    ROUTING_MAX_ETA = 1800  # seconds - searches stop here; slower units rank last
+    ROUTING_MAX_SNAP_M = 1000  # metres - positions further from any road fall back to straight-line ranking
+    ROUTING_CELL_SIZE_DEG = 0.002  # degrees - ETAs are cached per (ambulance cell, alert cell) (~200 m)
+    ROUTING_CACHE_SIZE = 100000  # Cached cell pairs per process
+    
+    # Location ingestion settings
+    LOCATION_FLUSH_INTERVAL = 1.0  # seconds between bulk position writes (0 = write-through)
+    LOCATION_FLUSH_BATCH = 500  # Flush early once this many drivers have unsaved positions
+    
+    # Live event stream settings
+    EVENT_HISTORY_SIZE = 1024  # Change events kept for reconnecting clients
+    EVENT_STREAM_HEARTBEAT = 15  # seconds - keepalive comment interval
+    EVENT_STREAM_MAX_AGE = 300  # seconds - streams are recycled, clients resume via Last-Event-ID
+    
+    # Event log (eventlog.py): every alert report, status change and location fix, appended to segment files
+    EVENT_LOG_DIR = os.environ.get('EVENT_LOG_DIR')  # e.g. instance/events; shared by workers; unset = no log
+    EVENT_LOG_SEGMENT_BYTES = 64 * 1024 * 1024  # A new segment file is started past this size
+    EVENT_LOG_FSYNC = False  # fsync every append (survives power loss, costs a disk flush per event)
+    
+    # Templates compiled by `flask --app app compile-templates`; used while they match their source
+    TEMPLATE_CACHE_DIR = os.environ.get('TEMPLATE_CACHE_DIR', 'instance/templates')  # '' = compile on first render
+    
+    # Async (ASGI) server settings
+    ASGI_THREADS = int(os.environ.get('ASGI_THREADS', 10))  # Handler threads per process; keep <= DB_POOL_SIZE
+    
+    # Metrics settings
+    METRICS_ENABLED = True  # Record request/SQL/alert timings and serve /api/metrics
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # Also accept "Authorization: Bearer <token>"; unset = admins only
+    
+    # Password settings: hashes made with another method or cost are replaced on the next login
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')  # any Werkzeug method, e.g. scrypt
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 0))  # Hashing threads per process (0 = one per core)
+    USER_CACHE_SIZE = 4096  # Users whose credentials and roles are kept per process for login
+    USER_CACHE_TTL = 30  # seconds - bounds how long other processes see a changed password or role (0 = off)
+    
     # Security settings
     SESSION_COOKIE_SECURE = False  # Set to True in production with HTTPS
     SESSION_COOKIE_HTTPONLY = True
@@ -36,12 +156,21 @@ class ProductionConfig(Config):
     DEBUG = False
     TESTING = False
     SESSION_COOKIE_SECURE = True  # Requires HTTPS
+    
+    # Production database from DATABASE_URL, e.g. postgresql://autorescue:secret@db/autorescue
+    # (pip install psycopg2-binary; CREATE EXTENSION postgis enables spatial SQL)
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(Config.SQLALCHEMY_DATABASE_URI)
+    # Workers do not share the in-process dispatch index; on the SQLite default the
+    # query is a full scan, so it is opt-in there (DISPATCH_FROM_DATABASE=1)
+    DISPATCH_FROM_DATABASE = os.environ.get(
+        'DISPATCH_FROM_DATABASE', '0' if Config.SQLALCHEMY_DATABASE_URI.startswith('sqlite') else '1') != '0'
 
 class TestingConfig(Config):
     """Testing configuration"""
     DEBUG = True
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    LOCATION_FLUSH_INTERVAL = 0
 
 # Configuration dictionary
 config = {
@@ -0,0 +1,199 @@
+"""
+AutoRescue Server-Side Accident Detection
+
+Streaming version of the detector in driver_dashboard.html ``handleMotion``:
+acceleration magnitude, moving average over ``SMOOTHING_WINDOW`` samples and
+a threshold test, plus jerk and peak tracking. Batches from many vehicles
+are processed together with NumPy; per-vehicle state (the last few samples)
+is carried between batches so windows continue seamlessly.
+
+NumPy is optional: ``detection.available`` is False when it is missing and
+the server-side mode stays disabled. It is imported on first use, so
+processes that never receive telemetry (a serverless cold start serving one
+SOS) do not pay for it.
+"""
+
+import collections
+import importlib.util
+import json
+import threading
+import time
+
+np = None  # numpy, once _import_numpy() has run
+available = importlib.util.find_spec('numpy') is not None
+
+
+def _import_numpy():
+    global np
+    if np is None:
+        import numpy
+        np = numpy
+
+# Frames are rows of (t_seconds, ax, ay, az)
+FRAME_COLUMNS = 4
+
+Detection = collections.namedtuple('Detection', ['vehicle', 'timestamp', 'magnitude', 'peak_magnitude', 'jerk'])
+
+
+class _VehicleState:
+    __slots__ = ('tail_t', 'tail_mag', 'prev_smoothed', 'prev_t', 'last_fire', 'last_seen')
+
+    def __init__(self):
+        self.tail_t = np.empty(0)
+        self.tail_mag = np.empty(0)
+        self.prev_smoothed = np.nan
+        self.prev_t = np.nan
+        self.last_fire = -np.inf
+        self.last_seen = time.monotonic()
+
+
+class AccidentDetector:
+    """Vectorized windowed-smoothing and threshold detector for many vehicles"""
+
+    def __init__(self, threshold=25.0, window=5, jerk_threshold=0.0, cooldown=30.0, state_ttl=600.0):
+        if not available:
+            raise RuntimeError('NumPy is required for server-side accident detection')
+        _import_numpy()
+        self.threshold = float(threshold)
+        self.window = int(window)
+        self.jerk_threshold = float(jerk_threshold)
+        self.cooldown = float(cooldown)
+        self.state_ttl = float(state_ttl)
+        self._states = {}
+        self._lock = threading.Lock()
+        self._last_expiry = time.monotonic()
+
+    def __len__(self):
+        return len(self._states)
+
+    def process(self, batches):
+        """Run detection over ``[(vehicle, frames), ...]`` and return Detections.
+
+        ``frames`` is an (n, 4) array-like of (t, ax, ay, az) in time order;
+        ``t`` is in seconds and only needs to be consistent per vehicle.
+        Frames with a NaN or infinite value are dropped, since one would
+        poison the running sums for every frame after it.
+        """
+        batches = [(vehicle, np.asarray(frames, dtype=np.float64).reshape(-1, FRAME_COLUMNS))
+                   for vehicle, frames in batches]
+        batches = [(vehicle, frames[np.isfinite(frames).all(axis=1)]) for vehicle, frames in batches]
+        batches = [(vehicle, frames) for vehicle, frames in batches if len(frames)]
+        if not batches:
+            return []
+
+        with self._lock:
+            self._expire()
+            return self._process(batches)
+
+    def _process(self, batches):
+        states = []
+        t_parts, mag_parts, new_mask_parts = [], [], []
+        frames = np.concatenate([f for _, f in batches])
+        new_mag = np.sqrt(np.einsum('ij,ij->i', frames[:, 1:], frames[:, 1:]))
+
+        # Lay out every vehicle as [carried tail, new frames] in one array
+        offset = 0
+        lengths, tail_lengths = [], []
+        for vehicle, batch in batches:
+            state = self._states.get(vehicle)
+            if state is None:
+                state = self._states[vehicle] = _VehicleState()
+            state.last_seen = time.monotonic()
+            states.append(state)
+            count = len(batch)
+            t_parts += [state.tail_t, batch[:, 0]]
+            mag_parts += [state.tail_mag, new_mag[offset:offset + count]]
+            new_mask_parts += [np.zeros(len(state.tail_t), dtype=bool), np.ones(count, dtype=bool)]
+            lengths.append(len(state.tail_t) + count)
+            tail_lengths.append(len(state.tail_t))
+            offset += count
+
+        t = np.concatenate(t_parts)
+        mag = np.concatenate(mag_parts)
+        is_new = np.concatenate(new_mask_parts)
+        lengths = np.asarray(lengths)
+        seg_begin = np.cumsum(lengths) - lengths
+        seg_start = np.repeat(seg_begin, lengths)
+        seg_end = seg_start + np.repeat(lengths, lengths)
+
+        # Moving average over up to `window` samples, never crossing vehicles
+        index = np.arange(len(mag))
+        csum = np.concatenate(([0.0], np.cumsum(mag)))
+        low = np.maximum(index - self.window + 1, seg_start)
+        smoothed = (csum[index + 1] - csum[low]) / (index - low + 1)
+
+        # Previous smoothed sample for jerk; the first new sample of each
+        # vehicle continues from the state carried over from its last batch
+        prev_smoothed = np.empty_like(smoothed)
+        prev_t = np.empty_like(t)
+        prev_smoothed[1:] = smoothed[:-1]
+        prev_t[1:] = t[:-1]
+        first_new = seg_begin + np.asarray(tail_lengths)
+        prev_smoothed[first_new] = [state.prev_smoothed for state in states]
+        prev_t[first_new] = [state.prev_t for state in states]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            jerk = np.abs(smoothed - prev_smoothed) / np.maximum(t - prev_t, 1e-3)
+        jerk = np.nan_to_num(jerk, nan=0.0, posinf=0.0)
+
+        candidates = np.flatnonzero(is_new & (smoothed > self.threshold) & (jerk >= self.jerk_threshold))
+
+        detections = []
+        if len(candidates):
+            segment_of = np.searchsorted(np.cumsum(lengths), candidates, side='right')
+            for position, segment in zip(candidates, segment_of):
+                state = states[segment]
+                if t[position] - state.last_fire < self.cooldown:
+                    continue
+                state.last_fire = t[position]
+                # Peak of this impact within the batch (until the cooldown ends)
+                end = seg_end[position]
+                span = np.flatnonzero(t[position:end] < t[position] + self.cooldown)
+                stop = position + (span[-1] + 1 if len(span) else 1)
+                detections.append(Detection(
+                    vehicle=batches[segment][0],
+                    timestamp=float(t[position]),
+                    magnitude=float(smoothed[position]),
+                    peak_magnitude=float(smoothed[position:stop].max()),
+                    jerk=float(jerk[position:stop].max())
+                ))
+
+        # Carry the last window-1 samples and smoothing state forward
+        keep = self.window - 1
+        for state, end, length in zip(states, np.cumsum(lengths), lengths):
+            start = max(end - keep, end - length)
+            state.tail_t = t[start:end].copy()
+            state.tail_mag = mag[start:end].copy()
+            state.prev_smoothed = smoothed[end - 1]
+            state.prev_t = t[end - 1]
+        return detections
+
+    def _expire(self):
+        now = time.monotonic()
+        if now - self._last_expiry < 60:
+            return
+        self._last_expiry = now
+        stale = [vehicle for vehicle, state in self._states.items() if now - state.last_seen > self.state_ttl]
+        for vehicle in stale:
+            del self._states[vehicle]
+
+
+def decode_frames(payload, content_type):
+    """Parse an uploaded batch into ``(frames, metadata)``.
+
+    ``application/octet-stream`` bodies are packed little-endian float64
+    rows of (t, ax, ay, az) with no metadata; anything else is JSON
+    ``{"frames": [[t, ax, ay, az], ...], ...}`` and the other keys are
+    returned as metadata.
+    """
+    _import_numpy()
+    if content_type and content_type.startswith('application/octet-stream'):
+        if len(payload) % (8 * FRAME_COLUMNS):
+            raise ValueError('Binary frame payload is not a whole number of frames')
+        return np.frombuffer(payload, dtype='<f8').reshape(-1, FRAME_COLUMNS), {}
+    body = json.loads(payload)
+    if not isinstance(body, dict):
+        raise ValueError('Expected a JSON object')
+    array = np.asarray(body.pop('frames', None) or [], dtype=np.float64)
+    if array.size and (array.ndim != 2 or array.shape[1] != FRAME_COLUMNS):
+        raise ValueError('Frames must be [t, ax, ay, az] rows')
+    return array.reshape(-1, FRAME_COLUMNS), body
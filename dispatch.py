@@ -0,0 +1,152 @@
+"""
+AutoRescue Dispatch Engine
+
+Keeps an in-memory grid index of available ambulance positions so the
+nearest units to an alert can be found without scanning the User table.
+"""
+
+import heapq
+import math
+import threading
+
+EARTH_RADIUS_M = 6371000.0
+METERS_PER_DEGREE = math.pi * EARTH_RADIUS_M / 180.0
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points in metres"""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+class SpatialIndex:
+    """Grid-bucket index of unit positions keyed by unit id.
+
+    Positions are bucketed into square cells of ``cell_size_deg`` degrees.
+    A k-nearest query searches rings of cells outward from the query cell
+    and stops as soon as no unvisited cell can hold a closer unit.
+    """
+
+    def __init__(self, cell_size_deg=0.05):
+        self.cell_size = float(cell_size_deg)
+        self._cells = {}      # (row, col) -> {unit_id: (lat, lon)}
+        self._positions = {}  # unit_id -> (lat, lon, (row, col))
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __contains__(self, unit_id):
+        return unit_id in self._positions
+
+    def _cell(self, latitude, longitude):
+        return (int(math.floor(latitude / self.cell_size)),
+                int(math.floor(longitude / self.cell_size)))
+
+    def update(self, unit_id, latitude, longitude):
+        """Insert or move a unit"""
+        cell = self._cell(latitude, longitude)
+        with self._lock:
+            previous = self._positions.get(unit_id)
+            if previous is not None and previous[2] != cell:
+                self._discard(unit_id, previous[2])
+            self._cells.setdefault(cell, {})[unit_id] = (latitude, longitude)
+            self._positions[unit_id] = (latitude, longitude, cell)
+
+    def remove(self, unit_id):
+        """Drop a unit from the index (no-op if it is not indexed)"""
+        with self._lock:
+            previous = self._positions.pop(unit_id, None)
+            if previous is not None:
+                self._discard(unit_id, previous[2])
+
+    def clear(self):
+        with self._lock:
+            self._cells.clear()
+            self._positions.clear()
+
+    def position(self, unit_id):
+        """Return the indexed (lat, lon) of a unit or None"""
+        entry = self._positions.get(unit_id)
+        return (entry[0], entry[1]) if entry else None
+
+    def _discard(self, unit_id, cell):
+        bucket = self._cells.get(cell)
+        if bucket is not None:
+            bucket.pop(unit_id, None)
+            if not bucket:
+                del self._cells[cell]
+
+    def _ring(self, row0, col0, ring):
+        if ring == 0:
+            yield (row0, col0)
+            return
+        for col in range(col0 - ring, col0 + ring + 1):
+            yield (row0 - ring, col)
+            yield (row0 + ring, col)
+        for row in range(row0 - ring + 1, row0 + ring):
+            yield (row, col0 - ring)
+            yield (row, col0 + ring)
+
+    def _ring_bound_m(self, latitude, ring):
+        # Lower bound on the distance to any unit outside rings 0..ring:
+        # such units are at least `ring` whole cells away on one axis.
+        # Longitude cells shrink towards the poles, so use the most poleward
+        # latitude those cells can reach, with a little slack for the
+        # parallel-vs-great-circle difference.
+        extreme_lat = min(89.0, abs(latitude) + (ring + 1) * self.cell_size)
+        return 0.99 * ring * self.cell_size * METERS_PER_DEGREE * math.cos(math.radians(extreme_lat))
+
+    def nearest(self, latitude, longitude, k=1, max_distance_m=None):
+        """Return up to ``k`` (unit_id, distance_m) pairs, closest first"""
+        if k <= 0:
+            return []
+        with self._lock:
+            if not self._positions:
+                return []
+            row0, col0 = self._cell(latitude, longitude)
+            best = []  # max-heap of (-distance, unit_id)
+            ring = 0
+            while True:
+                if 8 * ring > len(self._cells):
+                    # The ring is larger than the number of occupied cells;
+                    # finishing with a flat scan is cheaper than walking it.
+                    best = []
+                    for unit_id, (lat, lon, _) in self._positions.items():
+                        self._offer(best, k, unit_id, haversine_m(latitude, longitude, lat, lon))
+                    break
+                for cell in self._ring(row0, col0, ring):
+                    bucket = self._cells.get(cell)
+                    if not bucket:
+                        continue
+                    for unit_id, (lat, lon) in bucket.items():
+                        self._offer(best, k, unit_id, haversine_m(latitude, longitude, lat, lon))
+                bound = self._ring_bound_m(latitude, ring)
+                if len(best) == k and bound >= -best[0][0]:
+                    break
+                if max_distance_m is not None and bound > max_distance_m:
+                    break
+                ring += 1
+
+        results = sorted((-neg, unit_id) for neg, unit_id in best)
+        if max_distance_m is not None:
+            results = [r for r in results if r[0] <= max_distance_m]
+        return [(unit_id, distance) for distance, unit_id in results]
+
+    @staticmethod
+    def _offer(heap, k, unit_id, distance):
+        if len(heap) < k:
+            heapq.heappush(heap, (-distance, unit_id))
+        elif distance < -heap[0][0]:
+            heapq.heapreplace(heap, (-distance, unit_id))
+
+
+def rank_by_scan(units, latitude, longitude, k=1):
+    """Reference full-scan ranking over (unit_id, lat, lon) rows"""
+    ranked = sorted((haversine_m(latitude, longitude, lat, lon), unit_id)
+                    for unit_id, lat, lon in units)
+    return [(unit_id, distance) for distance, unit_id in ranked[:k]]
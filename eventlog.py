@@ -0,0 +1,262 @@
+"""
+AutoRescue Event Log
+
+Append-only record of every alert and location event, for audit, analytics
+and replaying real traffic through new dispatch logic
+(benchmarks/replay_events.py). The alert table only holds each alert's
+current state; the log keeps how it got there.
+
+The log is a directory of segments. ``<base offset>.log`` holds records
+written strictly sequentially; a new segment is started once the active one
+reaches ``segment_bytes``, so old segments can be archived or deleted as
+whole files. Every record has an offset, one more than the record before.
+``<base offset>.index`` is a sparse offset index: an (offset - base, file
+position) entry for the first record in every ``index_interval`` bytes, so a
+read from any offset seeks close to it and scans at most that many bytes.
+
+Record layout (little-endian): payload length, CRC-32 of the payload,
+offset, epoch seconds (float64), then the payload: compact JSON of
+``[event_type, data]``. A record torn by a crash fails its length or CRC
+check and is cut off when the segment is next opened for writing.
+
+Processes sharing a directory (gunicorn workers) append under an exclusive
+``flock``; each first catches up on what the others wrote since its own last
+append, so offsets stay sequential across the whole log.
+
+    python eventlog.py instance/events [start offset]
+
+prints the records as JSON lines.
+"""
+
+import bisect
+import collections
+import json
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single process writes the log
+    fcntl = None
+
+_RECORD = struct.Struct('<IIQd')  # payload length, payload CRC-32, offset, epoch seconds
+_INDEX = struct.Struct('<II')  # offset relative to the segment base, file position
+
+LogRecord = collections.namedtuple('LogRecord', 'offset timestamp type data')
+
+
+def _iter_records(fd, position, end, chunk=1 << 20):
+    """(position, offset, timestamp, payload) of the intact records of a segment from ``position`` to ``end``"""
+    buffer, at = b'', 0  # buffer[at] is the byte at ``position``
+    while position + _RECORD.size <= end:
+        if len(buffer) - at < _RECORD.size:
+            buffer, at = buffer[at:] + os.pread(fd, chunk, position + len(buffer) - at), 0
+            if len(buffer) < _RECORD.size:
+                return
+        length, crc, offset, timestamp = _RECORD.unpack_from(buffer, at)
+        size = _RECORD.size + length
+        if position + size > end:
+            return
+        if len(buffer) - at < size:
+            buffer, at = buffer[at:] + os.pread(fd, max(chunk, size), position + len(buffer) - at), 0
+            if len(buffer) < size:
+                return
+        payload = buffer[at + _RECORD.size:at + size]
+        if zlib.crc32(payload) != crc:
+            return
+        yield position, offset, timestamp, payload
+        position += size
+        at += size
+
+
+class EventLog:
+    """Segmented append-only log of (event_type, data) records"""
+
+    def __init__(self, directory, segment_bytes=64 * 1024 * 1024, index_interval=4096, fsync=False):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.index_interval = index_interval
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._pid = None
+        self._lock_fd = None
+        self._log_fd = None
+        self._index_fd = None
+        self._base = 0             # Base offset of the active segment
+        self._size = 0             # Bytes of the active segment accounted for
+        self._last_position = None  # Position of its last record
+        self._next = 0             # Offset of the next record
+
+    def _path(self, base, suffix):
+        return os.path.join(self.directory, f'{base:020d}{suffix}')
+
+    def segments(self):
+        """Base offsets of the segments on disk, oldest first"""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []  # Nothing appended yet
+        return sorted(int(name[:-4]) for name in names if name.endswith('.log') and name[:-4].isdigit())
+
+    def append(self, event_type, data):
+        """Append one event; returns its offset"""
+        return self.append_many([(event_type, data)])
+
+    def append_many(self, events, timestamp=None):
+        """Append (event_type, data) pairs with a single write; returns the first offset, or None.
+
+        Records are stamped with ``timestamp`` (epoch seconds, default now).
+        """
+        payloads = [json.dumps([event_type, data], separators=(',', ':'), default=str).encode()
+                    for event_type, data in events]
+        if not payloads:
+            return None
+        timestamp = time.time() if timestamp is None else timestamp
+        with self._lock:
+            self._lock_segments()
+            try:
+                self._catch_up()
+                if self._size >= self.segment_bytes:
+                    self._open_segment(self._next)
+                first = offset = self._next
+                position, last = self._size, self._last_position
+                records, entries = [], []
+                for payload in payloads:
+                    if last is not None and position // self.index_interval != last // self.index_interval:
+                        entries.append(_INDEX.pack(offset - self._base, position))
+                    records.append(_RECORD.pack(len(payload), zlib.crc32(payload), offset, timestamp))
+                    records.append(payload)
+                    last, position, offset = position, position + _RECORD.size + len(payload), offset + 1
+                _write_all(self._log_fd, b''.join(records))
+                if entries:
+                    _write_all(self._index_fd, b''.join(entries))
+                if self.fsync:
+                    os.fsync(self._log_fd)
+                self._size, self._last_position, self._next = position, last, offset
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+        return first
+
+    def read(self, start=0, end=None):
+        """Yield LogRecords from offset ``start`` up to (not including) ``end``, oldest first"""
+        segments = self.segments()
+        for base in segments[max(bisect.bisect_right(segments, start) - 1, 0):]:
+            if end is not None and base >= end:
+                return
+            try:
+                f = open(self._path(base, '.log'), 'rb')
+            except FileNotFoundError:
+                continue  # Removed (archived) after listing
+            with f:
+                fd = f.fileno()
+                position = self._seek(base, start) if start > base else 0
+                for _, offset, timestamp, payload in _iter_records(fd, position, os.fstat(fd).st_size):
+                    if offset < start:
+                        continue
+                    if end is not None and offset >= end:
+                        return
+                    event_type, data = json.loads(payload)
+                    yield LogRecord(offset, timestamp, event_type, data)
+
+    def close(self):
+        with self._lock:
+            self._close_segment()
+            if self._lock_fd is not None:
+                os.close(self._lock_fd)
+                self._lock_fd = None
+
+    def _seek(self, base, offset):
+        """File position at or before ``offset`` in the segment starting at ``base``"""
+        try:
+            with open(self._path(base, '.index'), 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return 0
+        entries = list(_INDEX.iter_unpack(data[:len(data) - len(data) % _INDEX.size]))
+        i = bisect.bisect_right(entries, (offset - base, float('inf')))
+        return entries[i - 1][1] if i else 0
+
+    def _lock_segments(self):
+        if self._pid != os.getpid():
+            # Descriptors inherited from a preloading parent would share its flock
+            # (and file positions) with every sibling worker: start afresh
+            for fd in (self._lock_fd, self._log_fd, self._index_fd):
+                if fd is not None:
+                    os.close(fd)
+            self._lock_fd = self._log_fd = self._index_fd = None
+            self._pid = os.getpid()
+        if self._lock_fd is None:
+            # Created on the first append, so opening a log never writes to disk
+            os.makedirs(self.directory, exist_ok=True)
+            self._lock_fd = os.open(os.path.join(self.directory, 'lock'), os.O_RDWR | os.O_CREAT, 0o644)
+        if fcntl is not None:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+
+    def _catch_up(self):
+        """Account for records and segments other processes added since this one last wrote"""
+        if self._log_fd is None:
+            segments = self.segments()
+            self._open_segment(segments[-1] if segments else 0)
+            return
+        size = os.fstat(self._log_fd).st_size
+        if size >= self.segment_bytes:
+            # Only a full segment is ever rolled over
+            newest = self.segments()[-1]
+            if newest != self._base:
+                self._open_segment(newest)
+                return
+        if size != self._size:
+            self._advance(size)
+
+    def _open_segment(self, base):
+        """Make ``base`` the active segment (creating it), resuming from its last index entry"""
+        self._close_segment()
+        flags = os.O_RDWR | os.O_CREAT | os.O_APPEND
+        self._log_fd = os.open(self._path(base, '.log'), flags, 0o644)
+        self._index_fd = os.open(self._path(base, '.index'), flags, 0o644)
+        self._base = base
+        data = os.pread(self._index_fd, os.fstat(self._index_fd).st_size, 0)
+        usable = len(data) - len(data) % _INDEX.size
+        relative, position = _INDEX.unpack_from(data, usable - _INDEX.size) if usable else (0, 0)
+        self._size, self._last_position, self._next = position, None, base + relative
+        self._advance(os.fstat(self._log_fd).st_size)
+
+    def _advance(self, size):
+        """Scan the active segment from what is accounted for to ``size``, cutting off a torn tail"""
+        end = self._size
+        for position, offset, _, payload in _iter_records(self._log_fd, self._size, size):
+            self._last_position, self._next = position, offset + 1
+            end = position + _RECORD.size + len(payload)
+        if end < size:
+            # A writer died mid-record (appends hold the lock, so nobody is writing now)
+            os.ftruncate(self._log_fd, end)
+            data = os.pread(self._index_fd, os.fstat(self._index_fd).st_size, 0)
+            kept = [entry for entry in _INDEX.iter_unpack(data[:len(data) - len(data) % _INDEX.size])
+                    if entry[1] < end]
+            os.ftruncate(self._index_fd, len(kept) * _INDEX.size)
+        self._size = end
+
+    def _close_segment(self):
+        for fd in (self._log_fd, self._index_fd):
+            if fd is not None:
+                os.close(fd)
+        self._log_fd = self._index_fd = None
+
+
+def _write_all(fd, data):
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+
+if __name__ == '__main__':
+    if len(sys.argv) not in (2, 3):
+        sys.exit('Usage: python eventlog.py LOG_DIR [start offset]')
+    log = EventLog(sys.argv[1])
+    for record in log.read(int(sys.argv[2]) if len(sys.argv) == 3 else 0):
+        print(json.dumps(record._asdict(), separators=(',', ':')))
@@ -0,0 +1,153 @@
+"""
+AutoRescue Event Hub
+
+In-process publish/subscribe for alert change events. Events are kept in a
+bounded ring buffer with a monotonically increasing sequence number, so a
+subscriber is nothing more than the last sequence number it has seen: there
+is no per-client queue and no per-client thread on the publishing side.
+Threaded streams block in ``wait``; an event loop registers a listener
+instead and is called back (from the publishing thread) on every publish.
+
+Events may be published to channels (e.g. the regions an alert is in and
+the users it concerns). A subscriber that names its channels is only woken
+by, and only reads, events on those channels and events published to
+everyone; subscribers without channels see everything.
+"""
+
+import collections
+import itertools
+import json
+import os
+import threading
+
+
+class EventHub:
+    """Fan-out of change events to any number of stream subscribers"""
+
+    def __init__(self, history=1024):
+        # Sequence numbers only mean something to the hub that issued them; ids
+        # sent to clients carry this so a stream resumed on another process
+        # (or after a restart) is recognised
+        self.instance = os.urandom(4).hex()
+        self._events = collections.deque(maxlen=history)
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._listeners = []
+        self._closed = False
+        # Channel -> waiting subscribers' wake-up events
+        self._waiters = {}
+        # Newest evicted sequence number per channel (None: published to everyone),
+        # so a subscriber only resyncs when it actually missed one of its events
+        self._evicted = {}
+
+    @property
+    def last_seq(self):
+        return self._seq
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def close(self):
+        """Wake every subscriber for good so open streams end (on shutdown)"""
+        with self._cond:
+            self._closed = True
+            self._wake(None)
+        self._notify(None)
+
+    def add_listener(self, callback):
+        """Call ``callback(channels)`` after every publish; it must not block"""
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        self._listeners.remove(callback)
+
+    def publish(self, event_type, data, channels=None):
+        """Append an event and wake the subscribers of its channels (everyone without channels)"""
+        return self.publish_many([(event_type, data, channels)])
+
+    def publish_many(self, events):
+        """Append several (event_type, data[, channels]) events with a single wake-up"""
+        woken = set()
+        with self._cond:
+            for event_type, data, *channels in events:
+                channels = frozenset(channels[0]) if channels and channels[0] is not None else None
+                self._append(event_type, data, channels)
+                woken = None if woken is None or channels is None else woken | channels
+            self._wake(woken)
+            seq = self._seq
+        self._notify(woken)
+        return seq
+
+    def _append(self, event_type, data, channels):
+        if len(self._events) == self._events.maxlen:
+            evicted_seq, _, _, evicted_channels = self._events[0]
+            for channel in evicted_channels if evicted_channels is not None else (None,):
+                self._evicted[channel] = evicted_seq
+        self._seq += 1
+        self._events.append((self._seq, event_type, data, channels))
+
+    def _wake(self, channels):
+        # Subscribers without channels wait on the condition itself
+        self._cond.notify_all()
+        if channels is None:
+            waiters = set().union(*self._waiters.values())
+        else:
+            waiters = set().union(*(self._waiters.get(channel, ()) for channel in channels))
+        for waiter in waiters:
+            waiter.set()
+
+    def _notify(self, channels):
+        for callback in list(self._listeners):
+            callback(channels)
+
+    def since(self, seq, channels=None):
+        """Return (events, complete) for everything published after ``seq``.
+
+        ``complete`` is False when older events have already been evicted
+        from the ring buffer and the subscriber has to resync from the API.
+        """
+        with self._cond:
+            return self._since(seq, frozenset(channels) if channels is not None else None)
+
+    def wait(self, seq, timeout=None, channels=None):
+        """Block until something newer than ``seq`` exists (on ``channels``) or timeout"""
+        if channels is None:
+            with self._cond:
+                self._cond.wait_for(lambda: self._seq > seq or self._closed, timeout)
+                return self._since(seq, None)
+        channels = frozenset(channels)
+        with self._cond:
+            events, complete = self._since(seq, channels)
+            if events or not complete or self._closed:
+                return events, complete
+            waiter = threading.Event()
+            for channel in channels:
+                self._waiters.setdefault(channel, set()).add(waiter)
+        waiter.wait(timeout)
+        with self._cond:
+            for channel in channels:
+                waiting = self._waiters.get(channel)
+                waiting.discard(waiter)
+                if not waiting:
+                    del self._waiters[channel]
+            return self._since(seq, channels)
+
+    def _since(self, seq, channels):
+        if seq >= self._seq:
+            return [], True
+        first = self._events[0][0]
+        # Sequence numbers are contiguous, so the offset into the buffer
+        # is known without scanning it
+        start = max(seq + 1 - first, 0)
+        entries = itertools.islice(self._events, start, None)
+        if channels is None:
+            return [entry[:3] for entry in entries], first <= seq + 1
+        events = [entry[:3] for entry in entries if entry[3] is None or not entry[3].isdisjoint(channels)]
+        missed = max((self._evicted.get(channel, 0) for channel in (None, *channels)), default=0)
+        return events, missed <= seq
+
+
+def format_sse(event_id, event_type, data):
+    """Encode one Server-Sent Events frame"""
+    return f"id: {event_id}\nevent: {event_type}\ndata: {json.dumps(data)}\n\n"
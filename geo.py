@@ -0,0 +1,100 @@
+"""
+AutoRescue Geo Queries
+
+Nearest-ambulance and bounding-box lookups run against the database. On
+PostgreSQL with the PostGIS extension they become spatial SQL served by GiST
+indexes on ``geography(longitude, latitude)`` expressions; everywhere else
+(SQLite, PostgreSQL without PostGIS) a latitude/longitude range narrows the
+rows in SQL and distances are computed in Python with the same haversine
+formula the dispatch index uses.
+"""
+
+import math
+
+from sqlalchemy import and_, func, or_, text
+
+from dispatch import METERS_PER_DEGREE, rank_by_scan
+
+_postgis = {}  # engine url -> whether the postgis extension is installed
+
+
+def has_postgis(engine):
+    """True if ``engine`` is PostgreSQL with PostGIS installed (checked once per engine)"""
+    if engine.dialect.name != 'postgresql':
+        return False
+    key = str(engine.url)
+    if key not in _postgis:
+        with engine.connect() as conn:
+            _postgis[key] = conn.execute(
+                text("SELECT 1 FROM pg_extension WHERE extname = 'postgis'")
+            ).first() is not None
+    return _postgis[key]
+
+
+def geography(latitude, longitude):
+    """PostGIS geography point; written exactly like the indexed expressions in migrations"""
+    return func.geography(func.ST_SetSRID(func.ST_MakePoint(longitude, latitude), 4326))
+
+
+def bounding_box(latitude, longitude, radius_m):
+    """(min_lat, min_lon, max_lat, max_lon) enclosing a circle; min_lon > max_lon crosses 180°"""
+    dlat = radius_m / METERS_PER_DEGREE
+    min_lat = max(latitude - dlat, -90.0)
+    max_lat = min(latitude + dlat, 90.0)
+    # Longitude degrees are shortest at the edge nearest a pole
+    cos_edge = math.cos(math.radians(max(abs(min_lat), abs(max_lat))))
+    if cos_edge < 1e-9 or dlat / cos_edge >= 180.0:
+        return min_lat, -180.0, max_lat, 180.0
+    dlon = dlat / cos_edge
+    wrap = lambda value: (value + 180.0) % 360.0 - 180.0
+    return min_lat, wrap(longitude - dlon), max_lat, wrap(longitude + dlon)
+
+
+def within_bbox(lat_column, lon_column, min_lat, min_lon, max_lat, max_lon, spatial=False):
+    """Filter clause for rows inside a box (handles boxes crossing the antimeridian)"""
+    crosses = min_lon > max_lon
+    clause = and_(
+        lat_column.between(min_lat, max_lat),
+        or_(lon_column >= min_lon, lon_column <= max_lon) if crosses else lon_column.between(min_lon, max_lon)
+    )
+    if spatial and not crosses:
+        # && lets PostgreSQL use the GiST index; the range keeps edges exact
+        envelope = func.geography(func.ST_MakeEnvelope(min_lon, min_lat, max_lon, max_lat, 4326))
+        clause = and_(geography(lat_column, lon_column).op('&&')(envelope), clause)
+    return clause
+
+
+def nearest(session, query, lat_column, lon_column, latitude, longitude, k=1, max_distance_m=None, spatial=False):
+    """The ``k`` rows of ``query`` (selecting id, lat, lon) nearest a point as (id, distance_m)"""
+    if spatial:
+        here = geography(latitude, longitude)
+        there = geography(lat_column, lon_column)
+        query = query.add_columns(func.ST_Distance(there, here))
+        if max_distance_m is not None:
+            query = query.where(func.ST_DWithin(there, here, max_distance_m))
+        # <-> is the index-assisted KNN distance operator
+        rows = session.execute(query.order_by(there.op('<->')(here)).limit(k)).all()
+        return [(row[0], float(row[-1])) for row in rows]
+
+    if max_distance_m is not None:
+        query = query.where(within_bbox(lat_column, lon_column, *bounding_box(latitude, longitude, max_distance_m)))
+    ranked = rank_by_scan(session.execute(query).all(), latitude, longitude, k)
+    if max_distance_m is not None:
+        ranked = [(row_id, distance) for row_id, distance in ranked if distance <= max_distance_m]
+    return ranked
+
+
+def create_spatial_indexes(conn):
+    """GiST indexes for the spatial queries (no-op without PostGIS)"""
+    if conn.dialect.name != 'postgresql':
+        return
+    if conn.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'postgis'")).first() is None:
+        return
+    conn.execute(text(
+        'CREATE INDEX IF NOT EXISTS ix_alert_geography ON alert USING GIST '
+        '(geography(ST_SetSRID(ST_MakePoint(longitude, latitude), 4326)))'
+    ))
+    conn.execute(text(
+        'CREATE INDEX IF NOT EXISTS ix_user_geography ON "user" USING GIST '
+        '(geography(ST_SetSRID(ST_MakePoint(current_longitude, current_latitude), 4326)))'
+    ))
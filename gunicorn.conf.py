@@ -0,0 +1,73 @@
+"""
+AutoRescue gunicorn settings
+
+Read automatically by ``gunicorn app:app`` run from the project root, and
+used by ``python run.py --production``. Every value can be overridden on the
+command line or through the environment variables below.
+
+- One worker by default (``WEB_CONCURRENCY``): the live event hub is per
+  process, so a second worker would only see its own writes. Raise it only
+  behind a message broker or with dashboards relying on their slow sync.
+- The worker is cooperative (gevent) when gevent is installed, so every open
+  event stream is a parked greenlet. Otherwise it falls back to ``gthread``
+  with ``GUNICORN_THREADS`` request threads, each open stream holding one of
+  them for up to ``EVENT_STREAM_MAX_AGE`` seconds. ``GUNICORN_WORKER_CLASS``
+  overrides the choice.
+- The app is imported once in the master and forked (``preload_app``), and
+  the schema migration and default accounts run there once before any
+  worker starts, instead of in every worker.
+- SIGTERM drains: workers stop accepting, finish in-flight requests (up to
+  ``GRACEFUL_TIMEOUT`` seconds), end their live event streams so browsers
+  reconnect elsewhere, and flush buffered ambulance positions. SIGHUP
+  replaces the workers the same way; with a preloaded app, code changes need
+  a full restart.
+"""
+
+import importlib.util
+import os
+import signal
+import threading
+
+bind = os.environ.get('BIND') or f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))  # one event hub per process
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS') or (
+    'gevent' if importlib.util.find_spec('gevent') else 'gthread')
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 2000))  # gevent: open streams per worker
+threads = int(os.environ.get('GUNICORN_THREADS', 16))  # gthread: each open stream holds one
+preload_app = True
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))  # seconds before a silent worker is restarted
+graceful_timeout = int(os.environ.get('GRACEFUL_TIMEOUT', 30))  # seconds in-flight requests get on SIGTERM
+keepalive = 5
+accesslog = os.environ.get('ACCESS_LOG', '-') or None
+
+
+def on_starting(server):
+    """Migrate and seed once, in the master, before workers are forked"""
+    from app import prepare_database
+    prepare_database()
+
+
+def post_fork(server, worker):
+    # Connections opened in the master must not be shared with the children
+    from app import app, db
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+
+def post_worker_init(worker):
+    """Also end live event streams on SIGTERM, so they do not hold the worker until graceful_timeout"""
+    from app import event_hub
+    handle_exit = worker.handle_exit
+
+    def drain(sig, frame):
+        handle_exit(sig, frame)
+        # Not from the signal handler itself: it may interrupt a thread holding the hub's lock
+        threading.Thread(target=event_hub.close, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, drain)
+
+
+def worker_exit(server, worker):
+    # Write out positions still buffered for the next bulk flush
+    from app import location_flusher
+    location_flusher.stop()
@@ -0,0 +1,254 @@
+"""
+AutoRescue Batch Ingestion
+
+Parsing and validation for ``POST /api/ingest``, where fleet gateways upload
+alerts and ambulance positions for many vehicles at once. Bodies are a JSON
+object ``{"alerts": [...], "locations": [...]}`` or NDJSON with one item per
+line tagged ``"type": "alert"`` / ``"type": "location"``; NDJSON is parsed
+line by line as it arrives.
+
+Items are coerced field by field into columns, then range checks run over
+whole columns at once (with NumPy when it is installed), so a batch costs a
+few list appends per item rather than a model object per row.
+"""
+
+import json
+import math
+import time
+from datetime import datetime, timezone
+
+_np = None  # numpy once _numpy() has imported it, False if it is not installed
+
+ALERT_TYPES = ('Accident', 'Manual SOS')
+MAX_DETAILS = 1000
+EARLIEST_TIMESTAMP = 946684800.0  # 2000-01-01T00:00:00Z; anything older is an unset device clock
+MAX_FUTURE = 86400.0  # seconds ahead beyond which a time is garbage rather than clock skew
+
+
+class BatchError(ValueError):
+    """The body as a whole could not be read"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_timestamp(value, now=None):
+    """Epoch seconds from epoch milliseconds or ISO-8601 (UTC without an offset), capped at now.
+
+    A device clock running ahead is capped at now; non-finite values, times
+    before 2000 and times more than ``MAX_FUTURE`` seconds ahead raise
+    ValueError.
+    """
+    now = time.time() if now is None else now
+    if value is None:
+        return now
+    if isinstance(value, bool):
+        raise ValueError('Invalid timestamp')
+    if isinstance(value, (int, float)):
+        try:
+            seconds = value / 1000.0
+        except OverflowError:
+            raise ValueError('Invalid timestamp') from None
+    else:
+        parsed = datetime.fromisoformat(value)
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        seconds = parsed.timestamp()
+    if not (math.isfinite(seconds) and EARLIEST_TIMESTAMP <= seconds <= now + MAX_FUTURE):
+        raise ValueError('Invalid timestamp')
+    return min(seconds, now)
+
+
+def iter_ndjson(chunks):
+    """(line_number, object) pairs from an iterable of byte chunks"""
+    buffer = b''
+    number = 0
+    for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b'\n')
+        for line in lines:
+            if line.strip():
+                yield number, _loads(line, number)
+            number += 1
+    if buffer.strip():
+        yield number, _loads(buffer, number)
+
+
+def _loads(line, number):
+    try:
+        return json.loads(line)
+    except ValueError:
+        return _Malformed(f'Line {number + 1} is not valid JSON')
+
+
+class _Malformed:
+    __slots__ = ('error',)
+
+    def __init__(self, error):
+        self.error = error
+
+
+def split_items(items, max_items):
+    """Route (index, item) pairs to alerts and locations; returns (alerts, locations, errors)"""
+    alerts, locations, errors = [], [], []
+    for count, (index, item) in enumerate(items, 1):
+        if count > max_items:
+            raise BatchError(f'At most {max_items} items per request', 413)
+        if isinstance(item, _Malformed):
+            errors.append((index, 'unknown', item.error))
+        elif not isinstance(item, dict):
+            errors.append((index, 'unknown', 'Item must be an object'))
+        elif item.get('type') == 'alert':
+            alerts.append((index, item))
+        elif item.get('type') == 'location':
+            locations.append((index, item))
+        else:
+            errors.append((index, 'unknown', 'Item type must be "alert" or "location"'))
+    return alerts, locations, errors
+
+
+def json_items(payload):
+    """(index, item) pairs from a JSON body; alerts are numbered before locations"""
+    try:
+        body = json.loads(payload)
+    except ValueError:
+        raise BatchError('Body is not valid JSON')
+    if isinstance(body, list):
+        return list(enumerate(body))
+    if not isinstance(body, dict):
+        raise BatchError('Body must be an object or an array')
+    items = []
+    for kind in ('alerts', 'locations'):
+        entries = body.get(kind) or []
+        if not isinstance(entries, list):
+            raise BatchError(f'"{kind}" must be an array')
+        for entry in entries:
+            if isinstance(entry, dict) and 'type' not in entry:
+                entry = dict(entry, type=kind[:-1])
+            items.append(entry)
+    return list(enumerate(items))
+
+
+def _numpy():
+    """numpy, imported on first use (a batch endpoint is not on every cold start), or None"""
+    global _np
+    if _np is None:
+        try:
+            import numpy
+        except ImportError:
+            numpy = False
+        _np = numpy
+    return _np or None
+
+
+def _number(value):
+    """Float of a JSON number; NaN for missing or non-numeric values"""
+    if value is None or isinstance(value, bool) or not isinstance(value, (int, float)):
+        return math.nan
+    return float(value)
+
+
+def valid_positions(latitudes, longitudes):
+    """Per-row validity of coordinate columns (NaN and infinities fail every comparison)"""
+    np = _numpy()
+    if np is not None:
+        lat = np.asarray(latitudes, dtype=float)
+        lon = np.asarray(longitudes, dtype=float)
+        return ((np.abs(lat) <= 90.0) & (np.abs(lon) <= 180.0)).tolist()
+    return [abs(lat) <= 90.0 and abs(lon) <= 180.0 for lat, lon in zip(latitudes, longitudes)]
+
+
+def valid_magnitudes(values):
+    """Per-row validity of optional non-negative magnitudes (NaN means not given)"""
+    np = _numpy()
+    if np is not None:
+        array = np.asarray(values, dtype=float)
+        return (np.isnan(array) | (np.isfinite(array) & (array >= 0.0))).tolist()
+    return [math.isnan(value) or (math.isfinite(value) and value >= 0.0) for value in values]
+
+
+def parse_alerts(items, now=None):
+    """Columns of the valid alerts among (index, item) pairs, plus (index, kind, error) rejects"""
+    now = time.time() if now is None else now
+    columns = {name: [] for name in
+               ('index', 'alert_type', 'latitude', 'longitude', 'impact', 'details', 'user_id', 'reporter',
+                'reported_at')}
+    errors = []
+    for index, item in items:
+        alert_type = item.get('alert_type', 'Accident')
+        if alert_type not in ALERT_TYPES:
+            errors.append((index, 'alert', f'alert_type must be one of {", ".join(ALERT_TYPES)}'))
+            continue
+        impact = item.get('impact_magnitude')
+        if impact is not None and math.isnan(_number(impact)):
+            errors.append((index, 'alert', 'impact_magnitude must be a number'))
+            continue
+        user_id = item.get('user_id')
+        if user_id is not None and (isinstance(user_id, bool) or not isinstance(user_id, int)):
+            errors.append((index, 'alert', 'user_id must be an integer'))
+            continue
+        details = item.get('details') or ''
+        if not isinstance(details, str):
+            errors.append((index, 'alert', 'details must be a string'))
+            continue
+        vehicle = item.get('vehicle_id')
+        try:
+            reported_at = parse_timestamp(item.get('timestamp'), now)
+        except (TypeError, ValueError):
+            errors.append((index, 'alert', 'Invalid timestamp'))
+            continue
+        columns['index'].append(index)
+        columns['alert_type'].append(alert_type)
+        columns['latitude'].append(_number(item.get('latitude')))
+        columns['longitude'].append(_number(item.get('longitude')))
+        columns['impact'].append(_number(impact))
+        columns['details'].append(details[:MAX_DETAILS])
+        columns['user_id'].append(user_id)
+        # Distinct reporters raise an incident's reporter_count
+        columns['reporter'].append(user_id if user_id is not None else (f'vehicle:{vehicle}' if vehicle else None))
+        columns['reported_at'].append(reported_at)
+
+    keep = [position and magnitude for position, magnitude in zip(
+        valid_positions(columns['latitude'], columns['longitude']), valid_magnitudes(columns['impact'])
+    )]
+    for row, ok in enumerate(keep):
+        if not ok:
+            errors.append((columns['index'][row], 'alert', 'latitude/longitude out of range or impact_magnitude negative'))
+    return select_rows(columns, keep), errors
+
+
+def parse_locations(items, now=None):
+    """Columns of the valid location fixes among (index, item) pairs, plus rejects"""
+    now = time.time() if now is None else now
+    columns = {name: [] for name in ('index', 'driver', 'latitude', 'longitude', 'recorded_at')}
+    errors = []
+    for index, item in items:
+        # Ambulances are named by their driver_id string or their user id
+        driver = item.get('driver_id', item.get('user_id'))
+        if driver is None or isinstance(driver, bool) or not isinstance(driver, (str, int)):
+            errors.append((index, 'location', 'driver_id or user_id is required'))
+            continue
+        try:
+            recorded_at = parse_timestamp(item.get('timestamp'), now)
+        except (TypeError, ValueError):
+            errors.append((index, 'location', 'Invalid timestamp'))
+            continue
+        columns['index'].append(index)
+        columns['driver'].append(driver)
+        columns['latitude'].append(_number(item.get('latitude')))
+        columns['longitude'].append(_number(item.get('longitude')))
+        columns['recorded_at'].append(recorded_at)
+
+    keep = valid_positions(columns['latitude'], columns['longitude'])
+    for row, ok in enumerate(keep):
+        if not ok:
+            errors.append((columns['index'][row], 'location', 'latitude/longitude out of range'))
+    return select_rows(columns, keep), errors
+
+
+def select_rows(columns, keep):
+    """Columns reduced to the rows whose ``keep`` flag is true"""
+    if all(keep):
+        return columns
+    return {name: [value for value, ok in zip(values, keep) if ok] for name, values in columns.items()}
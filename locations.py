@@ -0,0 +1,126 @@
+"""
+AutoRescue Location Ingestion
+
+GPS pings from ambulance drivers only ever need the latest position, so they
+are coalesced in memory per driver and written to the database in periodic
+bulk UPDATEs instead of one commit per ping. Readers (dispatch, the admin
+map) take positions from the buffer, which is always at least as fresh as
+the database.
+"""
+
+import logging
+import threading
+import time
+
+
+class LocationBuffer:
+    """Latest known position and availability per driver, with dirty tracking"""
+
+    def __init__(self):
+        self._positions = {}     # user_id -> (lat, lon, recorded_at)
+        self._availability = {}  # user_id -> bool
+        self._dirty = set()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._positions)
+
+    @property
+    def pending(self):
+        return len(self._dirty)
+
+    def record(self, user_id, latitude, longitude, recorded_at=None):
+        """Store a ping; older out-of-order pings are ignored. Returns True if kept."""
+        recorded_at = time.time() if recorded_at is None else recorded_at
+        with self._lock:
+            current = self._positions.get(user_id)
+            if current is not None and current[2] > recorded_at:
+                return False
+            self._positions[user_id] = (latitude, longitude, recorded_at)
+            self._dirty.add(user_id)
+            return True
+
+    def seed(self, user_id, latitude, longitude):
+        """Load a position read from the database (not marked dirty)"""
+        with self._lock:
+            if user_id not in self._positions:
+                self._positions[user_id] = (latitude, longitude, 0.0)
+
+    def position(self, user_id):
+        """Return (lat, lon) for a driver or None"""
+        entry = self._positions.get(user_id)
+        return (entry[0], entry[1]) if entry else None
+
+    def positions(self):
+        """Snapshot of {user_id: (lat, lon, recorded_at)}"""
+        with self._lock:
+            return dict(self._positions)
+
+    def is_available(self, user_id):
+        """Cached availability, or None when this process has not seen the driver"""
+        return self._availability.get(user_id)
+
+    def set_available(self, user_id, available):
+        self._availability[user_id] = bool(available)
+
+    def drain(self):
+        """Take every position changed since the last drain"""
+        with self._lock:
+            drained = {user_id: self._positions[user_id] for user_id in self._dirty}
+            self._dirty.clear()
+            return drained
+
+    def restore(self, drained):
+        """Put back a drained batch whose write failed, unless newer pings arrived"""
+        with self._lock:
+            for user_id, entry in drained.items():
+                if self._positions.get(user_id) == entry:
+                    self._dirty.add(user_id)
+
+
+class PeriodicFlusher:
+    """Background thread calling ``flush`` every ``interval`` seconds or when woken.
+
+    A failing flush is logged with its traceback to ``logger`` and retried
+    on the next round.
+    """
+
+    def __init__(self, interval, flush, name='location-flusher', logger=None):
+        self.interval = interval
+        self.name = name
+        self.logger = logger or logging.getLogger(__name__)
+        self._flush = flush
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        # Started lazily from the first request so it lives in the worker
+        # process, not in a parent that forks workers
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 5)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self._flush()
+            except Exception:
+                self.logger.exception('%s failed', self.name)
+            if self._stopped.is_set():
+                return
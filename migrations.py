@@ -0,0 +1,227 @@
+"""
+AutoRescue Schema Migrations
+
+Ordered, idempotent schema steps tracked in a ``schema_version`` table so
+existing databases (including old ``instance/autorescue.db`` files) can be
+brought up to date in place instead of relying on ``db.create_all()``,
+which never alters tables that already exist.
+
+Add new steps to the end of ``MIGRATIONS``; never renumber applied ones.
+"""
+
+from datetime import datetime
+
+from sqlalchemy import bindparam, inspect, select, text, update
+
+import geo
+import regions
+import stats
+
+
+def _quote(conn, name):
+    return conn.dialect.identifier_preparer.quote(name)
+
+
+def _columns(conn, table):
+    return {column['name'] for column in inspect(conn).get_columns(table)}
+
+
+def _indexes(conn, table):
+    return {index['name'] for index in inspect(conn).get_indexes(table)}
+
+
+def add_column(conn, table, name, type_sql):
+    """ALTER TABLE ... ADD COLUMN unless the column already exists"""
+    if name in _columns(conn, table):
+        return False
+    conn.execute(text(f"ALTER TABLE {_quote(conn, table)} ADD COLUMN {_quote(conn, name)} {type_sql}"))
+    return True
+
+
+def create_index(conn, table, name, columns, unique=False):
+    """CREATE INDEX unless an index with this name already exists"""
+    if name not in _indexes(conn, table):
+        column_sql = ', '.join(_quote(conn, column) for column in columns)
+        conn.execute(text(
+            f"CREATE {'UNIQUE ' if unique else ''}INDEX {_quote(conn, name)} "
+            f"ON {_quote(conn, table)} ({column_sql})"
+        ))
+
+
+def drop_index(conn, table, name):
+    if name in _indexes(conn, table):
+        conn.execute(text(f"DROP INDEX {_quote(conn, name)}"))
+
+
+# Migration steps: each receives an open connection and the model metadata
+
+def create_base_tables(conn, metadata):
+    # Fresh databases get the full current schema here; later steps then
+    # find everything already in place and do nothing.
+    metadata.create_all(conn)
+
+
+def add_driver_columns(conn, metadata):
+    add_column(conn, 'user', 'is_ambulance_driver', 'BOOLEAN DEFAULT FALSE')
+    if add_column(conn, 'user', 'driver_id', 'VARCHAR(50)'):
+        # SQLite cannot add a UNIQUE column, so enforce it with an index
+        create_index(conn, 'user', 'uq_user_driver_id', ['driver_id'], unique=True)
+    add_column(conn, 'user', 'current_latitude', 'FLOAT')
+    add_column(conn, 'user', 'current_longitude', 'FLOAT')
+    add_column(conn, 'user', 'is_available', 'BOOLEAN DEFAULT TRUE')
+
+
+def add_alert_tracking_columns(conn, metadata):
+    add_column(conn, 'alert', 'assigned_ambulance_id', f"INTEGER REFERENCES {_quote(conn, 'user')} (id)")
+    add_column(conn, 'alert', 'accepted_at', 'TIMESTAMP')
+    add_column(conn, 'alert', 'resolved_at', 'TIMESTAMP')
+    add_column(conn, 'alert', 'updated_at', 'TIMESTAMP')
+    create_index(conn, 'alert', 'ix_alert_updated_at', ['updated_at'])
+
+
+HOT_QUERY_INDEXES = [
+    ('alert', 'ix_alert_status_timestamp', ['status', 'timestamp']),
+    ('alert', 'ix_alert_assigned_timestamp', ['assigned_ambulance_id', 'timestamp']),
+    ('alert', 'ix_alert_user_timestamp', ['user_id', 'timestamp']),
+    ('alert', 'ix_alert_timestamp_id', ['timestamp', 'id']),
+    ('user', 'ix_user_driver_available', ['is_ambulance_driver', 'is_available']),
+]
+
+
+def add_hot_query_indexes(conn, metadata):
+    for table, name, columns in HOT_QUERY_INDEXES:
+        create_index(conn, table, name, columns)
+
+
+def add_alert_reporter_count(conn, metadata):
+    add_column(conn, 'alert', 'reporter_count', 'INTEGER DEFAULT 1')
+
+
+def add_geo_indexes(conn, metadata):
+    # Range index for bounding-box queries everywhere, GiST indexes on PostGIS
+    create_index(conn, 'alert', 'ix_alert_lat_lon', ['latitude', 'longitude'])
+    geo.create_spatial_indexes(conn)
+
+
+def add_alert_stats(conn, metadata):
+    # Fresh databases already have the tables from step 1; existing ones are
+    # counted from their alert history once
+    counts, rollups = metadata.tables['alert_status_count'], metadata.tables['alert_rollup']
+    metadata.create_all(conn, tables=[counts, rollups])
+    stats.backfill(conn, metadata.tables['alert'], counts, rollups)
+
+
+def add_alert_requests(conn, metadata):
+    metadata.create_all(conn, tables=[metadata.tables['alert_request']])
+
+
+def add_alert_archive(conn, metadata):
+    metadata.create_all(conn, tables=[metadata.tables['alert_archive']])
+
+
+REGION_COLUMNS = [
+    ('alert', 'latitude', 'longitude'),
+    ('alert_archive', 'latitude', 'longitude'),
+    ('user', 'current_latitude', 'current_longitude'),
+]
+
+
+def add_regions(conn, metadata):
+    # New rows get their tile on write; existing ones are tagged here in id order
+    for name, latitude, longitude in REGION_COLUMNS:
+        add_column(conn, name, 'region', 'VARCHAR(12)')
+        table = metadata.tables[name]
+        # Tagging is not a change: keep onupdate columns (alert.updated_at) as they
+        # are, or every old alert would look freshly changed to clustering and syncs
+        unchanged = {column.name: column for column in table.c if column.onupdate is not None}
+        last_id = 0
+        while True:
+            rows = conn.execute(
+                select(table.c.id, table.c[latitude], table.c[longitude])
+                .where(table.c.id > last_id, table.c[latitude].isnot(None), table.c[longitude].isnot(None))
+                .order_by(table.c.id).limit(10000)
+            ).all()
+            if not rows:
+                break
+            conn.execute(
+                update(table).where(table.c.id == bindparam('b_id')).values(region=bindparam('b_region'), **unchanged),
+                [{'b_id': row_id, 'b_region': regions.encode(lat, lon)} for row_id, lat, lon in rows]
+            )
+            last_id = rows[-1][0]
+    create_index(conn, 'alert', 'ix_alert_region_status', ['region', 'status'])
+    create_index(conn, 'user', 'ix_user_region', ['region'])
+
+
+def add_alert_reporters(conn, metadata):
+    metadata.create_all(conn, tables=[metadata.tables['alert_reporter']])
+
+
+def add_dispatch_candidates(conn, metadata):
+    # Alerts dispatched before this are offered to every driver
+    add_column(conn, 'alert', 'dispatch_candidates', 'TEXT')
+    add_column(conn, 'alert_archive', 'dispatch_candidates', 'TEXT')
+
+
+def widen_password_hash(conn, metadata):
+    # scrypt and pbkdf2:sha512 hashes run to about 166 characters. SQLite
+    # never enforces VARCHAR lengths, so only other backends need the ALTER
+    if conn.dialect.name == 'sqlite':
+        return
+    column = next(column for column in inspect(conn).get_columns('user') if column['name'] == 'password_hash')
+    if (getattr(column['type'], 'length', None) or 255) >= 255:
+        return
+    table, name = _quote(conn, 'user'), _quote(conn, 'password_hash')
+    if conn.dialect.name == 'mysql':
+        conn.execute(text(f"ALTER TABLE {table} MODIFY {name} VARCHAR(255) NOT NULL"))
+    else:
+        conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN {name} TYPE VARCHAR(255)"))
+
+
+MIGRATIONS = [
+    (1, 'Create base tables', create_base_tables),
+    (2, 'Add ambulance driver columns to user', add_driver_columns),
+    (3, 'Add dispatch tracking columns to alert', add_alert_tracking_columns),
+    (4, 'Index hot alert query columns', add_hot_query_indexes),
+    (5, 'Add incident reporter count to alert', add_alert_reporter_count),
+    (6, 'Index alert and ambulance positions for geo queries', add_geo_indexes),
+    (7, 'Add alert status counters and rollups', add_alert_stats),
+    (8, 'Add idempotency keys for alert submissions', add_alert_requests),
+    (9, 'Add archive table for old resolved alerts', add_alert_archive),
+    (10, 'Add region tiles to alerts and ambulances', add_regions),
+    (11, 'Add co-reporters of merged alerts', add_alert_reporters),
+    (12, 'Store dispatch candidates with alerts', add_dispatch_candidates),
+    (13, 'Widen user.password_hash for longer hash methods', widen_password_hash),
+]
+
+
+def _ensure_version_table(conn):
+    conn.execute(text(
+        'CREATE TABLE IF NOT EXISTS schema_version ('
+        'version INTEGER PRIMARY KEY, description VARCHAR(200), applied_at TIMESTAMP)'
+    ))
+
+
+def current_version(engine):
+    """Highest applied migration number (0 for an unmanaged database)"""
+    with engine.begin() as conn:
+        _ensure_version_table(conn)
+        return conn.execute(text('SELECT MAX(version) FROM schema_version')).scalar() or 0
+
+
+def upgrade(engine, metadata, target=None, log=print):
+    """Apply pending migrations in order, each in its own transaction"""
+    applied = []
+    version = current_version(engine)
+    for number, description, step in MIGRATIONS:
+        if number <= version or (target is not None and number > target):
+            continue
+        with engine.begin() as conn:
+            step(conn, metadata)
+            conn.execute(
+                text('INSERT INTO schema_version (version, description, applied_at) VALUES (:v, :d, :t)'),
+                {'v': number, 'd': description, 't': datetime.utcnow()}
+            )
+        applied.append(number)
+        if log:
+            log(f"Applied migration {number}: {description}")
+    return applied
@@ -0,0 +1,85 @@
+"""
+AutoRescue Regions
+
+Alerts and ambulances are assigned at write time to a region: the geohash
+of their position cut to ``PRECISION`` characters, a tile of roughly
+40 x 20 km. A driver's feed, live stream and cached responses then only
+involve the driver's own tile and the eight around it, so their cost depends
+on local activity rather than on national volume. Geohash prefixes nest, so
+a shorter prefix (e.g. ``dr5``) names every region inside a larger area.
+"""
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+_DECODE = {char: index for index, char in enumerate(BASE32)}
+
+# Geohash characters per region, as stored in alert.region and user.region;
+# changing it needs the stored regions recomputed
+PRECISION = 4
+
+
+def encode(latitude, longitude, precision=PRECISION):
+    """Geohash of a position, ``precision`` characters long"""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True  # geohash bits alternate longitude, latitude
+    while len(chars) < precision:
+        interval, coordinate = (lon_range, longitude) if even else (lat_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits = 0
+            value = 0
+    return ''.join(chars)
+
+
+def bounds(geohash):
+    """(min_lat, min_lon, max_lat, max_lon) of a geohash tile"""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        value = _DECODE[char]
+        for shift in range(4, -1, -1):
+            interval = lon_range if even else lat_range
+            middle = (interval[0] + interval[1]) / 2
+            if value >> shift & 1:
+                interval[0] = middle
+            else:
+                interval[1] = middle
+            even = not even
+    return lat_range[0], lon_range[0], lat_range[1], lon_range[1]
+
+
+def neighbourhood(geohash):
+    """The tile and the (up to) eight tiles around it"""
+    min_lat, min_lon, max_lat, max_lon = bounds(geohash)
+    height, width = max_lat - min_lat, max_lon - min_lon
+    center_lat, center_lon = (min_lat + max_lat) / 2, (min_lon + max_lon) / 2
+    tiles = set()
+    for row in (-1, 0, 1):
+        latitude = center_lat + row * height
+        if not -90.0 < latitude < 90.0:
+            continue
+        for column in (-1, 0, 1):
+            # Wrap across the antimeridian
+            longitude = (center_lon + column * width + 180.0) % 360.0 - 180.0
+            tiles.add(encode(latitude, longitude, len(geohash)))
+    return tiles
+
+
+def region_of(latitude, longitude):
+    """Region of a position, or None when it is unknown"""
+    if latitude is None or longitude is None:
+        return None
+    return encode(latitude, longitude)
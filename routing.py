@@ -0,0 +1,350 @@
+"""
+AutoRescue Road Routing
+
+Travel times on a road graph, so dispatch can rank ambulances by ETA rather
+than straight-line distance (which picks the wrong unit across rivers and
+along highways).
+
+The graph is converted offline from an OpenStreetMap extract into one
+compact, array-backed file and memory-mapped when the app starts, so workers
+forked from a preloaded app share its pages:
+
+    python routing.py extract.osm roads.graph
+
+File layout (little-endian): a header (magic, node count, edge count,
+fastest edge speed), node latitudes and longitudes (float32), then the
+forward adjacency in CSR form (uint32 offsets per node, uint32 target nodes,
+float32 travel seconds per edge) and the same for the reversed graph.
+
+``Router.etas`` answers "how long from each of these ambulances to this
+alert" with a single backward Dijkstra search from the alert over the
+reversed graph. Units are settled fastest first, so dispatch stops the search
+as soon as the ``k`` fastest are known.
+``Router.route_seconds`` is an A* search for a single pair. Results are
+cached per (ambulance grid cell, alert grid cell) in an LRU, so repeated
+dispatches and driver polls in the same area do not search again.
+"""
+
+import array
+import bisect
+import collections
+import heapq
+import math
+import mmap
+import struct
+import sys
+import threading
+
+from dispatch import METERS_PER_DEGREE, haversine_m
+
+MAGIC = b'ARGRAPH1'
+_HEADER = struct.Struct('<8sIIf')  # magic, nodes, edges, fastest edge speed (m/s)
+
+# Free-flow speeds (km/h) per OSM highway class, for ways without a maxspeed
+HIGHWAY_SPEEDS_KMH = {
+    'motorway': 100, 'motorway_link': 60, 'trunk': 80, 'trunk_link': 50,
+    'primary': 60, 'primary_link': 40, 'secondary': 50, 'secondary_link': 40,
+    'tertiary': 40, 'tertiary_link': 30, 'unclassified': 30, 'residential': 30,
+    'living_street': 10, 'service': 20,
+}
+
+_SNAP_CELL_DEG = 0.01  # Bucket size of the node lookup used to snap positions to the graph
+
+
+def parse_maxspeed(value):
+    """km/h from an OSM maxspeed tag ("50", "30 mph"), or None"""
+    if not value:
+        return None
+    number, _, unit = value.strip().partition(' ')
+    try:
+        speed = float(number)
+    except ValueError:
+        return None
+    return speed * 1.609344 if unit.strip() == 'mph' else speed
+
+
+def read_osm(path):
+    """Routable roads of an OSM XML extract as ([(lat, lon)], [(from, to, seconds)])"""
+    import xml.etree.ElementTree as ET  # Only graph builds parse XML; the app maps the built graph
+    coordinates = {}
+    ways = []
+    for _, element in ET.iterparse(path):
+        if element.tag == 'node':
+            coordinates[element.get('id')] = (float(element.get('lat')), float(element.get('lon')))
+        elif element.tag == 'way':
+            tags = {tag.get('k'): tag.get('v') for tag in element.iter('tag')}
+            highway = tags.get('highway')
+            if highway in HIGHWAY_SPEEDS_KMH:
+                speed = parse_maxspeed(tags.get('maxspeed')) or HIGHWAY_SPEEDS_KMH[highway]
+                oneway = tags.get('oneway')
+                if oneway is None and (highway == 'motorway' or tags.get('junction') == 'roundabout'):
+                    oneway = 'yes'
+                refs = [ref.get('ref') for ref in element.iter('nd')]
+                ways.append((refs, speed / 3.6, oneway))
+            element.clear()
+        elif element.tag == 'relation':
+            element.clear()
+
+    # Keep only the nodes roads use, numbered densely
+    index = {}
+    nodes = []
+    edges = []
+    for refs, speed, oneway in ways:
+        refs = [ref for ref in refs if ref in coordinates]
+        if oneway == '-1':
+            refs.reverse()
+        for a, b in zip(refs, refs[1:]):
+            for ref in (a, b):
+                if ref not in index:
+                    index[ref] = len(nodes)
+                    nodes.append(coordinates[ref])
+            seconds = haversine_m(*coordinates[a], *coordinates[b]) / speed
+            edges.append((index[a], index[b], seconds))
+            if oneway not in ('yes', 'true', '1', '-1'):
+                edges.append((index[b], index[a], seconds))
+    return nodes, edges
+
+
+def _csr(node_count, edges, key):
+    """Offsets, other ends and seconds of ``edges`` grouped by node ``key`` (0: from, 1: to)"""
+    edges = sorted(edges, key=lambda edge: edge[key])
+    offsets = array.array('I', [0] * (node_count + 1))
+    for edge in edges:
+        offsets[edge[key] + 1] += 1
+    for node in range(node_count):
+        offsets[node + 1] += offsets[node]
+    return offsets, array.array('I', [edge[1 - key] for edge in edges]), array.array('f', [edge[2] for edge in edges])
+
+
+def write_graph(path, nodes, edges):
+    """Write (lat, lon) ``nodes`` and (from, to, seconds) ``edges`` in the graph file format"""
+    max_speed = max((haversine_m(*nodes[a], *nodes[b]) / seconds for a, b, seconds in edges if seconds > 0),
+                    default=1.0)
+    arrays = [
+        array.array('f', [lat for lat, _ in nodes]),
+        array.array('f', [lon for _, lon in nodes]),
+        *_csr(len(nodes), edges, 0),
+        *_csr(len(nodes), edges, 1),
+    ]
+    with open(path, 'wb') as out:
+        out.write(_HEADER.pack(MAGIC, len(nodes), len(edges), max_speed))
+        for values in arrays:
+            if sys.byteorder != 'little':
+                values.byteswap()
+            values.tofile(out)
+
+
+class RoadGraph:
+    """A graph file, memory-mapped; arrays are read in place"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as source:
+            self._map = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.node_count, self.edge_count, self.max_speed = _HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not a road graph file')
+        view = memoryview(self._map)
+        offset = _HEADER.size
+        sections = []
+        for code, length in (('f', self.node_count), ('f', self.node_count),
+                             ('I', self.node_count + 1), ('I', self.edge_count), ('f', self.edge_count),
+                             ('I', self.node_count + 1), ('I', self.edge_count), ('f', self.edge_count)):
+            size = length * 4
+            if sys.byteorder == 'little':
+                section = view[offset:offset + size].cast(code)
+            else:
+                section = array.array(code, view[offset:offset + size])
+                section.byteswap()
+            sections.append(section)
+            offset += size
+        (self.latitudes, self.longitudes,
+         self.out_offsets, self.out_targets, self.out_seconds,
+         self.in_offsets, self.in_sources, self.in_seconds) = sections
+
+        # Node lookup for snapping positions to the nearest road
+        self._cells = collections.defaultdict(list)
+        for node in range(self.node_count):
+            self._cells[self._cell(self.latitudes[node], self.longitudes[node])].append(node)
+
+    @staticmethod
+    def _cell(latitude, longitude):
+        return int(math.floor(latitude / _SNAP_CELL_DEG)), int(math.floor(longitude / _SNAP_CELL_DEG))
+
+    def nearest_node(self, latitude, longitude, max_distance_m):
+        """(node, distance_m) of the closest node within ``max_distance_m``, or None"""
+        row0, col0 = self._cell(latitude, longitude)
+        # Nodes outside rings 0..r of cells around the point are at least r cells away
+        cell_m = _SNAP_CELL_DEG * METERS_PER_DEGREE * max(math.cos(math.radians(min(abs(latitude), 89.0))), 0.01)
+        best = None
+        for ring in range(int(math.ceil(max_distance_m / cell_m)) + 1):
+            for row in range(row0 - ring, row0 + ring + 1):
+                step = 1 if abs(row - row0) == ring else 2 * ring
+                for col in range(col0 - ring, col0 + ring + 1, step or 1):
+                    for node in self._cells.get((row, col), ()):
+                        distance = haversine_m(latitude, longitude, self.latitudes[node], self.longitudes[node])
+                        if distance <= max_distance_m and (best is None or distance < best[1]):
+                            best = (node, distance)
+            if best is not None and best[1] <= ring * cell_m:
+                break
+        return best
+
+    def close(self):
+        self._cells.clear()
+        for name in ('latitudes', 'longitudes', 'out_offsets', 'out_targets', 'out_seconds',
+                     'in_offsets', 'in_sources', 'in_seconds'):
+            section = getattr(self, name)
+            if isinstance(section, memoryview):
+                section.release()
+        self._map.close()
+
+
+class Router:
+    """ETAs on a RoadGraph with a per grid-cell pair cache"""
+
+    def __init__(self, graph, cell_size_deg=0.002, cache_size=100000, max_snap_m=1000, max_seconds=1800):
+        self.graph = graph
+        self.cell_size = float(cell_size_deg)
+        self.cache_size = cache_size
+        self.max_snap_m = max_snap_m
+        self.max_seconds = max_seconds
+        self._cache = collections.OrderedDict()  # (source cell, target cell) -> seconds or None
+        self._lock = threading.Lock()
+        self.searches = 0
+
+    def _cell(self, latitude, longitude):
+        return int(math.floor(latitude / self.cell_size)), int(math.floor(longitude / self.cell_size))
+
+    def cached(self, source_cell, target_cell):
+        with self._lock:
+            key = (source_cell, target_cell)
+            if key not in self._cache:
+                return False, None
+            self._cache.move_to_end(key)
+            return True, self._cache[key]
+
+    def remember(self, source_cell, target_cell, seconds):
+        with self._lock:
+            self._cache[(source_cell, target_cell)] = seconds
+            self._cache.move_to_end((source_cell, target_cell))
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def etas(self, latitude, longitude, sources, k=None):
+        """Road seconds from each (unit_id, lat, lon) in ``sources`` to a point.
+
+        Returns {unit_id: seconds}, with None for units off the graph or more
+        than ``max_seconds`` away, or None when the point itself is off the
+        graph. With ``k`` the search stops once the ``k`` fastest units are
+        known; slower ones may then be None too.
+        """
+        target = self.graph.nearest_node(latitude, longitude, self.max_snap_m)
+        if target is None:
+            return None
+        target_cell = self._cell(latitude, longitude)
+        etas = {}
+        pending = {}  # source node -> [(unit_id, source cell)]
+        for unit_id, lat, lon in sources:
+            source_cell = self._cell(lat, lon)
+            hit, seconds = self.cached(source_cell, target_cell)
+            if hit:
+                etas[unit_id] = seconds
+                continue
+            source = self.graph.nearest_node(lat, lon, self.max_snap_m)
+            if source is None:
+                etas[unit_id] = None
+                continue
+            pending.setdefault(source[0], []).append((unit_id, source_cell))
+        if pending:
+            known = sorted(seconds for seconds in etas.values() if seconds is not None)
+            reached, complete = self._search_back(target[0], pending, known, k)
+            for node, units in pending.items():
+                seconds = reached.get(node)
+                for unit_id, source_cell in units:
+                    etas[unit_id] = seconds
+                    # An early stop says nothing about the units not reached yet
+                    if seconds is not None or complete:
+                        self.remember(source_cell, target_cell, seconds)
+        return etas
+
+    def _search_back(self, target, sources, known=(), k=None):
+        """Dijkstra over the reversed graph from ``target`` until every ``sources`` node is settled.
+
+        Stops early once ``k`` units are known: those settled plus the
+        ``known`` (sorted) cached times no slower than the search radius.
+        Returns ({node: seconds}, complete).
+        """
+        self.searches += 1
+        offsets, others, weights = self.graph.in_offsets, self.graph.in_sources, self.graph.in_seconds
+        best = {target: 0.0}
+        settled = {}
+        heap = [(0.0, target)]
+        remaining = len(sources)
+        found = 0
+        while heap:
+            seconds, node = heapq.heappop(heap)
+            if node in settled:
+                continue
+            if seconds > self.max_seconds:
+                break
+            settled[node] = seconds
+            if node in sources:
+                remaining -= 1
+                found += len(sources[node])
+                if not remaining:
+                    break
+                if k is not None and found + bisect.bisect_right(known, seconds) >= k:
+                    return {node: settled[node] for node in sources if node in settled}, False
+            for edge in range(offsets[node], offsets[node + 1]):
+                other = others[edge]
+                candidate = seconds + weights[edge]
+                if candidate < best.get(other, math.inf):
+                    best[other] = candidate
+                    heapq.heappush(heap, (candidate, other))
+        return {node: settled[node] for node in sources if node in settled}, True
+
+    def route_seconds(self, from_lat, from_lon, to_lat, to_lon):
+        """Road seconds between two points by A* (None if either is off the graph or unreachable)"""
+        graph = self.graph
+        start = graph.nearest_node(from_lat, from_lon, self.max_snap_m)
+        goal = graph.nearest_node(to_lat, to_lon, self.max_snap_m)
+        if start is None or goal is None:
+            return None
+        start, goal = start[0], goal[0]
+        goal_lat, goal_lon = graph.latitudes[goal], graph.longitudes[goal]
+        # Straight-line distance at the fastest speed never overestimates
+        # (less a little for the float32 coordinates)
+        pace = 0.99 / graph.max_speed
+
+        def estimate(node):
+            return haversine_m(graph.latitudes[node], graph.longitudes[node], goal_lat, goal_lon) * pace
+
+        offsets, others, weights = graph.out_offsets, graph.out_targets, graph.out_seconds
+        best = {start: 0.0}
+        closed = set()
+        heap = [(estimate(start), 0.0, start)]
+        while heap:
+            _, seconds, node = heapq.heappop(heap)
+            if node == goal:
+                return seconds
+            if node in closed:
+                continue
+            closed.add(node)
+            for edge in range(offsets[node], offsets[node + 1]):
+                other = others[edge]
+                candidate = seconds + weights[edge]
+                if candidate < best.get(other, math.inf):
+                    best[other] = candidate
+                    heapq.heappush(heap, (candidate + estimate(other), candidate, other))
+        return None
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        sys.exit('Usage: python routing.py extract.osm roads.graph')
+    nodes, edges = read_osm(sys.argv[1])
+    write_graph(sys.argv[2], nodes, edges)
+    print(f'{sys.argv[2]}: {len(nodes)} nodes, {len(edges)} directed edges')
@@ -1,6 +1,9 @@
 #!/usr/bin/env python3
 """
 AutoRescue Application Launcher
+
+python run.py               - development server with the debugger and reloader
+python run.py --production  - gunicorn with the settings in gunicorn.conf.py
 """
 
 import os
@@ -28,8 +31,24 @@ def open_browser():
     time.sleep(2)
     webbrowser.open('http://localhost:5000')
 
+def run_production():
+    """Replace this process with gunicorn, so it receives SIGTERM/SIGHUP directly"""
+    try:
+        import gunicorn
+    except ImportError:
+        print("✗ Missing dependency: gunicorn")
+        print("Please run: pip install -r requirements.txt")
+        sys.exit(1)
+    root = os.path.dirname(os.path.abspath(__file__))
+    os.chdir(root)
+    print("Starting AutoRescue with gunicorn (gunicorn.conf.py)...")
+    os.execvp(sys.executable, [sys.executable, '-m', 'gunicorn', '-c', os.path.join(root, 'gunicorn.conf.py'), 'app:app'])
+
 def main():
     """Main application launcher"""
+    if '--production' in sys.argv[1:]:
+        run_production()
+    
     print("AutoRescue - Smart Accident Detection System")
     print("=" * 50)
     
@@ -46,8 +65,9 @@ def main():
     Timer(3.0, open_browser).start()
     
     try:
-        # Import and run the Flask app
-        from app import app
+        # Import the Flask app, bring the database schema up to date and seed it
+        from app import app, prepare_database
+        prepare_database()
         app.run(debug=True, host='0.0.0.0', port=5000)
     except KeyboardInterrupt:
         print("\n\nServer stopped by user")
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+AutoRescue Async Launcher
+
+Runs the ASGI entry point (asgi.py) under uvicorn. Live dashboards hold their
+event streams open without tying up a handler thread each, so one process
+serves many more connected clients than the threaded server in run.py.
+
+Usage: python run_asgi.py [--host 0.0.0.0] [--port 5000] [--workers 1]
+"""
+
+import argparse
+import os
+import sys
+
+
+def check_dependencies():
+    """Check that an ASGI server is installed"""
+    try:
+        import uvicorn
+        print("✓ uvicorn is installed")
+        return True
+    except ImportError:
+        print("✗ Missing dependency: uvicorn")
+        print("Please run: pip install uvicorn")
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default=os.environ.get('HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', 5000)))
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('WEB_CONCURRENCY', 1)),
+                        help='processes; live events and caches are per process')
+    args = parser.parse_args()
+
+    print("AutoRescue - Smart Accident Detection System (async server)")
+    print("=" * 50)
+
+    if not check_dependencies():
+        sys.exit(1)
+
+    # Bring the schema up to date and seed it once, before any worker starts serving
+    from app import app, prepare_database
+    prepare_database()
+
+    print(f"Server will be available at: http://localhost:{args.port}")
+    print(f"Handler threads per process: {app.config['ASGI_THREADS']}")
+    print("Press Ctrl+C to stop the server")
+    print("=" * 50)
+
+    import uvicorn
+    uvicorn.run('asgi:application', host=args.host, port=args.port, workers=args.workers,
+                lifespan='on', timeout_graceful_shutdown=10)
+
+
+if __name__ == "__main__":
+    main()
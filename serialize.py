@@ -0,0 +1,82 @@
+"""
+AutoRescue Response Serialization
+
+Alert lists are encoded straight from the row tuples of a column select:
+no ORM objects, no per-row dicts built by the view, and no per-field
+``isoformat`` calls in Python (the encoder writes datetimes as ISO-8601
+itself). Rows are encoded a batch at a time while the response streams, so
+the body never has to exist as a list of dicts plus one large string.
+
+orjson is used when installed (``pip install orjson``), otherwise the
+standard library's C encoder. Both write compact JSON.
+
+Two layouts are offered:
+
+- rows: ``[{"id": 1, "latitude": 40.7, ...}, ...]``
+- columns: ``{"id": [1, 2, ...], "latitude": [40.7, 40.8, ...], ...}``, one
+  array per field, for map dashboards drawing thousands of markers; it
+  repeats no keys and is far smaller.
+"""
+
+import json
+from datetime import date, datetime
+from operator import itemgetter
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+BATCH_ROWS = 1000  # Rows encoded per chunk of a streamed body
+LAYOUTS = ('rows', 'columns')
+
+
+def _isoformat(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+if orjson is not None:
+    def encode(value):
+        """Compact JSON bytes of ``value``; datetimes become ISO-8601 strings"""
+        return orjson.dumps(value)
+else:
+    _encoder = json.JSONEncoder(separators=(',', ':'), default=_isoformat)
+
+    def encode(value):
+        """Compact JSON bytes of ``value``; datetimes become ISO-8601 strings"""
+        return _encoder.encode(value).encode()
+
+
+def project(rows, fields, only):
+    """``rows`` (tuples in ``fields`` order) cut down to the fields in ``only``"""
+    if only is None or tuple(only) == tuple(fields):
+        return rows
+    pick = itemgetter(*(fields.index(field) for field in only))
+    if len(only) == 1:
+        return [(pick(row),) for row in rows]
+    return [pick(row) for row in rows]
+
+
+def iter_rows(rows, fields, layout='rows', batch_rows=BATCH_ROWS):
+    """JSON of ``rows`` (tuples; values beyond ``fields`` are ignored) as byte chunks"""
+    if layout == 'columns':
+        # Columns are only complete at the end: encode them one field at a time
+        columns = list(zip(*rows)) if rows else [()] * len(fields)
+        for i, field in enumerate(fields):
+            yield (b'{' if i == 0 else b',') + encode(field) + b':' + encode(list(columns[i]))
+        yield b'}' if fields else b'{}'
+        return
+    yield b'['
+    for start in range(0, len(rows), batch_rows):
+        batch = encode([dict(zip(fields, row)) for row in rows[start:start + batch_rows]])
+        yield batch[1:-1] if start == 0 else b',' + batch[1:-1]
+    yield b']'
+
+
+def iter_envelope(key, chunks, **members):
+    """``{key: <chunks>, **members}`` as byte chunks, e.g. a page of rows with its cursor"""
+    yield b'{' + encode(key) + b':'
+    yield from chunks
+    yield (b',' + encode(members)[1:]) if members else b'}'
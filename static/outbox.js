@@ -0,0 +1,131 @@
+// AutoRescue SOS outbox
+//
+// Alerts are written to IndexedDB before they are sent and stay there until
+// the server answers, so a flaky connection at a crash site delays an SOS
+// instead of losing it. Every entry carries an idempotency key: when a request
+// did arrive but its response was lost, the retry returns the original alert
+// instead of creating a duplicate. Used by the driver dashboard and by the
+// service worker (sw.js), which also flushes the outbox via Background Sync.
+(function (scope) {
+    const DB_NAME = 'autorescue';
+    const STORE = 'sos-outbox';
+    const BASE_DELAY = 1000;       // ms before the first retry
+    const MAX_DELAY = 30000;       // ms - backoff cap
+    const REQUEST_TIMEOUT = 10000; // ms - give up on a hanging request and retry
+
+    // Falls back to memory where IndexedDB is unavailable (e.g. private browsing)
+    const memory = new Map();
+    let dbPromise = null;
+
+    function openDb() {
+        if (!dbPromise) {
+            dbPromise = new Promise((resolve) => {
+                if (!scope.indexedDB) return resolve(null);
+                const request = scope.indexedDB.open(DB_NAME, 1);
+                request.onupgradeneeded = () => request.result.createObjectStore(STORE, { keyPath: 'key' });
+                request.onsuccess = () => resolve(request.result);
+                request.onerror = () => resolve(null);
+            });
+        }
+        return dbPromise;
+    }
+
+    async function run(mode, operation) {
+        const db = await openDb();
+        if (!db) return operation(null);
+        return new Promise((resolve, reject) => {
+            const transaction = db.transaction(STORE, mode);
+            const request = operation(transaction.objectStore(STORE));
+            transaction.oncomplete = () => resolve(request ? request.result : undefined);
+            transaction.onerror = () => reject(transaction.error);
+        });
+    }
+
+    function put(entry) {
+        return run('readwrite', (store) => store ? store.put(entry) : void memory.set(entry.key, entry));
+    }
+
+    function remove(key) {
+        return run('readwrite', (store) => store ? store.delete(key) : void memory.delete(key));
+    }
+
+    async function pending() {
+        const entries = await run('readonly', (store) => store ? store.getAll() : null);
+        return entries || Array.from(memory.values());
+    }
+
+    function newKey() {
+        if (scope.crypto && scope.crypto.randomUUID) return scope.crypto.randomUUID();
+        return Date.now().toString(36) + '-' + Math.random().toString(36).slice(2, 12);
+    }
+
+    async function enqueue(payload) {
+        const entry = { key: newKey(), payload, createdAt: Date.now(), attempts: 0, nextAttempt: 0 };
+        await put(entry);
+        return entry;
+    }
+
+    // 401 stays queued: the alert goes out once the driver logs in again
+    function retryable(status) {
+        return status === 401 || status === 408 || status === 429 || status >= 500;
+    }
+
+    // Full jitter keeps many phones that lost signal together from retrying in lockstep
+    function backoff(attempts) {
+        return Math.random() * Math.min(MAX_DELAY, BASE_DELAY * 2 ** (attempts - 1));
+    }
+
+    async function send(entry) {
+        const controller = new AbortController();
+        const timer = setTimeout(() => controller.abort(), REQUEST_TIMEOUT);
+        try {
+            return await fetch('/api/alerts', {
+                method: 'POST',
+                credentials: 'same-origin',
+                headers: { 'Content-Type': 'application/json', 'Idempotency-Key': entry.key },
+                body: JSON.stringify(entry.payload),
+                signal: controller.signal
+            });
+        } finally {
+            clearTimeout(timer);
+        }
+    }
+
+    let flushing = Promise.resolve();
+
+    // Send every due entry once. onResult(entry, result, status) is called for
+    // entries that are done (result is null when the server rejected them).
+    // Resolves to the ms until the next retry is due, or null when empty.
+    // Flushes run one after another so an entry is never sent twice at once.
+    function flush(onResult) {
+        const run = flushing.then(() => flushOnce(onResult || (() => {})));
+        flushing = run.catch(() => null);
+        return run;
+    }
+
+    async function flushOnce(onResult) {
+        for (const entry of await pending()) {
+            if (entry.nextAttempt > Date.now()) continue;
+            let response = null;
+            try {
+                response = await send(entry);
+            } catch (error) {
+                // Offline, timed out or connection dropped: retry below
+            }
+            if (response && !retryable(response.status)) {
+                await remove(entry.key);
+                const result = response.ok ? await response.json().catch(() => ({})) : null;
+                onResult(entry, result, response.status);
+                continue;
+            }
+            entry.attempts += 1;
+            entry.nextAttempt = Date.now() + backoff(entry.attempts);
+            await put(entry);
+        }
+        const remaining = await pending();
+        if (remaining.length === 0) return null;
+        return Math.max(0, Math.min(...remaining.map((entry) => entry.nextAttempt)) - Date.now());
+    }
+
+    scope.AutoRescueOutbox = { enqueue, flush, pending };
+})(self);
@@ -0,0 +1,29 @@
+// AutoRescue service worker: delivers queued SOS alerts even after the
+// dashboard tab was closed or the phone was locked (where Background Sync is
+// supported). Served from /sw.js so it controls every page.
+importScripts('/static/outbox.js');
+
+self.addEventListener('install', () => self.skipWaiting());
+
+self.addEventListener('activate', (event) => event.waitUntil(self.clients.claim()));
+
+async function notifyClients(entry, result, status) {
+    const clients = await self.clients.matchAll({ type: 'window' });
+    clients.forEach((client) => client.postMessage({ type: 'sos-delivered', entry, result, status }));
+}
+
+async function deliver() {
+    const delay = await self.AutoRescueOutbox.flush(notifyClients);
+    if (delay !== null) {
+        // Rejecting asks the browser to fire the sync event again later
+        throw new Error('SOS outbox not empty');
+    }
+}
+
+self.addEventListener('sync', (event) => {
+    if (event.tag === 'sos-outbox') event.waitUntil(deliver());
+});
+
+self.addEventListener('message', (event) => {
+    if (event.data === 'flush-outbox') event.waitUntil(deliver().catch(() => {}));
+});
@@ -0,0 +1,162 @@
+"""
+AutoRescue Alert Statistics
+
+Dashboard counters kept up to date as alerts change instead of being
+counted from the full alert history on every page load. Each status change
+adjusts a per-status count and adds to hourly and daily rollups of how many
+alerts entered each status, with the summed report-to-accept and
+report-to-resolve times needed for mean response times. The writes join the
+caller's session, so they commit or roll back with the status change itself.
+"""
+
+import importlib
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, insert, select, update
+
+STATUSES = ('pending', 'verified', 'dispatched', 'accepted', 'resolved')
+GRANULARITIES = {'hour': timedelta(hours=1), 'day': timedelta(days=1)}
+# Statuses whose rollups also carry a response time measured from the report
+TIMED_STATUSES = {'accepted': 'accepted_at', 'resolved': 'resolved_at'}
+
+
+def bucket_start(value, granularity):
+    """Start of the hour or day containing ``value``"""
+    value = value.replace(minute=0, second=0, microsecond=0)
+    return value.replace(hour=0) if granularity == 'day' else value
+
+
+def increment(session, table, key, amounts):
+    """Add ``amounts`` to the row identified by ``key``, creating it if missing"""
+    dialect = session.get_bind().dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        # The engine has already imported its own dialect; the other is never loaded
+        module = importlib.import_module(f'sqlalchemy.dialects.{dialect}')
+        stmt = module.insert(table).values({**key, **amounts})
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(key),
+            set_={name: table.c[name] + stmt.excluded[name] for name in amounts}
+        )
+        session.execute(stmt)
+        return
+    match = and_(*(table.c[name] == value for name, value in key.items()))
+    changed = session.execute(
+        update(table).where(match).values({name: table.c[name] + value for name, value in amounts.items()})
+    ).rowcount
+    if not changed:
+        session.execute(insert(table).values({**key, **amounts}))
+
+
+class StatsRecorder:
+    """Applies status changes to the count and rollup tables"""
+
+    def __init__(self, counts, rollups):
+        self.counts = counts
+        self.rollups = rollups
+
+    def changes(self, old_status, new_status, reported_at=None, at=None):
+        """(table, key, amounts) increments for one alert moving between statuses"""
+        if old_status == new_status:
+            return []
+        at = at or datetime.utcnow()
+        result = []
+        if old_status is not None:
+            result.append((self.counts, {'status': old_status}, {'count': -1}))
+        result.append((self.counts, {'status': new_status}, {'count': 1}))
+        timed = new_status in TIMED_STATUSES and reported_at is not None
+        amounts = {
+            'count': 1,
+            'timed': 1 if timed else 0,
+            'response_seconds': max((at - reported_at).total_seconds(), 0.0) if timed else 0.0,
+        }
+        for granularity in GRANULARITIES:
+            key = {'granularity': granularity, 'bucket_start': bucket_start(at, granularity), 'status': new_status}
+            result.append((self.rollups, key, amounts))
+        return result
+
+    def record(self, session, transitions):
+        """Apply (old_status, new_status, reported_at, at) transitions in one session"""
+        totals = {}
+        for transition in transitions:
+            for table, key, amounts in self.changes(*transition):
+                ident = (table.name, tuple(sorted(key.items())))
+                if ident not in totals:
+                    totals[ident] = (table, key, dict(amounts))
+                else:
+                    summed = totals[ident][2]
+                    for name, value in amounts.items():
+                        summed[name] += value
+        # One statement per row, in a fixed order so concurrent transactions cannot deadlock
+        for ident in sorted(totals):
+            table, key, amounts = totals[ident]
+            if any(amounts.values()):
+                increment(session, table, key, amounts)
+
+    def status_counts(self, session):
+        counts = dict.fromkeys(STATUSES, 0)
+        for status, count in session.execute(select(self.counts.c.status, self.counts.c['count'])):
+            counts[status] = count
+        return counts
+
+    def series(self, session, granularity, since):
+        """Non-empty buckets from ``since`` on, oldest first"""
+        table = self.rollups
+        rows = session.execute(
+            select(table.c.bucket_start, table.c.status, table.c['count'], table.c.timed, table.c.response_seconds)
+            .where(table.c.granularity == granularity, table.c.bucket_start >= bucket_start(since, granularity))
+            .order_by(table.c.bucket_start)
+        )
+        buckets = {}
+        for start, status, count, timed, seconds in rows:
+            bucket = buckets.setdefault(start, {'start': start, 'counts': dict.fromkeys(STATUSES, 0), 'totals': {}})
+            bucket['counts'][status] = count
+            if status in TIMED_STATUSES:
+                bucket['totals'][status] = (timed, seconds)
+        return list(buckets.values())
+
+
+def mean_seconds(totals, status):
+    timed, seconds = totals.get(status, (0, 0.0))
+    return round(seconds / timed, 1) if timed else None
+
+
+def backfill(conn, alerts, counts, rollups):
+    """Rebuild counts and rollups from the alert table (used once, by the migration)"""
+    conn.execute(counts.delete())
+    conn.execute(rollups.delete())
+    totals = {}
+    buckets = {}
+
+    def add(status, at, reported_at=None):
+        if at is None:
+            return
+        for granularity in GRANULARITIES:
+            bucket = buckets.setdefault((granularity, bucket_start(at, granularity), status), [0, 0, 0.0])
+            bucket[0] += 1
+            if reported_at is not None:
+                bucket[1] += 1
+                bucket[2] += max((at - reported_at).total_seconds(), 0.0)
+
+    rows = conn.execute(select(
+        alerts.c.status, alerts.c.timestamp, alerts.c.accepted_at, alerts.c.resolved_at, alerts.c.updated_at
+    )).yield_per(10000)
+    for status, reported_at, accepted_at, resolved_at, updated_at in rows:
+        status = status or 'pending'
+        totals[status] = totals.get(status, 0) + 1
+        # Only report, accept and resolve times are recorded on the alert
+        add('pending', reported_at)
+        if accepted_at is not None:
+            add('accepted', accepted_at, reported_at)
+        if resolved_at is not None:
+            add('resolved', resolved_at, reported_at)
+        elif status == 'resolved':
+            add('resolved', updated_at or reported_at)
+
+    if totals:
+        conn.execute(insert(counts), [{'status': status, 'count': count} for status, count in totals.items()])
+    if buckets:
+        conn.execute(insert(rollups), [
+            {'granularity': granularity, 'bucket_start': start, 'status': status,
+             'count': count, 'timed': timed, 'response_seconds': seconds}
+            for (granularity, start, status), (count, timed, seconds) in buckets.items()
+        ])
@@ -0,0 +1,108 @@
+"""
+Shared fixtures for the AutoRescue test suite
+
+The app reads its configuration at import, so the environment is set here,
+before any test module imports it: the testing config (an in-memory SQLite
+database, locations written through on every fix) and an alerts version file
+in a throwaway directory. Every test starts from a freshly migrated database
+and empty in-process caches.
+"""
+
+import os
+import sys
+import tempfile
+
+WORKDIR = tempfile.mkdtemp(prefix='autorescue-test-')
+os.environ['FLASK_ENV'] = 'testing'
+os.environ['ALERTS_VERSION_FILE'] = os.path.join(WORKDIR, 'alerts.version')
+os.environ.pop('DATABASE_URL', None)
+os.environ.pop('EVENT_LOG_DIR', None)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from sqlalchemy import text
+from werkzeug.security import generate_password_hash
+
+import app as autorescue
+import migrations
+from accounts import UserCache
+from locations import LocationBuffer
+
+# Archive runs are called directly; no background thread shares the test database
+autorescue.app.config['ARCHIVE_INTERVAL'] = 0
+
+
+def reset_database():
+    """Drop every table, including the migrations' own bookkeeping"""
+    db = autorescue.db
+    db.session.remove()
+    db.metadata.drop_all(db.engine)
+    with db.engine.begin() as conn:
+        conn.execute(text('DROP TABLE IF EXISTS schema_version'))
+
+
+@pytest.fixture
+def empty_database(monkeypatch):
+    """App context over an empty database and empty in-process state"""
+    app = autorescue.app
+    monkeypatch.setattr(autorescue, 'location_buffer', LocationBuffer())
+    monkeypatch.setattr(autorescue, 'user_cache', UserCache(app.config['USER_CACHE_SIZE'], app.config['USER_CACHE_TTL']))
+    monkeypatch.setattr(autorescue, '_dispatch_index_loaded', False)
+    monkeypatch.setattr(autorescue, '_alert_clusters_loaded', False)
+    monkeypatch.setattr(autorescue, '_triage_synced_at', None)
+    autorescue.dispatch_index.clear()
+    autorescue.alert_clusters.clear()
+    autorescue.triage_queue.clear()
+    autorescue.response_cache.clear()
+    with app.app_context():
+        reset_database()
+        yield autorescue.db
+        autorescue.db.session.remove()
+
+
+@pytest.fixture
+def database(empty_database):
+    """App context over a fully migrated database"""
+    migrations.upgrade(empty_database.engine, empty_database.metadata, log=None)
+    return empty_database
+
+
+@pytest.fixture
+def users(database):
+    """An admin, a reporting user and three ambulance drivers; returns their ids by username"""
+    accounts = [autorescue.User(username='admin', email='admin@example.com', is_admin=True)]
+    accounts.append(autorescue.User(username='reporter', email='reporter@example.com'))
+    for i in range(3):
+        accounts.append(autorescue.User(username=f'amb{i}', email=f'amb{i}@example.com',
+                                        is_ambulance_driver=True, driver_id=f'A{i}'))
+    password_hash = generate_password_hash('pw', method='pbkdf2:sha256:1000')
+    for account in accounts:
+        account.password_hash = password_hash
+    database.session.add_all(accounts)
+    database.session.commit()
+    return {account.username: account.id for account in accounts}
+
+
+@pytest.fixture
+def login(users):
+    """Test client logged in as ``username``"""
+    def login(username):
+        client = autorescue.app.test_client()
+        response = client.post('/login', json={'username': username, 'password': 'pw'})
+        assert response.get_json()['success'], response.get_json()
+        return client
+    return login
+
+
+def place(client, latitude, longitude):
+    """Report a driver's position"""
+    response = client.post('/api/ambulance/update-location', json={'latitude': latitude, 'longitude': longitude})
+    assert response.status_code == 200, response.get_json()
+
+
+def report(client, latitude=40.0, longitude=-74.0, **fields):
+    """Submit an SOS alert and return the response body"""
+    response = client.post('/api/alerts', json=dict(alert_type='Accident', latitude=latitude,
+                                                    longitude=longitude, **fields))
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
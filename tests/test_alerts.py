@@ -0,0 +1,68 @@
+"""SOS submission: merging duplicate reports, idempotent retries and conditional GETs"""
+
+import app as autorescue
+from conftest import report
+
+
+def test_nearby_reports_merge_into_one_incident(login):
+    reporter, passenger = login('reporter'), login('amb0')
+    first = report(reporter, 40.0, -74.0)
+    second = report(passenger, 40.0002, -74.0)
+    elsewhere = report(passenger, 40.1, -74.0)
+
+    assert not first['merged']
+    assert second['merged'] and second['alert_id'] == first['alert_id']
+    assert second['reporter_count'] == 2
+    assert not elsewhere['merged'] and elsewhere['alert_id'] != first['alert_id']
+    # The co-reporter sees the incident in their own list
+    assert first['alert_id'] in [alert['id'] for alert in passenger.get('/api/alerts').get_json()]
+
+
+def test_repeated_report_from_the_same_user_is_not_counted_twice(login):
+    reporter = login('reporter')
+    first = report(reporter, 40.0, -74.0)
+    again = report(reporter, 40.0001, -74.0)
+    assert again['merged'] and again['reporter_count'] == 1 == first['reporter_count']
+
+
+def test_retried_submission_is_replayed(login):
+    reporter = login('reporter')
+    headers = {'Idempotency-Key': 'sos-1'}
+    body = {'alert_type': 'Accident', 'latitude': 40.0, 'longitude': -74.0}
+    first = reporter.post('/api/alerts', json=body, headers=headers).get_json()
+    retry = reporter.post('/api/alerts', json=body, headers=headers).get_json()
+
+    assert retry['replayed'] and retry['alert_id'] == first['alert_id']
+    assert autorescue.Alert.query.count() == 1
+    # Keys belong to their user
+    other = login('amb0').post('/api/alerts', json=dict(body, latitude=41.0), headers=headers).get_json()
+    assert 'replayed' not in other and other['alert_id'] != first['alert_id']
+
+
+def test_invalid_idempotency_key_is_rejected(login):
+    response = login('reporter').post('/api/alerts', json={'latitude': 40.0, 'longitude': -74.0},
+                                      headers={'Idempotency-Key': 'x' * 65})
+    assert response.status_code == 400
+
+
+def test_alert_list_revalidates_until_an_alert_changes(login):
+    admin, reporter = login('admin'), login('reporter')
+    report(reporter, 40.0, -74.0)
+    first = admin.get('/api/alerts')
+    assert first.status_code == 200 and first.headers['ETag']
+
+    unchanged = admin.get('/api/alerts', headers={'If-None-Match': first.headers['ETag']})
+    assert unchanged.status_code == 304 and not unchanged.data
+
+    report(reporter, 41.0, -74.0)
+    changed = admin.get('/api/alerts', headers={'If-None-Match': first.headers['ETag']})
+    assert changed.status_code == 200 and changed.headers['ETag'] != first.headers['ETag']
+    assert len(changed.get_json()) == 2
+
+
+def test_cached_alert_lists_are_not_shared_between_users(login):
+    reporter, other = login('reporter'), login('amb0')
+    report(reporter, 40.0, -74.0)
+    mine = reporter.get('/api/alerts')
+    theirs = other.get('/api/alerts', headers={'If-None-Match': mine.headers['ETag']})
+    assert theirs.status_code == 200 and theirs.get_json() == []
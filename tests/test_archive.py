@@ -0,0 +1,37 @@
+"""Archival of resolved alerts into the cold table"""
+
+from datetime import datetime, timedelta
+
+import app as autorescue
+
+
+def add_alert(database, user_id, status, resolved_at=None):
+    alert = autorescue.Alert(alert_type='Accident', latitude=40.0, longitude=-74.0, user_id=user_id, status=status,
+                             resolved=status == 'resolved', resolved_at=resolved_at)
+    database.session.add(alert)
+    database.session.commit()
+    return alert.id
+
+
+def test_only_alerts_resolved_before_the_cutoff_move(database, users):
+    old = datetime.utcnow() - timedelta(days=60)
+    archived = add_alert(database, users['reporter'], 'resolved', old)
+    recent = add_alert(database, users['reporter'], 'resolved', datetime.utcnow())
+    still_open = add_alert(database, users['reporter'], 'dispatched')
+
+    assert autorescue.archive_alerts(datetime.utcnow() - timedelta(days=30)) == 1
+    assert [alert.id for alert in autorescue.Alert.query.order_by(autorescue.Alert.id)] == [recent, still_open]
+    moved = database.session.get(autorescue.ArchivedAlert, archived)
+    assert (moved.status, moved.resolved_at, moved.user_id) == ('resolved', old, users['reporter'])
+    # A second run finds nothing left to move
+    assert autorescue.archive_alerts(datetime.utcnow() - timedelta(days=30)) == 0
+
+
+def test_archived_alerts_stay_readable(login, users, database):
+    archived = add_alert(database, users['reporter'], 'resolved', datetime.utcnow() - timedelta(days=60))
+    autorescue.archive_alerts(datetime.utcnow() - timedelta(days=30))
+
+    reporter = login('reporter')
+    assert reporter.get('/api/alerts').get_json() == []
+    page = reporter.get('/api/alerts?archived=1').get_json()
+    assert [alert['id'] for alert in page['alerts']] == [archived]
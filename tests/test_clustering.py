@@ -0,0 +1,44 @@
+"""Incident clustering of nearby reports within the time window"""
+
+from clustering import IncidentClusterer
+
+
+def test_report_within_radius_and_window_matches():
+    clusters = IncidentClusterer(radius_m=50, window=120)
+    clusters.add(1, 40.0, -74.0, reporter=7, reported_at=1000)
+    assert clusters.match(40.0003, -74.0, reported_at=1060) == 1
+    assert clusters.match(40.001, -74.0, reported_at=1060) is None
+    assert clusters.match(40.0, -74.0, reported_at=1121) is None
+
+
+def test_nearest_incident_wins():
+    clusters = IncidentClusterer(radius_m=50, window=120)
+    clusters.add(1, 40.0, -74.0, reported_at=1000)
+    clusters.add(2, 40.0004, -74.0, reported_at=1000)
+    assert clusters.match(40.0003, -74.0, reported_at=1000) == 2
+
+
+def test_reports_extend_the_window_and_count_reporters_once():
+    clusters = IncidentClusterer(radius_m=50, window=120)
+    clusters.add(1, 40.0, -74.0, reporter=7, reported_at=1000)
+    assert not clusters.report(1, reporter=7, reported_at=1100)
+    assert clusters.report(1, reporter=8, reported_at=1100)
+    assert clusters.match(40.0, -74.0, reported_at=1200) == 1
+
+
+def test_incidents_added_out_of_time_order_expire_by_their_own_time():
+    clusters = IncidentClusterer(radius_m=50, window=120)
+    # As when open alerts are loaded or a gateway batch is backfilled
+    clusters.add(1, 40.0, -74.0, reported_at=1000)
+    clusters.add(2, 41.0, -74.0, reported_at=100)
+    assert clusters.match(41.0, -74.0, reported_at=1000) is None
+    assert 2 not in clusters and 1 in clusters
+
+
+def test_report_does_not_match_an_incident_older_than_the_window():
+    clusters = IncidentClusterer(radius_m=50, window=120)
+    clusters.add(1, 40.0, -74.0, reported_at=1000)
+    clusters.add(2, 41.0, -74.0, reported_at=2000)
+    assert clusters.match(40.0, -74.0, reported_at=1050) == 1
+    assert clusters.match(40.0, -74.0, reported_at=1500) is None
+    assert clusters.match(41.0, -74.0, reported_at=1990) == 2
@@ -0,0 +1,85 @@
+"""Dispatch ranking, race-free acceptance and the status counters they maintain"""
+
+from sqlalchemy import update
+
+import app as autorescue
+from conftest import place, report
+
+
+def test_dispatch_ranks_nearest_available_units(login, users):
+    admin, reporter = login('admin'), login('reporter')
+    for i, latitude in enumerate((40.03, 40.01, 40.02)):
+        place(login(f'amb{i}'), latitude, -74.0)
+    alert_id = report(reporter, 40.0, -74.0)['alert_id']
+    admin.patch(f'/api/alerts/{alert_id}/verify')
+
+    candidates = admin.patch(f'/api/alerts/{alert_id}/dispatch').get_json()['candidates']
+    assert [candidate['ambulance_id'] for candidate in candidates] == [users['amb1'], users['amb2'], users['amb0']]
+    distances = [candidate['distance_m'] for candidate in candidates]
+    assert distances == sorted(distances)
+    assert 1000 < distances[0] < 1200
+
+
+def test_dispatch_skips_drivers_gone_off_duty_elsewhere(login, users):
+    admin, reporter = login('admin'), login('reporter')
+    for i in range(3):
+        place(login(f'amb{i}'), 40.0 + i * 0.01, -74.0)
+    alert_id = report(reporter, 40.0, -74.0)['alert_id']
+    admin.patch(f'/api/alerts/{alert_id}/verify')
+    # Written behind this process's back, as another worker would
+    autorescue.db.session.execute(update(autorescue.User).where(autorescue.User.id == users['amb0'])
+                                  .values(is_available=False))
+    autorescue.db.session.commit()
+
+    candidates = admin.patch(f'/api/alerts/{alert_id}/dispatch').get_json()['candidates']
+    assert users['amb0'] not in [candidate['ambulance_id'] for candidate in candidates]
+
+
+def test_only_one_driver_accepts_an_alert(login, users):
+    admin, reporter = login('admin'), login('reporter')
+    drivers = [login(f'amb{i}') for i in range(3)]
+    for i, driver in enumerate(drivers):
+        place(driver, 40.0 + i * 0.01, -74.0)
+    alert_id = report(reporter, 40.0, -74.0)['alert_id']
+    admin.patch(f'/api/alerts/{alert_id}/verify')
+    admin.patch(f'/api/alerts/{alert_id}/dispatch')
+
+    assert drivers[1].post(f'/api/ambulance/accept-alert/{alert_id}').status_code == 200
+    assert drivers[0].post(f'/api/ambulance/accept-alert/{alert_id}').status_code == 409
+    alert = autorescue.db.session.get(autorescue.Alert, alert_id)
+    assert (alert.status, alert.assigned_ambulance_id) == ('accepted', users['amb1'])
+    assert not autorescue.db.session.get(autorescue.User, users['amb1']).is_available
+    # Resolving is only open to the assigned driver
+    assert drivers[0].post(f'/api/ambulance/resolve-alert/{alert_id}').status_code != 200
+    assert drivers[1].post(f'/api/ambulance/resolve-alert/{alert_id}').status_code == 200
+
+
+def test_status_change_on_a_stale_read_is_refused(database, users):
+    alert = autorescue.Alert(alert_type='Accident', latitude=40.0, longitude=-74.0, status='pending',
+                             user_id=users['reporter'])
+    database.session.add(alert)
+    database.session.commit()
+    assert autorescue.claim_status(alert, 'pending', 'verified')
+    database.session.commit()
+    # A second writer still holding 'pending' loses
+    assert not autorescue.claim_status(alert, 'pending', 'resolved')
+    database.session.rollback()
+    assert database.session.get(autorescue.Alert, alert.id).status == 'verified'
+
+
+def test_stats_counters_follow_status_changes(login):
+    admin, reporter, driver = login('admin'), login('reporter'), login('amb0')
+    place(driver, 40.0, -74.0)
+    first = report(reporter, 40.0, -74.0)['alert_id']
+    report(reporter, 41.0, -74.0)
+    admin.patch(f'/api/alerts/{first}/verify')
+    admin.patch(f'/api/alerts/{first}/dispatch')
+    driver.post(f'/api/ambulance/accept-alert/{first}')
+    driver.post(f'/api/ambulance/resolve-alert/{first}')
+
+    stats = admin.get('/api/stats').get_json()
+    assert stats['counts']['pending'] == 1
+    assert stats['counts']['resolved'] == 1
+    assert stats['counts']['dispatched'] == stats['counts']['accepted'] == 0
+    assert (stats['total'], stats['open']) == (2, 1)
+    assert stats['mean_time_to_accept'] is not None
@@ -0,0 +1,75 @@
+"""Gateway batch ingestion: timestamp parsing, per-item validation and the endpoint"""
+
+import json
+import math
+from datetime import datetime, timezone
+
+import pytest
+
+import app as autorescue
+import ingest
+
+NOW = 1_700_000_000.0
+
+
+def test_timestamps_parse_from_epoch_milliseconds_and_iso():
+    assert ingest.parse_timestamp(None, now=NOW) == NOW
+    assert ingest.parse_timestamp((NOW - 60) * 1000, now=NOW) == NOW - 60
+    iso = datetime.fromtimestamp(NOW - 60, timezone.utc).replace(tzinfo=None).isoformat()
+    assert ingest.parse_timestamp(iso, now=NOW) == NOW - 60
+    assert ingest.parse_timestamp(iso + '+01:00', now=NOW) == NOW - 3660
+
+
+def test_future_timestamps_are_capped_at_now():
+    assert ingest.parse_timestamp((NOW + 600) * 1000, now=NOW) == NOW
+    assert ingest.parse_timestamp((NOW + 3600) * 1000, now=NOW) == NOW
+
+
+@pytest.mark.parametrize('value', [
+    True, math.nan, math.inf, 1e308, 0, (NOW + 2 * 86400) * 1000, '1999-12-31T23:59:59', 'yesterday'
+])
+def test_implausible_timestamps_are_rejected(value):
+    with pytest.raises(ValueError):
+        ingest.parse_timestamp(value, now=NOW)
+
+
+def test_invalid_alerts_are_rejected_individually():
+    items = list(enumerate([
+        {'alert_type': 'Accident', 'latitude': 40.0, 'longitude': -74.0},
+        {'alert_type': 'Meteor', 'latitude': 40.0, 'longitude': -74.0},
+        {'alert_type': 'Accident', 'latitude': 95.0, 'longitude': -74.0},
+        {'alert_type': 'Accident', 'latitude': '40', 'longitude': -74.0},
+        {'alert_type': 'Accident', 'latitude': 40.0, 'longitude': -74.0, 'impact_magnitude': -1},
+    ]))
+    columns, errors = ingest.parse_alerts(items, now=NOW)
+    assert columns['index'] == [0]
+    assert sorted(index for index, _, _ in errors) == [1, 2, 3, 4]
+
+
+@pytest.fixture
+def gateway(database, monkeypatch):
+    monkeypatch.setitem(autorescue.app.config, 'INGEST_TOKENS', ['secret'])
+    return autorescue.app.test_client()
+
+
+def test_batch_endpoint_requires_a_token(gateway):
+    assert gateway.post('/api/ingest', json={'alerts': []}).status_code == 401
+
+
+def test_ndjson_batch_creates_merges_and_rejects(gateway, users):
+    lines = [
+        {'type': 'alert', 'alert_type': 'Accident', 'latitude': 40.0, 'longitude': -74.0, 'vehicle_id': 'v1'},
+        {'type': 'alert', 'alert_type': 'Accident', 'latitude': 40.0001, 'longitude': -74.0, 'vehicle_id': 'v2'},
+        {'type': 'alert', 'alert_type': 'Accident', 'latitude': 40.0, 'longitude': 'x'},
+        {'type': 'location', 'driver_id': users['amb0'], 'latitude': 40.0, 'longitude': -74.0},
+    ]
+    body = '\n'.join(json.dumps(line) for line in lines) + '\n{not json\n'
+    response = gateway.post('/api/ingest', data=body, content_type='application/x-ndjson',
+                            headers={'Authorization': 'Bearer secret'})
+    assert response.status_code == 200, response.get_json()
+    result = response.get_json()
+
+    assert result['alerts'] == {'created': 1, 'merged': 1}
+    assert result['locations'] == {'accepted': 1}
+    assert [item['status'] for item in result['results']] == ['created', 'merged', 'rejected', 'accepted', 'rejected']
+    assert autorescue.Alert.query.one().reporter_count == 2
@@ -0,0 +1,39 @@
+"""Schema migrations, run step by step against a throwaway database"""
+
+from datetime import datetime
+
+from sqlalchemy import insert, inspect, select
+from werkzeug.security import generate_password_hash
+
+from app import Alert, User
+import migrations
+
+
+def test_upgrade_creates_every_model_table(empty_database):
+    applied = migrations.upgrade(empty_database.engine, empty_database.metadata, log=None)
+    assert applied == [number for number, _, _ in migrations.MIGRATIONS]
+    assert migrations.current_version(empty_database.engine) == applied[-1]
+    assert set(empty_database.metadata.tables) <= set(inspect(empty_database.engine).get_table_names())
+    # A second run has nothing left to do
+    assert migrations.upgrade(empty_database.engine, empty_database.metadata, log=None) == []
+
+
+def test_region_backfill_keeps_updated_at(empty_database):
+    """Migration 10 tags existing alerts without touching updated_at"""
+    engine = empty_database.engine
+    updated_at = datetime(2024, 1, 2, 3, 4, 5)
+    migrations.upgrade(engine, empty_database.metadata, target=9, log=None)
+    with engine.begin() as conn:
+        conn.execute(insert(Alert.__table__).values(
+            alert_type='Accident', latitude=40.7128, longitude=-74.0060, status='pending', updated_at=updated_at
+        ))
+    migrations.upgrade(engine, empty_database.metadata, log=None)
+    with engine.connect() as conn:
+        region, stored = conn.execute(select(Alert.region, Alert.updated_at)).one()
+    assert region is not None
+    assert stored == updated_at
+
+
+def test_password_hash_fits_long_hash_methods(database):
+    for method in ('scrypt', 'pbkdf2:sha512:1000'):
+        assert len(generate_password_hash('pw', method=method)) <= User.__table__.c.password_hash.type.length
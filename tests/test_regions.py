@@ -0,0 +1,69 @@
+"""Region sharding: drivers' feeds and event streams follow their tiles and their dispatches"""
+
+from sqlalchemy import update
+
+import app as autorescue
+import regions
+from conftest import place, report
+
+
+def dispatch(admin, alert_id):
+    """Verify and dispatch an alert; returns the ranked unit ids"""
+    assert admin.patch(f'/api/alerts/{alert_id}/verify').status_code == 200
+    response = admin.patch(f'/api/alerts/{alert_id}/dispatch')
+    assert response.status_code == 200, response.get_json()
+    return [candidate['ambulance_id'] for candidate in response.get_json()['candidates']]
+
+
+def feed(client):
+    response = client.get('/api/ambulance/alerts')
+    assert response.status_code == 200, response.get_json()
+    return [alert['id'] for alert in response.get_json()]
+
+
+def test_alerts_are_tagged_with_their_region(login, users):
+    alert_id = report(login('reporter'), 40.0, -74.0)['alert_id']
+    assert autorescue.db.session.get(autorescue.Alert, alert_id).region == regions.region_of(40.0, -74.0)
+    place(login('amb0'), 45.0, -74.0)
+    assert autorescue.db.session.get(autorescue.User, users['amb0']).region == regions.region_of(45.0, -74.0)
+
+
+def test_drivers_only_see_alerts_offered_to_them(login, users, monkeypatch):
+    monkeypatch.setitem(autorescue.app.config, 'DISPATCH_CANDIDATES', 1)
+    admin, reporter = login('admin'), login('reporter')
+    near, far = login('amb0'), login('amb1')
+    place(near, 40.0, -74.0)
+    place(far, 10.0, 10.0)
+
+    alert_id = report(reporter, 40.001, -74.0)['alert_id']
+    assert dispatch(admin, alert_id) == [users['amb0']]
+    assert feed(near) == [alert_id]
+    assert feed(far) == []
+
+
+def test_far_away_sole_candidate_sees_the_alert(login, users):
+    admin, reporter = login('admin'), login('reporter')
+    drivers = {username: login(username) for username in ('amb0', 'amb1', 'amb2')}
+    # Only amb0 is on duty, hundreds of kilometres from the crash
+    place(drivers['amb0'], 45.0, -74.0)
+    place(drivers['amb1'], 40.0, -74.0)
+    place(drivers['amb2'], 40.0, -74.0)
+    autorescue.db.session.execute(update(autorescue.User).where(
+        autorescue.User.id.in_([users['amb1'], users['amb2']])).values(is_available=False))
+    autorescue.db.session.commit()
+    assert regions.region_of(40.0, -74.0) not in regions.neighbourhood(regions.region_of(45.0, -74.0))
+
+    alert_id = report(reporter, 40.0, -74.0)['alert_id']
+    # Cached before the dispatch, so the dispatch has to invalidate it
+    assert feed(drivers['amb0']) == []
+    channels = autorescue.event_channels(users['amb0'], False, True)
+    seq = autorescue.event_hub.last_seq
+    assert dispatch(admin, alert_id) == [users['amb0']]
+
+    events, _ = autorescue.event_hub.since(seq, channels)
+    assert any(data['alert']['id'] == alert_id and data['alert']['status'] == 'dispatched'
+               and autorescue.event_visible(data, users['amb0'], False, True) for _, _, data in events)
+    assert feed(drivers['amb0']) == [alert_id]
+
+    assert drivers['amb0'].post(f'/api/ambulance/accept-alert/{alert_id}').status_code == 200
+    assert feed(drivers['amb0']) == []
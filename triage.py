@@ -0,0 +1,176 @@
+"""
+AutoRescue Triage Queue
+
+Orders open alerts (pending, verified, dispatched) by urgency instead of by
+report time alone. Urgency is expressed as an effective report time: the
+real one moved earlier by bonus seconds for the alert type, impact above the
+detection threshold, extra reporters of the same incident and an SLA breach.
+Every alert ages at the same rate, so ordering by effective report time is
+ordering by urgency at any moment and alerts never need re-keying as time
+passes. An indexed binary heap gives O(log n) insert, update and removal,
+and a second heap of SLA deadlines escalates alerts that waited too long in
+one status.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+
+
+class TriageEntry:
+    __slots__ = ('alert_id', 'reported_at', 'alert_type', 'impact', 'reporters', 'status',
+                 'stage_started', 'stage', 'escalated', 'key')
+
+    def __init__(self, alert_id):
+        self.alert_id = alert_id
+        self.stage = 0
+        self.escalated = False
+
+
+class TriageQueue:
+    """Open alerts in urgency order with SLA escalation"""
+
+    def __init__(self, type_seconds=None, impact_threshold=25.0, impact_seconds=10.0,
+                 reporter_seconds=60.0, escalation_seconds=600.0, sla=None):
+        self.type_seconds = dict(type_seconds or {})
+        self.impact_threshold = float(impact_threshold)
+        self.impact_seconds = float(impact_seconds)
+        self.reporter_seconds = float(reporter_seconds)
+        self.escalation_seconds = float(escalation_seconds)
+        self.sla = dict(sla or {})  # status -> seconds allowed in that status
+        self._heap = []         # TriageEntry, ordered by (key, alert_id)
+        self._position = {}     # alert_id -> index in _heap
+        self._deadlines = []    # (deadline, seq, alert_id, stage), stale entries skipped
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def __contains__(self, alert_id):
+        return alert_id in self._position
+
+    def bonus(self, entry):
+        """Seconds an alert is moved ahead of its real report time"""
+        bonus = self.type_seconds.get(entry.alert_type, 0.0)
+        if entry.impact is not None and entry.impact > self.impact_threshold:
+            bonus += (entry.impact - self.impact_threshold) * self.impact_seconds
+        bonus += max(entry.reporters - 1, 0) * self.reporter_seconds
+        if entry.escalated:
+            bonus += self.escalation_seconds
+        return bonus
+
+    def upsert(self, alert_id, reported_at, alert_type, impact, reporters, status, stage_started=None):
+        """Insert or update an open alert; a status change restarts its SLA timer"""
+        stage_started = time.time() if stage_started is None else stage_started
+        with self._lock:
+            index = self._position.get(alert_id)
+            entry = self._heap[index] if index is not None else TriageEntry(alert_id)
+            if index is None or entry.status != status:
+                entry.stage += 1
+                entry.escalated = False
+                entry.stage_started = stage_started
+                limit = self.sla.get(status)
+                if limit is not None:
+                    heapq.heappush(self._deadlines, (stage_started + limit, next(self._seq), alert_id, entry.stage))
+            entry.reported_at = reported_at
+            entry.alert_type = alert_type
+            entry.impact = impact
+            entry.reporters = reporters or 1
+            entry.status = status
+            entry.key = reported_at - self.bonus(entry)
+            if index is None:
+                self._heap.append(entry)
+                index = self._position[alert_id] = len(self._heap) - 1
+            self._restore(index)
+
+    def remove(self, alert_id):
+        with self._lock:
+            index = self._position.pop(alert_id, None)
+            if index is None:
+                return
+            last = self._heap.pop()
+            if index < len(self._heap):
+                self._heap[index] = last
+                self._position[last.alert_id] = index
+                self._restore(index)
+
+    def clear(self):
+        with self._lock:
+            self._heap.clear()
+            self._position.clear()
+            self._deadlines.clear()
+
+    def escalate_due(self, now=None):
+        """Escalate alerts whose SLA expired; returns their (alert_id, status) pairs"""
+        now = time.time() if now is None else now
+        escalated = []
+        with self._lock:
+            while self._deadlines and self._deadlines[0][0] <= now:
+                _, _, alert_id, stage = heapq.heappop(self._deadlines)
+                index = self._position.get(alert_id)
+                if index is None:
+                    continue
+                entry = self._heap[index]
+                if entry.stage != stage or entry.escalated:
+                    continue
+                entry.escalated = True
+                entry.key = entry.reported_at - self.bonus(entry)
+                self._restore(index)
+                escalated.append((alert_id, entry.status))
+        return escalated
+
+    def top(self, n, statuses=None):
+        """Up to ``n`` most urgent entries, optionally limited to some statuses"""
+        result = []
+        with self._lock:
+            if not self._heap:
+                return result
+            # Walk the heap in order without popping: O(n log n) for n results
+            frontier = [(self._heap[0].key, self._heap[0].alert_id, 0)]
+            while frontier and len(result) < n:
+                _, _, index = heapq.heappop(frontier)
+                entry = self._heap[index]
+                if statuses is None or entry.status in statuses:
+                    result.append(entry)
+                for child in (2 * index + 1, 2 * index + 2):
+                    if child < len(self._heap):
+                        heapq.heappush(frontier, (self._heap[child].key, self._heap[child].alert_id, child))
+        return result
+
+    def get(self, alert_id):
+        index = self._position.get(alert_id)
+        return self._heap[index] if index is not None else None
+
+    def priority(self, entry, now=None):
+        """Effective age in seconds: higher is more urgent"""
+        return (time.time() if now is None else now) - entry.key
+
+    def _less(self, a, b):
+        return (a.key, a.alert_id) < (b.key, b.alert_id)
+
+    def _swap(self, i, j):
+        heap = self._heap
+        heap[i], heap[j] = heap[j], heap[i]
+        self._position[heap[i].alert_id] = i
+        self._position[heap[j].alert_id] = j
+
+    def _restore(self, index):
+        # Sift up, then down: exactly one of them moves an updated entry
+        while index > 0:
+            parent = (index - 1) // 2
+            if not self._less(self._heap[index], self._heap[parent]):
+                break
+            self._swap(index, parent)
+            index = parent
+        size = len(self._heap)
+        while True:
+            smallest = index
+            for child in (2 * index + 1, 2 * index + 2):
+                if child < size and self._less(self._heap[child], self._heap[smallest]):
+                    smallest = child
+            if smallest == index:
+                return
+            self._swap(index, smallest)
+            index = smallest